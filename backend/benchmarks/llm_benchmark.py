@@ -0,0 +1,219 @@
+"""Throughput and latency benchmarks for the LLM paths.
+
+Run against mock_inference_server.py (or a real backend) to compare client,
+pooling and caching changes:
+
+    python benchmarks/llm_benchmark.py client --inference-url http://127.0.0.1:1234 --concurrency 8 --requests 64
+    python benchmarks/llm_benchmark.py api-stream --api-url http://127.0.0.1:8000/api --concurrency 8
+
+Targets:
+    client          LLMClient.generate_text on one shared connection pool
+    client-stream   LLMClient.stream_text, also reporting time to first token
+    cli             LLMClient.send_prompt on a fresh client per request, as the CLI scripts do
+    api-generate    POST /generate-text
+    api-instruction POST /instructions/
+    api-stream      POST /instructions/stream, also reporting time to first event
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+DEFAULT_INSTRUCTIONS = [
+    "Go to https://example.com and print the page title",
+    "Open https://news.ycombinator.com and print the titles of the top 10 stories",
+    "Go to https://www.wikipedia.org, search for Playwright and print the first paragraph",
+    "Visit https://httpbin.org/forms/post, fill in the customer name and submit the form",
+]
+
+def load_prompts(recordings_dir, limit):
+    prompts = []
+    if recordings_dir:
+        for prompt_path in sorted(Path(recordings_dir).rglob("prompt*.txt"))[:limit]:
+            prompts.append(prompt_path.read_text(encoding="utf-8"))
+    return prompts or DEFAULT_INSTRUCTIONS
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarise(target, concurrency, latencies, first_token_latencies, errors, elapsed):
+    summary = {
+        "target": target,
+        "concurrency": concurrency,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else None,
+        "latency_mean": round(statistics.mean(latencies), 4) if latencies else None,
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p99": percentile(latencies, 0.99),
+    }
+    if first_token_latencies:
+        summary["first_token_p50"] = percentile(first_token_latencies, 0.5)
+        summary["first_token_p99"] = percentile(first_token_latencies, 0.99)
+    return summary
+
+async def run_load(concurrency, total_requests, request_once):
+    """Call request_once total_requests times with at most `concurrency` in flight."""
+    latencies = []
+    first_token_latencies = []
+    errors = 0
+    counter = iter(range(total_requests))
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            started_at = time.perf_counter()
+            try:
+                first_token_at = await request_once(index)
+            except Exception as e:
+                errors += 1
+                print(f"Request {index} failed: {e}", file=sys.stderr)
+                continue
+            latencies.append(time.perf_counter() - started_at)
+            if first_token_at is not None:
+                first_token_latencies.append(first_token_at - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, first_token_latencies, errors, time.perf_counter() - started_at
+
+def configure_client(args):
+    from backend.services import llm_client
+    if args.inference_url:
+        llm_client.config["INFERENCE_SERVER_URL"] = args.inference_url
+        llm_client.config.pop("INFERENCE_SERVER_URLS", None)
+    if args.model:
+        llm_client.config["MODEL_NAME_OPENAI"] = args.model
+    # Benchmark traffic must not feed the routing stats, max_tokens history or response cache real runs use
+    state_dir = Path(args.state_dir)
+    llm_client.config["MODEL_STATS_PATH"] = str(state_dir / "model_stats.sqlite3")
+    llm_client.config["GENERATION_HISTORY_PATH"] = str(state_dir / "generation_history.sqlite3")
+    llm_client.config["LLM_CACHE_DIR"] = str(state_dir / "llm_cache")
+    return llm_client.LLMClient
+
+async def benchmark_client(args, prompts):
+    client = configure_client(args)()
+    use_cache = args.use_cache
+
+    async def generate(index):
+        await client.generate_text(prompts[index % len(prompts)], temperature=0.4, use_cache=use_cache)
+        return None
+
+    async def stream(index):
+        first_token_at = None
+        async for _ in client.stream_text(prompts[index % len(prompts)], temperature=0.4, use_cache=use_cache):
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+        return first_token_at
+
+    try:
+        return await run_load(args.concurrency, args.requests, stream if args.target == "client-stream" else generate)
+    finally:
+        await client.aclose()
+
+async def benchmark_cli(args, prompts):
+    client_class = configure_client(args)
+
+    def send(prompt):
+        client_class().send_prompt(prompt, temperature=0.4, use_cache=args.use_cache)
+
+    async def request_once(index):
+        await asyncio.to_thread(send, prompts[index % len(prompts)])
+        return None
+
+    return await run_load(args.concurrency, args.requests, request_once)
+
+async def benchmark_api(args, prompts):
+    api_url = args.api_url.rstrip("/")
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(args.timeout), limits=limits) as client:
+
+        async def generate(index):
+            response = await client.post(f"{api_url}/generate-text", json={
+                "prompt": prompts[index % len(prompts)],
+                "bypass_cache": not args.use_cache
+            })
+            response.raise_for_status()
+            if not response.json().get("success"):
+                raise Exception(response.json().get("error"))
+            return None
+
+        async def instruction(index):
+            response = await client.post(f"{api_url}/instructions/", json={
+                "content": prompts[index % len(prompts)],
+                "bypass_cache": not args.use_cache
+            })
+            response.raise_for_status()
+            return None
+
+        async def stream(index):
+            first_token_at = None
+            async with client.stream("POST", f"{api_url}/instructions/stream", json={
+                "content": prompts[index % len(prompts)],
+                "bypass_cache": not args.use_cache
+            }) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[len("data: "):])
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    if event.get("type") == "error":
+                        raise Exception(event.get("message"))
+            return first_token_at
+
+        request_once = {"api-generate": generate, "api-instruction": instruction, "api-stream": stream}[args.target]
+        return await run_load(args.concurrency, args.requests, request_once)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LLM generation throughput and latency")
+    parser.add_argument("target", choices=["client", "client-stream", "cli", "api-generate", "api-instruction", "api-stream"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16],
+                        help="One or more concurrency levels to measure")
+    parser.add_argument("--requests", type=int, default=32, help="Requests per concurrency level")
+    parser.add_argument("--inference-url", help="Overrides INFERENCE_SERVER_URL for client and cli targets")
+    parser.add_argument("--model", help="Overrides MODEL_NAME_OPENAI for client and cli targets")
+    parser.add_argument("--api-url", default="http://127.0.0.1:8000/api")
+    parser.add_argument("--recordings", help="Directory of recorded prompt files to send instead of sample instructions")
+    parser.add_argument("--use-cache", action="store_true", help="Allow LLM response cache hits")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="Append JSON results to this file")
+    args = parser.parse_args()
+
+    prompts = load_prompts(args.recordings, args.requests)
+    if args.target in ("client", "client-stream"):
+        benchmark = benchmark_client
+    elif args.target == "cli":
+        benchmark = benchmark_cli
+    else:
+        benchmark = benchmark_api
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="llm_benchmark_") as state_dir:
+        for concurrency in args.concurrency:
+            level_args = argparse.Namespace(**{**vars(args), "concurrency": concurrency, "state_dir": state_dir})
+            summary = summarise(args.target, concurrency, *asyncio.run(benchmark(level_args, prompts)))
+            print(json.dumps(summary))
+            results.append(summary)
+
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            for summary in results:
+                f.write(json.dumps(summary) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""OpenAI-compatible stand-in for the inference server.
+
+Replays responses recorded by script_generation (fullResponse.txt and
+responseContent.txt in each iteration directory) with configurable latency,
+token rate and error injection, so LLM client changes can be measured without
+a GPU box.
+
+    python benchmarks/mock_inference_server.py --recordings data --port 1234 --token-rate 50
+"""
+import argparse
+import ast
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import random
+import time
+import uuid
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHARACTERS_PER_TOKEN = 4
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+def load_recordings(directory):
+    """Map prompt hashes to recorded completions, plus a list of all completions."""
+    by_prompt = {}
+    contents = []
+    for response_path in sorted(Path(directory).rglob("responseContent.txt")):
+        content = response_path.read_text(encoding="utf-8")
+        full_response_path = response_path.parent / "fullResponse.txt"
+        if full_response_path.exists():
+            # generate_script writes str(dict), so it is read back as a Python literal
+            try:
+                full_response = ast.literal_eval(full_response_path.read_text(encoding="utf-8"))
+                content = full_response["choices"][0]["message"]["content"]
+            except (ValueError, SyntaxError, KeyError, IndexError):
+                pass
+        contents.append(content)
+        prompt_path = response_path.parent / "prompt.txt"
+        if prompt_path.exists():
+            by_prompt[prompt_key(prompt_path.read_text(encoding="utf-8"))] = content
+    for script_path in sorted(Path(directory).rglob("script_*.py")):
+        if "scripts" in script_path.parts:
+            contents.append(f"```python\n{script_path.read_text(encoding='utf-8')}\n```")
+    return by_prompt, contents
+
+class MockInferenceServer:
+    def __init__(self, recordings_dir, latency=0.2, jitter=0.05, token_rate=50.0, error_rate=0.0, model="mock-model"):
+        self.by_prompt, self.contents = load_recordings(recordings_dir)
+        if not self.contents:
+            self.contents = ["```python\nprint('mock response')\n```"]
+        self._next_content = itertools.cycle(self.contents)
+        self.latency = latency
+        self.jitter = jitter
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.model = model
+        self.stats = {"requests": 0, "streamed": 0, "errors_injected": 0, "recorded_hits": 0}
+        logger.info(f"Loaded {len(self.contents)} recorded responses ({len(self.by_prompt)} keyed by prompt)")
+
+    def choose_content(self, payload):
+        prompt = "".join(message.get("content", "") for message in payload.get("messages", []))
+        content = self.by_prompt.get(prompt_key(prompt))
+        if content is not None:
+            self.stats["recorded_hits"] += 1
+            return content
+        return next(self._next_content)
+
+    def tokens(self, content, max_tokens):
+        tokens = [content[i:i + CHARACTERS_PER_TOKEN] for i in range(0, len(content), CHARACTERS_PER_TOKEN)]
+        return tokens[:max_tokens] if max_tokens and max_tokens > 0 else tokens
+
+    async def first_token_delay(self):
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def create_app(self):
+        app = FastAPI(title="Mock Inference Server")
+
+        @app.get("/models")
+        async def models():
+            return {"object": "list", "data": [{"id": self.model, "object": "model"}]}
+
+        @app.get("/stats")
+        async def stats():
+            return self.stats
+
+        @app.post("/chat/completions")
+        async def chat_completions(request: Request):
+            payload = await request.json()
+            self.stats["requests"] += 1
+            if random.random() < self.error_rate:
+                self.stats["errors_injected"] += 1
+                return JSONResponse(status_code=503, content={"error": "injected failure"})
+
+            content = self.choose_content(payload)
+            tokens = self.tokens(content, payload.get("max_tokens", -1))
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            model = payload.get("model", self.model)
+            prompt_tokens = sum(len(m.get("content", "")) for m in payload.get("messages", [])) // CHARACTERS_PER_TOKEN
+            await self.first_token_delay()
+
+            if payload.get("stream"):
+                self.stats["streamed"] += 1
+
+                async def stream():
+                    for token in tokens:
+                        chunk = {
+                            "id": completion_id,
+                            "object": "chat.completion.chunk",
+                            "created": int(time.time()),
+                            "model": model,
+                            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+                        }
+                        yield f"data: {json.dumps(chunk)}\n\n"
+                        if self.token_rate > 0:
+                            await asyncio.sleep(1 / self.token_rate)
+                    yield "data: [DONE]\n\n"
+                return StreamingResponse(stream(), media_type="text/event-stream")
+
+            if self.token_rate > 0:
+                await asyncio.sleep(len(tokens) / self.token_rate)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": prompt_tokens + len(tokens)
+                }
+            }
+
+        return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded LLM responses over an OpenAI-compatible API")
+    parser.add_argument("--recordings", default="data", help="Directory searched for recorded responses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Random +/- seconds added to the latency")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Tokens per second, 0 for instant")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--model", default="mock-model")
+    args = parser.parse_args()
+
+    server = MockInferenceServer(
+        args.recordings,
+        latency=args.latency,
+        jitter=args.jitter,
+        token_rate=args.token_rate,
+        error_rate=args.error_rate,
+        model=args.model
+    )
+    uvicorn.run(server.create_app(), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,8 @@ from .base import (
     UrlValidationResponse,
     LLMResponse,
     ScriptError,
-    ScriptResult
+    ScriptResult,
+    BatchRunRequest
 )
 
 __all__ = [
@@ -13,5 +14,6 @@ __all__ = [
     'UrlValidationResponse',
     'LLMResponse',
     'ScriptError',
-    'ScriptResult'
+    'ScriptResult',
+    'BatchRunRequest'
 ]
@@ -7,6 +7,11 @@ class InstructionRequest(BaseModel):
     error_context: Optional[Dict[str, Any]] = None
     original_script: Optional[str] = None
     page_history: Optional[List[Dict[str, Any]]] = None
+    bypass_cache: bool = False
+    # Failed executions and repairs so far, for model routing; repairs default to counting this server's
+    failed_attempts: Optional[int] = None
+    # The saved script being repaired; a success recorded when its job run exited cleanly becomes a failure
+    script_id: Optional[str] = None
     
     class Config:
         json_encoders = {
@@ -27,6 +32,16 @@ class LLMResponse(BaseModel):
     response: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
 
+class BatchRunRequest(BaseModel):
+    """Scripts to run as one batch: each of script_ids, or script_id once per parameter set."""
+    script_ids: Optional[List[str]] = None
+    script_id: Optional[str] = None
+    parameter_sets: Optional[List[Dict[str, Any]]] = None
+    concurrency: int = 4
+    # Run each item with the tracking prelude, under profile
+    tracked: bool = False
+    profile: Optional[str] = None
+
 class ScriptError(BaseModel):
     error_type: str
     error: str
@@ -49,6 +64,7 @@ class ScriptResult(BaseModel):
     script_id: Optional[str] = None
     script_path: Optional[str] = None
     page_history: List[Dict[str, Any]] = []
+    resource_usage: Dict[str, Any] = {}  # peak RSS, CPU and wall seconds, bytes written; a pooled browser's are not included
     
     def __init__(self, **data):
         super().__init__(**data)
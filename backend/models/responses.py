@@ -1,6 +1,8 @@
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
 
+from .base import ScriptResult
+
 class ErrorResponse(BaseModel):
     """Standard error response model"""
     error_type: str
@@ -26,3 +28,76 @@ class ScriptExecutionResponse(BaseModel):
     details: Optional[Dict[str, Any]] = None
     suggestions: Optional[List[str]] = None
     possible_causes: Optional[List[str]] = None
+    artifacts: Optional[List[str]] = None  # tracking files uploaded by an execution worker
+    resource_usage: Optional[Dict[str, Any]] = None
+
+def build_execution_response(result: ScriptResult) -> ScriptExecutionResponse:
+    """Turn an executor result into the run response, with suggestions for common failures."""
+    response_data = {
+        'type': 'complete',
+        'success': result.success,
+        'stdout': result.stdout or "",
+        'stderr': result.stderr or "",
+        'content': result.stdout or "",
+        'is_error': not result.success,
+        'message': 'Script executed successfully' if result.success else getattr(result, 'error', 'Script execution failed'),
+        'error': None if result.success else getattr(result, 'error', 'Script execution failed'),
+        'error_type': None if result.success else str(getattr(result, 'error_type', 'ExecutionError')),
+        'error_details': getattr(result, 'error_details', None),
+        'returncode': getattr(result, 'returncode', 0 if result.success else 1),
+        'page_history': getattr(result, 'page_history', []),
+        'details': getattr(result, 'details', None),
+        'resource_usage': getattr(result, 'resource_usage', None),
+        'suggestions': [],
+        'possible_causes': []
+    }
+
+    # Add script content if available
+    if hasattr(result, 'script_content'):
+        response_data['script_content'] = result.script_content
+
+    # Add error-specific suggestions
+    if not result.success:
+        error_type = str(getattr(result, 'error_type', '')).lower()
+
+        if "modulenotfound" in error_type:
+            module_name = getattr(result, 'error_details', {}).get('message', '').split()[-1]
+            response_data['suggestions'] = [
+                "The script is trying to use a Python module that is not installed",
+                f"Try installing the missing module with: pip install {module_name}" if module_name else "Check your imports"
+            ]
+            response_data['possible_causes'] = [
+                "Missing Python package",
+                "Virtual environment not activated",
+                "Incorrect Python environment"
+            ]
+        elif "timeout" in error_type:
+            response_data['suggestions'] = [
+                "The script took too long to execute (timeout after 5 minutes)",
+                "Check for infinite loops or long-running operations in your script"
+            ]
+            response_data['possible_causes'] = [
+                "Infinite loop in the script",
+                "Network requests taking too long",
+                "Resource-intensive operations"
+            ]
+        elif "filenotfound" in error_type:
+            file_path = getattr(result, 'error_details', {}).get('message', 'unknown path')
+            response_data['suggestions'] = [
+                "The script is trying to access a file that doesn't exist",
+                f"Check the file path: {file_path}"
+            ]
+            response_data['possible_causes'] = [
+                "Incorrect file path",
+                "File permissions issue",
+                "File deleted or moved"
+            ]
+        else:
+            # Default error suggestions
+            response_data['suggestions'] = [
+                "Check the script for syntax errors",
+                "Verify all required dependencies are installed",
+                "Review the error message and traceback"
+            ]
+
+    return ScriptExecutionResponse(**response_data)
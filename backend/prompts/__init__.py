@@ -1,6 +1,17 @@
-from .generation import get_generate_prompt, get_repair_prompt
+from .generation import (
+    assemble_generate_prompt,
+    assemble_repair_prompt,
+    generate_prompt_assembler,
+    get_generate_prompt,
+    get_repair_prompt,
+    repair_prompt_assembler
+)
 
 __all__ = [
+    'assemble_generate_prompt',
+    'assemble_repair_prompt',
+    'generate_prompt_assembler',
     'get_generate_prompt',
-    'get_repair_prompt'
+    'get_repair_prompt',
+    'repair_prompt_assembler'
 ]
@@ -1,22 +1,50 @@
 from typing import List, Dict, Any
 
+from backend.services.batch_runs import PARAMETERS_ENV
+from backend.services.prompt_assembly import ONLY_SCRIPT, SYSTEM_ROLE, AssembledPrompt, PromptAssembler
+
+SYNC_PLAYWRIGHT_RULES = (
+    "IMPORTANT: The script should follow these rules:\n"
+    "1. Use `from playwright.sync_api import sync_playwright` (synchronous API)\n"
+    "2. Use standard synchronous Python (no async/await)\n"
+    "3. Do not use try/catch blocks\n"
+    "4. The script should be self-contained with all necessary imports\n"
+    "5. The script should be executable directly\n\n"
+)
+
+# Batch runs sweep a script over parameter sets through this variable
+PARAMETERS_CONTRACT = (
+    "Values in the instructions that could change between runs (search terms, names, dates, amounts) "
+    f"must be read from the JSON object in the {PARAMETERS_ENV} environment variable, keeping the "
+    "instructions' values as defaults, for example:\n"
+    f"parameters = json.loads(os.environ.get(\"{PARAMETERS_ENV}\") or \"{{}}\")\n"
+    "search_term = parameters.get(\"search_term\", \"laptops\")\n\n"
+)
+
+# Static content comes first so consecutive prompts share a cacheable prefix
+generate_prompt_assembler = PromptAssembler("generate", [SYSTEM_ROLE, SYNC_PLAYWRIGHT_RULES, PARAMETERS_CONTRACT, ONLY_SCRIPT])
+repair_prompt_assembler = PromptAssembler("repair", [
+    SYSTEM_ROLE,
+    SYNC_PLAYWRIGHT_RULES,
+    PARAMETERS_CONTRACT,
+    ONLY_SCRIPT,
+    "Please generate a corrected version of the script that fixes the error while maintaining the original functionality.\n\n",
+])
+
+def assemble_generate_prompt(instruction: str) -> AssembledPrompt:
+    """The prompt for script generation, with its prefix-cache lengths."""
+    return generate_prompt_assembler.assemble([("The user's instructions are:", instruction)])
+
 def get_generate_prompt(instruction: str) -> str:
     """Generate the prompt for script generation."""
-    return (
-        "You are a RPA assistant that generates a Python script based on a user's instruction "
-        "for interactions with web applications using the Playwright package.\n\n"
-        f"The user's instructions are: {instruction}\n\n"
-        "IMPORTANT: The script should follow these rules:\n"
-        "1. Use `from playwright.sync_api import sync_playwright` (synchronous API)\n"
-        "2. Use standard synchronous Python (no async/await)\n"
-        "3. Do not use try/catch blocks\n"
-        "4. The script should be self-contained with all necessary imports\n"
-        "5. The script should be executable directly\n\n"
-        "Only return the proposed python script."
-    )
+    return assemble_generate_prompt(instruction).text
 
 def get_repair_prompt(instruction: str, error_context: str, original_script: str, page_history: List[Dict[str, Any]] = None) -> str:
-    """Generate the prompt for script repair.
+    """Generate the prompt for script repair; see assemble_repair_prompt for the arguments."""
+    return assemble_repair_prompt(instruction, error_context, original_script, page_history).text
+
+def assemble_repair_prompt(instruction: str, error_context: str, original_script: str, page_history: List[Dict[str, Any]] = None) -> AssembledPrompt:
+    """The prompt for script repair, with its prefix-cache lengths.
     
     Args:
         instruction: The original user instruction
@@ -25,23 +53,15 @@ def get_repair_prompt(instruction: str, error_context: str, original_script: str
         page_history: List of page objects containing page titles, URLs, and HTML content
     """
     prompt_parts = [
-        "You are a RPA assistant that generates a Python script based on a user's instruction "
-        "for interactions with web applications using the Playwright package.\n\n"
-        f"The user is trying to fix an error in their script. Here's the error that occurred:\n{error_context}\n\n"
-        f"Here's the original script that had the error (convert it to synchronous code):\n```python\n{original_script}\n```\n\n"
-        "IMPORTANT: The script should follow these rules:\n"
-        "1. Use `from playwright.sync_api import sync_playwright` (synchronous API)\n"
-        "2. Use standard synchronous Python (no async/await)\n"
-        "3. Do not use try/catch blocks\n"
-        "4. The script should be self-contained with all necessary imports\n"
-        "5. The script should be executable directly\n\n"
-        "Only return the proposed python script."
+        ("The user's original instruction was:", instruction),
+        ("The user is trying to fix an error in their script. Here's the error that occurred:", error_context),
+        ("Here's the original script that had the error (convert it to synchronous code):", f"```python\n{original_script}\n```"),
     ]
     
     # Add page history if available (only include most recent 2 pages to save tokens)
     if page_history:
-        prompt_parts.append("=== PAGE HISTORY (MOST RECENT 2 PAGES) ===\n"
-                         "Key page states before the error. Focus on these when debugging.\n")
+        prompt_parts.append((None, "=== PAGE HISTORY (MOST RECENT 2 PAGES) ===\n"
+                         "Key page states before the error. Focus on these when debugging."))
         
         # Only process the 2 most recent pages
         MAX_PAGES = 2
@@ -92,11 +112,6 @@ def get_repair_prompt(instruction: str, error_context: str, original_script: str
                     sample += "..."
                 page_info.append(f"```html\n{sample}\n```")
             
-            prompt_parts.append("\n".join(page_info) + "\n")
-    
-    prompt_parts.extend([
-        "\nPlease generate a corrected version of the script that fixes the error while maintaining the original functionality.",
-        f"The user's original instruction was: {instruction}"
-    ])
+            prompt_parts.append((None, "\n".join(page_info)))
     
-    return "\n".join(prompt_parts)
+    return repair_prompt_assembler.assemble(prompt_parts)
@@ -1,12 +1,15 @@
 from fastapi import APIRouter, HTTPException, Depends, Request, Path, status
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
 from fastapi.middleware import Middleware
+from dotenv import dotenv_values
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.middleware import SlowAPIMiddleware
 from typing import Dict, Any, List, Optional, Callable, Awaitable
+from collections import OrderedDict
 import json
 import asyncio
+import re
 import datetime
 import logging
 import traceback
@@ -22,12 +25,45 @@ from backend.models import (
     UrlValidationResponse,
     LLMResponse,
     ScriptError,
-    ScriptResult
+    ScriptResult,
+    BatchRunRequest
 )
-from backend.models.responses import ErrorResponse, ScriptExecutionResponse
+from backend.models.responses import ErrorResponse, ScriptExecutionResponse, build_execution_response
 from backend.services.llm_service import LLMService
 from backend.services.llm_client import LLMClient
 from backend.services.sync_script_service import SyncScriptService
+from backend.services.script_generation import ScriptFenceParser, extract_script
+from backend.prompts import assemble_generate_prompt, assemble_repair_prompt, generate_prompt_assembler, repair_prompt_assembler
+from backend.services.generation_guards import GenerationAbortedError
+from backend.services.prompt_budget import get_token_counter
+from backend.services.prompt_assembly import AssembledPrompt, prompt_report
+from backend.services.llm_admission import AdmissionQueueFullError, Priority, priority_scope
+from backend.services.browser_pool import BrowserPool, BrowserPoolConfig
+from backend.services.execution_zygote import ExecutionZygote, ZygoteConfig
+from backend.services.script_executor import AsyncScriptExecutor, ExecutorConfig
+from backend.services.run_resources import ResourceLimits
+from backend.services.batch_runs import PARAMETERS_ENV, BatchConfig, BatchItem, BatchSummary, run_batch
+from backend.services.execution_profiles import get_profile
+from backend.services.playwright_install import PlaywrightInstallCheck, PlaywrightInstallConfig
+from backend.services.dependency_index import DependencyChecker, DependencyConfig
+from backend.services.dependency_envs import DependencyEnvConfig, DependencyEnvironments
+from backend.services.run_streams import RunOutputStream, RunStreamConfig, RunStreamRegistry
+from backend.services.artifact_store import ArtifactStore
+from backend.services.execution_worker import DEFAULT_ARTIFACT_DIR, JobRunner
+from backend.services.job_queue import (
+    CANCELLED,
+    FINISHED_STATUSES,
+    JobNotFoundError,
+    JobQueue,
+    JobQueueConfig,
+    JobWorkers
+)
+from backend.services.request_coalescing import (
+    IdempotencyConflictError,
+    IdempotencyStore,
+    SingleFlight,
+    make_request_key
+)
 
 # Create router
 router = APIRouter()
@@ -62,10 +98,121 @@ llm_client = LLMClient()
 llm_service = LLMService(llm_client=llm_client)
 script_service = SyncScriptService()
 
+# Identical concurrent generations share one LLM call; Idempotency-Key replays a stored result
+config = dotenv_values()
+generation_flights = SingleFlight()
+idempotency_store = IdempotencyStore(
+    window_seconds=float(config.get("IDEMPOTENCY_WINDOW_SECONDS") or 600)
+)
+
+# Warm Chromium instances that script runs connect to instead of launching their own
+browser_pool = BrowserPool(BrowserPoolConfig.from_env(config))
+
+# Browser installation is verified at startup and re-checked only when its fingerprint changes
+playwright_install = PlaywrightInstallCheck(PlaywrightInstallConfig.from_env(config))
+
+# Script imports are resolved against a cached import-name -> distribution index, and packages
+# the server lacks come from per-requirement-set overlays built in the background
+dependency_checker = DependencyChecker(DependencyConfig.from_env(config))
+dependency_envs = DependencyEnvironments(dependency_checker, DependencyEnvConfig.from_env(config))
+
+# Script runs are supervised on the event loop rather than by worker threads
+execution_zygote = ExecutionZygote(ZygoteConfig.from_env(config))
+script_executor = AsyncScriptExecutor(
+    ExecutorConfig.from_env(config), browser_pool, execution_zygote, playwright_install, dependency_envs,
+    ResourceLimits.from_env(config)
+)
+
+# Batch and parameter-sweep runs share the executor above
+batch_config = BatchConfig.from_env(config)
+
+# Durable queue behind the asynchronous run API; jobs interrupted by a restart are re-queued
+job_queue_config = JobQueueConfig.from_env(config)
+job_queue = JobQueue(job_queue_config.path, job_queue_config.journal_mode, job_queue_config.max_attempts)
+# Shared with standalone workers (services/execution_worker.py) on other machines
+artifact_store = ArtifactStore(config.get("JOB_ARTIFACT_DIR") or DEFAULT_ARTIFACT_DIR)
+job_runner = JobRunner(script_executor, artifact_store, script_service.scripts_dir, llm_client.model_stats)
+
+# Live output of running scripts, bounded per stream and per subscriber
+run_stream_config = RunStreamConfig.from_env(config)
+job_streams = RunStreamRegistry(run_stream_config)
+
+async def run_coalesced_generation(kind: str, instruction: InstructionRequest, request: Optional[Request]) -> Dict[str, Any]:
+    """Generate a script, deduplicating identical in-flight and replayed requests."""
+    request_key = make_request_key(kind, instruction.dict())
+    idempotency_key = request.headers.get("Idempotency-Key") if request else None
+
+    if idempotency_key:
+        try:
+            stored = idempotency_store.get(idempotency_key, request_key)
+        except IdempotencyConflictError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if stored is not None:
+            logger.info(f"Replaying stored result for Idempotency-Key {idempotency_key}")
+            return stored
+
+    # Repairs of a running bot are admitted to the LLM ahead of fresh generations
+    priority = Priority.REPAIR if kind == "repair" else Priority.GENERATE
+    try:
+        with priority_scope(priority):
+            result = await generation_flights.run(request_key, lambda: llm_service.generate_script(instruction))
+    except AdmissionQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    if idempotency_key:
+        idempotency_store.put(idempotency_key, request_key, result)
+    return result
+
 # Override the dependency
 def get_llm_service():
     return llm_service
 
+@router.on_event("startup")
+async def start_inference_health_checks():
+    """Probe inference backends so failing ones are ejected and re-admitted."""
+    llm_client.start_health_checks()
+
+@router.on_event("shutdown")
+async def close_llm_client():
+    """Release the pooled inference server connections."""
+    await llm_client.aclose()
+
+@router.on_event("startup")
+async def load_tokenizer():
+    """Load the tokenizer up front, so a fallback to estimated token counts is logged at startup."""
+    await asyncio.to_thread(get_token_counter)
+
+@router.on_event("startup")
+async def verify_playwright_install():
+    """Check the Playwright browser installation once, before any browser is launched."""
+    await playwright_install.ensure()
+
+@router.on_event("startup")
+async def start_browser_pool():
+    """Pre-launch the pooled browsers when BROWSER_POOL_SIZE is set."""
+    await browser_pool.start()
+
+@router.on_event("shutdown")
+async def close_browser_pool():
+    await browser_pool.close()
+
+@router.on_event("shutdown")
+async def close_execution_zygote():
+    await execution_zygote.close()
+
+@router.on_event("shutdown")
+async def stop_dependency_builds():
+    await dependency_envs.close()
+
+@router.on_event("startup")
+async def start_job_workers():
+    """Re-queue interrupted jobs and start pulling from the job queue."""
+    await job_workers.start()
+
+@router.on_event("shutdown")
+async def stop_job_workers():
+    await job_workers.stop()
+
 @router.post("/scripts/repair", response_model=Dict[str, Any])
 async def repair_script(
     instruction: InstructionRequest,
@@ -97,7 +244,7 @@ async def repair_script(
                 logger.info(f"Original script length: {len(instruction.original_script)} characters")
 
         # Return the result directly as the response
-        result = await llm_service.generate_script(instruction)
+        result = await run_coalesced_generation("repair", instruction, request)
         return result
     except HTTPException:
         raise
@@ -124,7 +271,7 @@ async def create_instruction(
                 logger.warning(f"Could not log request body: {e}")
 
         # Return the result directly as the response
-        result = await llm_service.generate_script(instruction)
+        result = await run_coalesced_generation("instruction", instruction, request)
         return result
     except HTTPException:
         raise
@@ -132,6 +279,130 @@ async def create_instruction(
         logger.error(f"Error processing instruction: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+def validate_profile(profile: Optional[str]) -> None:
+    """Reject an unknown execution profile name before anything is run or queued."""
+    try:
+        get_profile(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+# Repairs streamed per instruction, for clients that do not send failed_attempts
+repair_counts: "OrderedDict[str, int]" = OrderedDict()
+MAX_TRACKED_INSTRUCTIONS = 1000
+
+def count_repair(instruction: InstructionRequest) -> int:
+    """This repair's position among the failed attempts for its instruction."""
+    if instruction.failed_attempts is not None:
+        return max(1, instruction.failed_attempts)
+    key = make_request_key("bot", instruction.content)
+    repair_counts[key] = repair_counts.pop(key, 0) + 1
+    while len(repair_counts) > MAX_TRACKED_INSTRUCTIONS:
+        repair_counts.popitem(last=False)
+    return repair_counts[key]
+
+def script_model_path(script_id: str):
+    """Where the model that generated a saved script is kept, next to the script."""
+    return script_service.scripts_dir / f"script_{script_id}.model"
+
+def format_sse(data: Dict[str, Any]) -> str:
+    """Encode a payload as a single server-sent event."""
+    return f"data: {json.dumps(data, default=str)}\n\n"
+
+async def stream_generation(
+    prompt: AssembledPrompt,
+    instruction: InstructionRequest,
+    is_repair: bool,
+    affinity_key: Optional[str] = None,
+    failed_attempts: int = 0
+):
+    """Relay generated code as it arrives, then save the final script."""
+    parser = ScriptFenceParser()
+    model = llm_client.routing_policy.choose_model(instruction.content, failed_attempts=failed_attempts)
+    try:
+        async for delta in llm_client.stream_text(
+            prompt.text,
+            max_tokens=llm_client.max_tokens_predictor.predict(model, instruction.content),
+            temperature=0.4,
+            use_cache=not instruction.bypass_cache,
+            affinity_key=affinity_key,
+            priority=Priority.REPAIR if is_repair else Priority.GENERATE,
+            model=model,
+            guard=llm_client.create_guard(),
+            instruction=instruction.content
+        ):
+            code = parser.feed(delta)
+            if code:
+                yield format_sse({"type": "delta", "content": code})
+
+        script = extract_script(parser.content)
+        script_path, script_id = script_service.save_script(script)
+        # Job runs of the script record their outcome against the model that wrote it
+        script_model_path(script_id).write_text(model, encoding="utf-8")
+        # Start building any packages the script needs before it is first run
+        await dependency_envs.prepare(script)
+        yield format_sse({
+            "type": "complete",
+            "status": "success",
+            "message": "Script repaired successfully" if is_repair else "Script generated successfully",
+            "script_path": script_path,
+            "script_id": script_id,
+            "script_content": script,
+            "is_repair": is_repair,
+            "model": model,
+            "prompt": prompt_report(prompt)
+        })
+    except GenerationAbortedError as e:
+        yield format_sse({"type": "error", "message": str(e), "reason": e.reason})
+    except Exception as e:
+        logger.error(f"Error streaming generation: {str(e)}", exc_info=True)
+        yield format_sse({"type": "error", "message": str(e)})
+
+@router.post("/instructions/stream")
+async def stream_instruction(instruction: InstructionRequest) -> StreamingResponse:
+    """Stream a generated script as server-sent events."""
+    logger.info(f"Received streaming instruction request: {instruction.dict()}")
+    prompt = assemble_generate_prompt(instruction.content)
+    return StreamingResponse(
+        stream_generation(prompt, instruction, is_repair=False),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/scripts/repair/stream")
+async def stream_repair(instruction: InstructionRequest) -> StreamingResponse:
+    """Stream a repaired script as server-sent events."""
+    logger.info(f"Received streaming repair request: {instruction.dict()}")
+    if not instruction.original_script:
+        raise HTTPException(
+            status_code=400,
+            detail="original_script is required for repair"
+        )
+    if instruction.script_id and re.fullmatch(r"[0-9a-f-]{36}", instruction.script_id):
+        model_path = script_model_path(instruction.script_id)
+        if model_path.exists():
+            await asyncio.to_thread(
+                llm_client.model_stats.record_outcome,
+                model_path.read_text(encoding="utf-8"), False, f"script:{instruction.script_id}"
+            )
+    prompt = assemble_repair_prompt(
+        instruction=instruction.content,
+        error_context=json.dumps(instruction.error_context or {}, indent=2, default=str),
+        original_script=instruction.original_script,
+        page_history=instruction.page_history
+    )
+    return StreamingResponse(
+        stream_generation(
+            prompt,
+            instruction,
+            is_repair=True,
+            affinity_key=make_request_key("bot", instruction.content),
+            # A repair request means at least one execution has already failed
+            failed_attempts=count_repair(instruction)
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/scripts/{script_id}", response_model=Dict[str, Any])
 async def get_script(script_id: str) -> Dict[str, Any]:
     """Get the content of a script by its ID."""
@@ -154,6 +425,7 @@ async def get_script(script_id: str) -> Dict[str, Any]:
         error_msg = f"Error retrieving script: {str(e)}"
         raise HTTPException(status_code=500, detail=error_msg)
 
+
 # Error responses for OpenAPI documentation
 error_responses = {
     404: {"model": ErrorResponse, "description": "Script not found"},
@@ -177,12 +449,14 @@ async def execute_script(
     script_id: str = Path(..., 
         regex=r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
         description="UUID of the script to execute"
-    )
+    ),
+    profile: Optional[str] = None
 ):
     """
     Execute a previously generated script by its ID.
     
     - **script_id**: UUID of the script to execute
+    - **profile**: Execution profile for tracked scripts (debug-headed or production-headless)
     
     Returns the script execution result after completion.
     """
@@ -203,79 +477,13 @@ async def execute_script(
             )
         
         logger.info(f"Executing script: {script_path}")
+        validate_profile(profile)
         
         try:
             # Run the script and get the result
-            result = await asyncio.to_thread(script_service.run_script, str(script_path))
+            result = await script_executor.run(script_path, profile=profile)
             
-            # Prepare the response
-            response_data = {
-                'type': 'complete',
-                'success': result.success,
-                'stdout': result.stdout or "",
-                'stderr': result.stderr or "",
-                'content': result.stdout or "",
-                'is_error': not result.success,
-                'message': 'Script executed successfully' if result.success else getattr(result, 'error', 'Script execution failed'),
-                'error': None if result.success else getattr(result, 'error', 'Script execution failed'),
-                'error_type': None if result.success else str(getattr(result, 'error_type', 'ExecutionError')),
-                'error_details': getattr(result, 'error_details', None),
-                'returncode': getattr(result, 'returncode', 0 if result.success else 1),
-                'page_history': getattr(result, 'page_history', []),
-                'details': getattr(result, 'details', None),
-                'suggestions': [],
-                'possible_causes': []
-            }
-            
-            # Add script content if available
-            if hasattr(result, 'script_content'):
-                response_data['script_content'] = result.script_content
-            
-            # Add error-specific suggestions
-            if not result.success:
-                error_type = str(getattr(result, 'error_type', '')).lower()
-                
-                if "modulenotfound" in error_type:
-                    module_name = getattr(result, 'error_details', {}).get('message', '').split()[-1]
-                    response_data['suggestions'] = [
-                        "The script is trying to use a Python module that is not installed",
-                        f"Try installing the missing module with: pip install {module_name}" if module_name else "Check your imports"
-                    ]
-                    response_data['possible_causes'] = [
-                        "Missing Python package",
-                        "Virtual environment not activated",
-                        "Incorrect Python environment"
-                    ]
-                elif "timeout" in error_type:
-                    response_data['suggestions'] = [
-                        "The script took too long to execute (timeout after 5 minutes)",
-                        "Check for infinite loops or long-running operations in your script"
-                    ]
-                    response_data['possible_causes'] = [
-                        "Infinite loop in the script",
-                        "Network requests taking too long",
-                        "Resource-intensive operations"
-                    ]
-                elif "filenotfound" in error_type:
-                    file_path = getattr(result, 'error_details', {}).get('message', 'unknown path')
-                    response_data['suggestions'] = [
-                        "The script is trying to access a file that doesn't exist",
-                        f"Check the file path: {file_path}"
-                    ]
-                    response_data['possible_causes'] = [
-                        "Incorrect file path",
-                        "File permissions issue",
-                        "File deleted or moved"
-                    ]
-                else:
-                    # Default error suggestions
-                    response_data['suggestions'] = [
-                        "Check the script for syntax errors",
-                        "Verify all required dependencies are installed",
-                        "Review the error message and traceback"
-                    ]
-            
-            return ScriptExecutionResponse(**response_data)
+            return build_execution_response(result)
                 
         except asyncio.TimeoutError:
             logger.error("Script execution timed out")
@@ -342,6 +550,246 @@ async def execute_script(
             ).dict()
         )
 
+@router.post("/scripts/{script_id}/run/stream")
+@limiter.limit("10/minute")
+async def execute_script_stream(
+    request: Request,
+    script_id: str = Path(...,
+        regex=r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
+        description="UUID of the script to execute"
+    ),
+    profile: Optional[str] = None
+) -> StreamingResponse:
+    """Run a script, streaming its output as 'output' events and finishing with the run result.
+
+    Disconnecting aborts the run.
+    """
+    script_path = script_service.scripts_dir / f"script_{script_id}.py"
+    if not script_path.exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Script with ID {script_id} not found")
+    validate_profile(profile)
+    stream = RunOutputStream(run_stream_config)
+
+    async def run():
+        try:
+            result = await script_executor.run(script_path, on_output=stream.publish_output, profile=profile)
+            await stream.close(build_execution_response(result).dict())
+        except Exception as e:
+            logger.error(f"Error in streamed script execution: {str(e)}", exc_info=True)
+            await stream.close({"type": "error", "is_error": True, "message": str(e), "error_type": type(e).__name__})
+
+    async def events():
+        run_task = asyncio.create_task(run())
+        try:
+            async for event in stream.subscribe():
+                yield format_sse(event)
+        finally:
+            if not run_task.done():
+                run_task.cancel()
+            await asyncio.gather(run_task, return_exceptions=True)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+SCRIPT_ID_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+@router.post("/scripts/batch")
+@limiter.limit("10/minute")
+async def execute_script_batch(request: Request, batch: BatchRunRequest) -> StreamingResponse:
+    """Run many scripts, or one script over many parameter sets, as a single request.
+
+    Each script id is run once per parameter set (just once without any);
+    a parameter set is passed to the script as JSON in SCRIPT_PARAMETERS,
+    so parameter_sets are rejected for scripts that never read it. tracked
+    runs every item with the tracking prelude under the named execution
+    profile, which only tracked runs have. Results stream as 'item' events in completion order, followed by a
+    'complete' event with aggregate timing. Disconnecting cancels the rest.
+    """
+    script_ids = batch.script_ids or ([batch.script_id] if batch.script_id else [])
+    if not script_ids:
+        raise HTTPException(status_code=400, detail="Provide script_ids, or script_id with parameter_sets")
+    parameter_sets = batch.parameter_sets or [None]
+    if len(script_ids) * len(parameter_sets) > batch_config.max_items:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {batch_config.max_items} runs")
+    for script_id in script_ids:
+        if not SCRIPT_ID_PATTERN.match(script_id):
+            raise HTTPException(status_code=422, detail=f"Invalid script id: {script_id}")
+        script_path = script_service.scripts_dir / f"script_{script_id}.py"
+        if not script_path.exists():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Script with ID {script_id} not found")
+        if batch.parameter_sets and PARAMETERS_ENV not in script_path.read_text(encoding="utf-8"):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Script {script_id} does not read {PARAMETERS_ENV}, so every parameter set would run it "
+                       "identically; regenerate it to take its inputs from parameters"
+            )
+
+    runs = [(script_id, parameters) for script_id in script_ids for parameters in parameter_sets]
+    items = [
+        BatchItem(index, script_id, script_service.scripts_dir / f"script_{script_id}.py", parameters)
+        for index, (script_id, parameters) in enumerate(runs)
+    ]
+    concurrency = max(1, min(batch.concurrency, batch_config.max_concurrency))
+    validate_profile(batch.profile)
+    if batch.profile and not batch.tracked:
+        raise HTTPException(status_code=400, detail="profile applies only to tracked batches; set tracked to true")
+
+    async def events():
+        summary = BatchSummary()
+        yield format_sse({"type": "start", "items": len(items), "concurrency": concurrency})
+        async for item, result, duration in run_batch(script_executor, items, concurrency, batch.profile, batch.tracked):
+            event = {
+                "type": "item",
+                "index": item.index,
+                "script_id": item.script_id,
+                "parameters": item.parameters,
+                "duration_seconds": duration
+            }
+            if isinstance(result, Exception):
+                summary.add(False, duration)
+                event.update({"success": False, "error": str(result), "error_type": type(result).__name__})
+            else:
+                summary.add(result.success, duration, result.resource_usage)
+                event.update({"success": result.success, "result": build_execution_response(result).dict()})
+            yield format_sse(event)
+        yield format_sse({"type": "complete", **summary.to_dict()})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def run_script_job(job: Dict[str, Any]):
+    """Execute a queued job's script in this process and return its final status and stored result."""
+    stream = job_streams.open(job["id"])
+    final_event = {"type": "error", "is_error": True, "message": "Job stopped before completion"}
+    try:
+        job_status, response = await job_runner.run(job, on_output=stream.publish_output)
+        final_event = response
+        return job_status, response
+    finally:
+        await job_streams.close(job["id"], final_event)
+
+job_workers = JobWorkers(job_queue, run_script_job, job_queue_config)
+
+async def get_job_or_404(job_id: str) -> Dict[str, Any]:
+    try:
+        return await asyncio.to_thread(job_queue.get, job_id)
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+@router.post("/scripts/{script_id}/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_script_job(
+    script_id: str = Path(...,
+        regex=r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
+        description="UUID of the script to execute"
+    ),
+    tracked: bool = False,
+    profile: Optional[str] = None
+) -> Dict[str, Any]:
+    """Queue a script run and return its job immediately; poll the job for the result.
+
+    The script travels with the job so any worker can run it. tracked runs
+    it with the tracking prelude and keeps its output and page snapshots
+    as job artifacts, under the named execution profile.
+    """
+    script_path = script_service.scripts_dir / f"script_{script_id}.py"
+    if not script_path.exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Script with ID {script_id} not found")
+    validate_profile(profile)
+    payload = {"script": script_path.read_text(encoding="utf-8"), "tracked": tracked, "profile": profile}
+    model_path = script_model_path(script_id)
+    if model_path.exists():
+        payload.update(model=model_path.read_text(encoding="utf-8"), attempt=f"script:{script_id}")
+    job = await asyncio.to_thread(job_queue.submit, script_id, payload)
+    job_workers.notify()
+    return job
+
+@router.get("/jobs")
+async def list_jobs(job_status: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+    """Most recent jobs first, optionally filtered by status."""
+    jobs = await asyncio.to_thread(job_queue.list, job_status, min(limit, 500))
+    return {
+        "jobs": jobs,
+        "counts": await asyncio.to_thread(job_queue.get_stats),
+        "local_workers": job_workers.get_stats()
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> Dict[str, Any]:
+    """Status of a job, including its result once finished."""
+    return await get_job_or_404(job_id)
+
+@router.get("/jobs/{job_id}/result", response_model=ScriptExecutionResponse)
+async def get_job_result(job_id: str) -> ScriptExecutionResponse:
+    """The execution result of a finished job; 409 while it is still queued or running."""
+    job = await get_job_or_404(job_id)
+    if job["status"] not in FINISHED_STATUSES:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job {job_id} is {job['status']}")
+    if job["result"] is None:
+        return ScriptExecutionResponse(
+            type='error',
+            success=False,
+            is_error=True,
+            message=job["error"] or f"Job {job['status']}",
+            error=job["error"] or f"Job {job['status']}",
+            error_type='CancelledError' if job["status"] == CANCELLED else 'ExecutionError'
+        )
+    return ScriptExecutionResponse(**job["result"])
+
+@router.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str) -> StreamingResponse:
+    """Follow a job's output as server-sent events, ending with its result."""
+    job = await get_job_or_404(job_id)
+
+    async def events():
+        stream = job_streams.get(job_id)
+        if stream is None:
+            # Queued, or finished before this server last started: wait for it or report the stored result
+            while stream is None and job["status"] not in FINISHED_STATUSES:
+                await asyncio.sleep(job_queue_config.poll_interval)
+                job.update(await asyncio.to_thread(job_queue.get, job_id))
+                stream = job_streams.get(job_id)
+            if stream is None:
+                yield format_sse(job["result"] or {"type": "error", "is_error": True, "message": job["error"] or f"Job {job['status']}"})
+                return
+        async for event in stream.subscribe():
+            yield format_sse(event)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/jobs/{job_id}/artifacts")
+async def list_job_artifacts(job_id: str) -> Dict[str, Any]:
+    """Names of the files a tracked job's run uploaded, whichever worker ran it."""
+    await get_job_or_404(job_id)
+    return {"job_id": job_id, "artifacts": await asyncio.to_thread(artifact_store.list, job_id)}
+
+@router.get("/jobs/{job_id}/artifacts/{name}")
+async def get_job_artifact(job_id: str, name: str) -> FileResponse:
+    """Download one of a job's artifacts, e.g. output.txt or HTML-0.txt."""
+    await get_job_or_404(job_id)
+    try:
+        path = artifact_store.path(job_id, name)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Artifact {name} not found for job {job_id}")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=name)
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str) -> Dict[str, Any]:
+    """Cancel a queued job, or stop a running one."""
+    await get_job_or_404(job_id)
+    return await job_workers.cancel(job_id)
+
 @router.post("/generate-text", response_model=LLMResponse)
 async def generate_text(request: Dict[str, Any], llm_service: LLMService = Depends()) -> LLMResponse:
     """
@@ -359,7 +807,9 @@ async def generate_text(request: Dict[str, Any], llm_service: LLMService = Depen
         response = await llm_service.llm_client.generate_text(
             prompt=prompt,
             max_tokens=request.get("max_tokens", -1),
-            temperature=request.get("temperature", 0.7)
+            temperature=request.get("temperature", 0.7),
+            use_cache=not request.get("bypass_cache", False),
+            priority=Priority.AD_HOC
         )
         
         return LLMResponse(
@@ -372,6 +822,51 @@ async def generate_text(request: Dict[str, Any], llm_service: LLMService = Depen
         error_msg = f"Error generating text: {str(e)}"
         return LLMResponse(success=False, error=error_msg)
 
+@router.get("/llm/cache")
+async def llm_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the LLM response cache."""
+    if llm_client.response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_client.response_cache.get_stats()}
+
+@router.get("/llm/backends")
+async def llm_backends() -> Dict[str, Any]:
+    """Routing state of each configured inference backend and the admission queue."""
+    return {"backends": llm_client.router.get_status(), "admission": llm_client.admission.get_stats()}
+
+@router.get("/llm/models")
+async def llm_models() -> Dict[str, Any]:
+    """Configured model tiers with per-model latency and success rates, and the tokenizer budgets are counted with."""
+    return {
+        "tiers": list(llm_client.routing_policy.tiers),
+        "stats": llm_client.model_stats.get_stats(),
+        "tokenizer": get_token_counter().get_stats()
+    }
+
+@router.get("/llm/prompts")
+async def llm_prompt_stats() -> Dict[str, Any]:
+    """How much of each kind of prompt repeated the previous one's prefix, and so could reuse the KV cache."""
+    return {
+        "generate": generate_prompt_assembler.get_stats(),
+        "repair": repair_prompt_assembler.get_stats()
+    }
+
+@router.get("/browsers/pool")
+async def browser_pool_stats() -> Dict[str, Any]:
+    """Pooled browsers with their use counts, plus lease and recycle counters."""
+    return browser_pool.get_stats()
+
+@router.get("/executor/stats")
+async def script_executor_stats() -> Dict[str, Any]:
+    """Running and waiting script runs, timeouts and failures, plus the zygote, install and dependency checks."""
+    return {
+        "executor": script_executor.get_stats(),
+        "zygote": execution_zygote.get_stats(),
+        "playwright_install": playwright_install.get_stats(),
+        "dependencies": dependency_checker.get_stats(),
+        "dependency_environments": dependency_envs.get_stats()
+    }
+
 @router.get("/health")
 async def health_check() -> Dict[str, str]:
     """Health check endpoint."""
@@ -0,0 +1,52 @@
+from pathlib import Path
+import logging
+import os
+import re
+import shutil
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Files the tracking prelude leaves next to a tracked script
+ARTIFACT_PATTERN = re.compile(r"^(output\.txt|errorMessage\.txt|HTML-\d+\.txt|url-\d+\.txt|blockedRequests\.json)$")
+
+class ArtifactStore:
+    """Run artifacts kept per job under a directory every worker and the API can reach.
+
+    Uploads are written to a temporary name and renamed, so readers on
+    other machines never see a partial file.
+    """
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def _job_dir(self, job_id):
+        if not re.match(r"^[\w-]+$", job_id):
+            raise ValueError(f"Invalid job id: {job_id}")
+        return self.root / job_id
+
+    def path(self, job_id, name):
+        if Path(name).name != name or name.startswith("."):
+            raise ValueError(f"Invalid artifact name: {name}")
+        return self._job_dir(job_id) / name
+
+    def put(self, job_id, source_path, name=None):
+        target = self.path(job_id, name or Path(source_path).name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temporary = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}")
+        shutil.copyfile(source_path, temporary)
+        os.replace(temporary, target)
+        return target.name
+
+    def upload_run(self, job_id, run_dir):
+        """Copy the tracking artifacts a run left in run_dir; returns their names."""
+        names = []
+        for source in sorted(Path(run_dir).iterdir()):
+            if source.is_file() and ARTIFACT_PATTERN.match(source.name):
+                names.append(self.put(job_id, source))
+        return names
+
+    def list(self, job_id):
+        job_dir = self._job_dir(job_id)
+        if not job_dir.is_dir():
+            return []
+        return sorted(path.name for path in job_dir.iterdir() if path.is_file() and not path.name.startswith("."))
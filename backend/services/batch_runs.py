@@ -0,0 +1,118 @@
+from contextlib import suppress
+from dataclasses import dataclass
+from pathlib import Path
+import asyncio
+import json
+import logging
+import tempfile
+import time
+
+from backend.services.script_tracking import create_tracked_script
+
+logger = logging.getLogger(__name__)
+
+# A swept script reads its parameter set from this variable as JSON
+PARAMETERS_ENV = "SCRIPT_PARAMETERS"
+
+@dataclass
+class BatchConfig:
+    """Size and concurrency caps for batch runs."""
+    max_items: int = 500
+    max_concurrency: int = 16
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        return cls(
+            max_items=int(values.get("BATCH_MAX_ITEMS") or defaults.max_items),
+            max_concurrency=int(values.get("BATCH_MAX_CONCURRENCY") or defaults.max_concurrency),
+        )
+
+@dataclass
+class BatchItem:
+    index: int
+    script_id: str
+    script_path: Path
+    parameters: dict = None
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+class BatchSummary:
+    """Aggregate timing of a batch, reported once every item has finished."""
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.durations = []
+        self.succeeded = 0
+        self.failed = 0
+        self.cpu_seconds = 0.0
+
+    def add(self, success, duration, resource_usage=None):
+        self.durations.append(duration)
+        if success:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self.cpu_seconds += (resource_usage or {}).get("cpu_seconds", 0)
+
+    def to_dict(self):
+        wall_seconds = time.monotonic() - self.started_at
+        return {
+            "items": len(self.durations),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "wall_seconds": round(wall_seconds, 3),
+            "run_seconds_total": round(sum(self.durations), 3),
+            "run_seconds_p50": percentile(self.durations, 0.5),
+            "run_seconds_p95": percentile(self.durations, 0.95),
+            "run_seconds_max": max(self.durations, default=None),
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "items_per_minute": round(len(self.durations) * 60 / wall_seconds, 2) if wall_seconds else None,
+        }
+
+async def run_tracked_item(script_executor, item, env, profile):
+    """Run a copy of the item's script with the tracking prelude, in a directory of its own."""
+    with tempfile.TemporaryDirectory(prefix=f"batch_{item.index}_") as run_dir:
+        run_dir = Path(run_dir)
+        (run_dir / "scriptUnmodified.py").write_text(item.script_path.read_text(encoding="utf-8"), encoding="utf-8")
+        create_tracked_script(run_dir / "scriptUnmodified.py", run_dir / "script.py")
+        return await script_executor.run(run_dir / "script.py", env=env, profile=profile)
+
+async def run_batch(script_executor, items, concurrency, profile=None, tracked=False):
+    """Run items through the executor, at most concurrency at a time, yielding (item, result, seconds) as each finishes.
+
+    The executor's own semaphore, browser pool and zygote are shared with
+    every other run. tracked runs each item with the tracking prelude under
+    the named execution profile, as tracked jobs are. result is the
+    ScriptResult, or the exception the run raised. Closing the generator
+    cancels the items still queued or running.
+    """
+    finished = asyncio.Queue()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_item(item):
+        async with semaphore:
+            env = {PARAMETERS_ENV: json.dumps(item.parameters)} if item.parameters is not None else None
+            started_at = time.monotonic()
+            try:
+                if tracked:
+                    result = await run_tracked_item(script_executor, item, env, profile)
+                else:
+                    result = await script_executor.run(item.script_path, env=env)
+            except Exception as e:
+                logger.error(f"Batch item {item.index} ({item.script_id}) failed: {e}", exc_info=True)
+                result = e
+            await finished.put((item, result, round(time.monotonic() - started_at, 3)))
+
+    tasks = [asyncio.create_task(run_item(item)) for item in items]
+    try:
+        for _ in tasks:
+            yield await finished.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+        with suppress(asyncio.CancelledError):
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,257 @@
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass
+from pathlib import Path
+import asyncio
+import logging
+import os
+import socket
+import time
+
+logger = logging.getLogger(__name__)
+
+# Read by the tracking prelude's launch hook (see script_tracking.generate_prelude)
+BROWSER_ENDPOINT_ENV = "PLAYWRIGHT_BROWSER_ENDPOINT"
+# Whether the pooled browsers are headless ("1") or headed ("0"); a launch wanting the other mode launches its own
+BROWSER_HEADLESS_ENV = "PLAYWRIGHT_BROWSER_HEADLESS"
+# Holds the sitecustomize that gives untracked scripts the same launch hook
+LAUNCH_HOOK_DIR = Path(__file__).resolve().parent / "browser_pool_hook"
+
+class BrowserPoolTimeoutError(Exception):
+    """Raised when no pooled browser becomes free within acquire_timeout."""
+
+@dataclass
+class BrowserPoolConfig:
+    """Size, recycle and health-check settings for the warm browser pool; size 0 disables it."""
+    size: int = 0
+    max_uses: int = 50
+    health_interval: float = 30.0
+    health_timeout: float = 5.0
+    acquire_timeout: float = 60.0
+    headless: bool = True
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        headless = values.get("BROWSER_POOL_HEADLESS")
+        return cls(
+            size=int(values.get("BROWSER_POOL_SIZE") or defaults.size),
+            max_uses=int(values.get("BROWSER_POOL_MAX_USES") or defaults.max_uses),
+            health_interval=float(values.get("BROWSER_POOL_HEALTH_INTERVAL") or defaults.health_interval),
+            health_timeout=float(values.get("BROWSER_POOL_HEALTH_TIMEOUT") or defaults.health_timeout),
+            acquire_timeout=float(values.get("BROWSER_POOL_ACQUIRE_TIMEOUT") or defaults.acquire_timeout),
+            headless=defaults.headless if headless is None else headless.lower() in ("1", "true", "yes"),
+        )
+
+@dataclass
+class PooledBrowser:
+    browser: object
+    port: int
+    uses: int = 0
+    leased: bool = False
+    launched_at: float = 0.0
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.port}"
+
+def launch_hook_env(env):
+    """env's PYTHONPATH with the launch hook first, for a script without the tracking prelude."""
+    pythonpath = env.get("PYTHONPATH") or os.environ.get("PYTHONPATH")
+    return {"PYTHONPATH": os.pathsep.join(filter(None, (str(LAUNCH_HOOK_DIR), pythonpath)))}
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class BrowserPool:
+    """Pre-launched Chromium instances that script runs connect to over CDP.
+
+    Each browser serves one run at a time. The run connects with
+    connect_over_cdp and works in contexts it creates itself; when the lease
+    is returned any contexts and pages it left behind are disposed, so the
+    next run starts clean. Browsers are relaunched after max_uses runs or
+    when a health check fails. They are the server's children, so a run's
+    rlimits and resource accounting do not cover the browser it leases.
+    Every browser runs in the configured headless mode, which a lease
+    reports so that a launch asking for the other mode skips the pool.
+    """
+    def __init__(self, pool_config=None):
+        self.pool_config = pool_config or BrowserPoolConfig()
+        self._playwright = None
+        self._browsers = []
+        self._condition = asyncio.Condition()
+        self._health_task = None
+        self.stats = {"leases": 0, "launches": 0, "recycled": 0, "unhealthy": 0, "wait_seconds": 0.0}
+
+    @property
+    def enabled(self):
+        return self._playwright is not None
+
+    async def start(self):
+        if self.pool_config.size <= 0 or self._playwright is not None:
+            return
+        try:
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+        except Exception as e:
+            logger.warning(f"Browser pool disabled, could not start Playwright: {e}")
+            return
+        await self._fill()
+        self._health_task = asyncio.create_task(self.run_health_checks())
+        logger.info(f"Browser pool started with {len(self._browsers)} browser(s)")
+
+    async def _launch(self):
+        port = find_free_port()
+        browser = await self._playwright.chromium.launch(
+            headless=self.pool_config.headless,
+            args=[f"--remote-debugging-port={port}"]
+        )
+        self.stats["launches"] += 1
+        return PooledBrowser(browser=browser, port=port, launched_at=time.monotonic())
+
+    async def _fill(self):
+        missing = self.pool_config.size - len(self._browsers)
+        if missing <= 0:
+            return
+        results = await asyncio.gather(*(self._launch() for _ in range(missing)), return_exceptions=True)
+        async with self._condition:
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.warning(f"Could not launch pooled browser: {result}")
+                else:
+                    self._browsers.append(result)
+            self._condition.notify_all()
+
+    def _idle_browser(self):
+        return next((pooled for pooled in self._browsers if not pooled.leased), None)
+
+    async def acquire(self):
+        started_at = time.monotonic()
+        async with self._condition:
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(self._idle_browser),
+                    timeout=self.pool_config.acquire_timeout
+                )
+            except asyncio.TimeoutError:
+                raise BrowserPoolTimeoutError(
+                    f"No pooled browser became free within {self.pool_config.acquire_timeout}s"
+                ) from None
+            pooled = self._idle_browser()
+            pooled.leased = True
+            pooled.uses += 1
+        self.stats["leases"] += 1
+        self.stats["wait_seconds"] += time.monotonic() - started_at
+        return pooled
+
+    async def release(self, pooled):
+        if pooled.uses >= self.pool_config.max_uses:
+            self.stats["recycled"] += 1
+            await self._replace(pooled)
+            return
+        try:
+            await asyncio.wait_for(self._reset(pooled), timeout=self.pool_config.health_timeout)
+        except Exception as e:
+            logger.warning(f"Could not reset pooled browser {pooled.endpoint}, replacing it: {e}")
+            await self._replace(pooled)
+            return
+        async with self._condition:
+            pooled.leased = False
+            self._condition.notify()
+
+    @asynccontextmanager
+    async def lease(self):
+        """Yield environment variables pointing a script run at a pooled browser, or {} when disabled."""
+        if not self.enabled:
+            yield {}
+            return
+        pooled = await self.acquire()
+        try:
+            yield {BROWSER_ENDPOINT_ENV: pooled.endpoint, BROWSER_HEADLESS_ENV: "1" if self.pool_config.headless else "0"}
+        finally:
+            await self.release(pooled)
+
+    async def _reset(self, pooled):
+        """Close whatever the last run left open: its pages and its browser contexts."""
+        session = await pooled.browser.new_browser_cdp_session()
+        try:
+            targets = await session.send("Target.getTargets")
+            for target in targets.get("targetInfos", []):
+                if target.get("type") == "page":
+                    await session.send("Target.closeTarget", {"targetId": target["targetId"]})
+            contexts = await session.send("Target.getBrowserContexts")
+            for context_id in contexts.get("browserContextIds", []):
+                await session.send("Target.disposeBrowserContext", {"browserContextId": context_id})
+        finally:
+            with suppress(Exception):
+                await session.detach()
+
+    async def _replace(self, pooled):
+        async with self._condition:
+            if pooled in self._browsers:
+                self._browsers.remove(pooled)
+        with suppress(Exception):
+            await pooled.browser.close()
+        await self._fill()
+
+    async def _is_healthy(self, pooled):
+        if not pooled.browser.is_connected():
+            return False
+        try:
+            session = await pooled.browser.new_browser_cdp_session()
+            try:
+                await asyncio.wait_for(session.send("Browser.getVersion"), timeout=self.pool_config.health_timeout)
+            finally:
+                with suppress(Exception):
+                    await session.detach()
+        except Exception as e:
+            logger.debug(f"Health check for pooled browser {pooled.endpoint} failed: {e}")
+            return False
+        return True
+
+    async def run_health_checks(self):
+        while True:
+            await asyncio.sleep(self.pool_config.health_interval)
+            for pooled in list(self._browsers):
+                async with self._condition:
+                    if pooled.leased or pooled not in self._browsers:
+                        continue
+                    pooled.leased = True
+                if await self._is_healthy(pooled):
+                    async with self._condition:
+                        pooled.leased = False
+                        self._condition.notify()
+                else:
+                    logger.warning(f"Pooled browser {pooled.endpoint} failed its health check, relaunching")
+                    self.stats["unhealthy"] += 1
+                    await self._replace(pooled)
+            await self._fill()
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._health_task
+            self._health_task = None
+        for pooled in self._browsers:
+            with suppress(Exception):
+                await pooled.browser.close()
+        self._browsers = []
+        if self._playwright is not None:
+            with suppress(Exception):
+                await self._playwright.stop()
+            self._playwright = None
+
+    def get_stats(self):
+        return {
+            "enabled": self.enabled,
+            "size": self.pool_config.size,
+            "headless": self.pool_config.headless,
+            "max_uses": self.pool_config.max_uses,
+            "browsers": [
+                {"endpoint": b.endpoint, "uses": b.uses, "leased": b.leased}
+                for b in self._browsers
+            ],
+            **self.stats,
+        }
@@ -0,0 +1,59 @@
+"""Points an untracked script's Chromium launches at the browser pool.
+
+Put on the PYTHONPATH of runs that leased a pooled browser, so Python
+imports it at startup (the zygote imports it by hand). Tracked scripts get
+the same hook from their prelude instead. Both the async and the sync API
+are patched, since saved scripts use either.
+"""
+import os
+import sys
+
+# Same as browser_pool's; this file runs before the backend package is importable
+BROWSER_ENDPOINT_ENV = "PLAYWRIGHT_BROWSER_ENDPOINT"
+BROWSER_HEADLESS_ENV = "PLAYWRIGHT_BROWSER_HEADLESS"
+
+def use_pool(browser_type, kwargs):
+    """Only Chromium launches in the pool's headless mode (Playwright's default is headless) connect to it."""
+    pool_headless = os.environ.get(BROWSER_HEADLESS_ENV, "1") == "1"
+    return browser_type.name == "chromium" and bool(kwargs.get("headless", True)) == pool_headless
+
+def report_connect_failure(error):
+    print(f"[browser pool] Could not connect to pooled browser, launching: {error}", file=sys.stderr)
+
+def patch_async_api():
+    try:
+        from playwright.async_api import BrowserType
+    except ImportError:
+        return
+    browser_launch_reference = BrowserType.launch
+
+    async def launch_pooled_browser(self, *args, **kwargs):
+        if use_pool(self, kwargs):
+            try:
+                return await self.connect_over_cdp(os.environ[BROWSER_ENDPOINT_ENV])
+            except Exception as error:
+                report_connect_failure(error)
+        return await browser_launch_reference(self, *args, **kwargs)
+
+    BrowserType.launch = launch_pooled_browser
+
+def patch_sync_api():
+    try:
+        from playwright.sync_api import BrowserType
+    except ImportError:
+        return
+    browser_launch_reference = BrowserType.launch
+
+    def launch_pooled_browser(self, *args, **kwargs):
+        if use_pool(self, kwargs):
+            try:
+                return self.connect_over_cdp(os.environ[BROWSER_ENDPOINT_ENV])
+            except Exception as error:
+                report_connect_failure(error)
+        return browser_launch_reference(self, *args, **kwargs)
+
+    BrowserType.launch = launch_pooled_browser
+
+if os.environ.get(BROWSER_ENDPOINT_ENV):
+    patch_async_api()
+    patch_sync_api()
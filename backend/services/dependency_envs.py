@@ -0,0 +1,217 @@
+from contextlib import suppress
+from dataclasses import dataclass, field
+from pathlib import Path
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import sys
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+READY = "ready"
+BUILDING = "building"
+FAILED = "failed"
+
+SAFE_PACKAGE_NAME = re.compile(r"^[a-zA-Z0-9._-]+$")
+MANIFEST_NAME = ".environment.json"
+
+@dataclass
+class DependencyEnvConfig:
+    """Where dependency overlays and the wheel cache live, and how builds are bounded."""
+    env_dir: str = "data/envs"
+    wheel_dir: str = "data/wheels"
+    build_concurrency: int = 2
+    build_timeout: float = 600.0
+    wait_seconds: float = 0.0
+    retry_seconds: float = 300.0
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        return cls(
+            env_dir=values.get("DEPENDENCY_ENV_DIR") or defaults.env_dir,
+            wheel_dir=values.get("DEPENDENCY_WHEEL_DIR") or defaults.wheel_dir,
+            build_concurrency=int(values.get("DEPENDENCY_ENV_BUILD_CONCURRENCY") or defaults.build_concurrency),
+            build_timeout=float(values.get("DEPENDENCY_ENV_BUILD_TIMEOUT") or defaults.build_timeout),
+            wait_seconds=float(values.get("DEPENDENCY_ENV_WAIT_SECONDS") or defaults.wait_seconds),
+            retry_seconds=float(values.get("DEPENDENCY_ENV_RETRY_SECONDS") or defaults.retry_seconds),
+        )
+
+def requirements_key(requirements):
+    """Content address of a requirement set for this interpreter."""
+    identity = {
+        "python": f"{sys.implementation.name}-{sys.version_info.major}.{sys.version_info.minor}",
+        "platform": platform.machine(),
+        "requirements": sorted(name.lower() for name in requirements),
+    }
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+@dataclass
+class DependencyEnvironment:
+    key: str
+    requirements: list
+    status: str
+    path: str = None
+    error: str = None
+    failed_at: float = 0.0
+    task: object = field(default=None, repr=False)
+
+    @property
+    def env(self):
+        """Variables that put the overlay ahead of the server's own site-packages."""
+        if not self.path:
+            return {}
+        return {"PYTHONPATH": os.pathsep.join(filter(None, (self.path, os.environ.get("PYTHONPATH"))))}
+
+class DependencyEnvironments:
+    """Prebuilt package overlays, one per set of packages scripts need beyond the server's.
+
+    The requirement set a script resolves to (see DependencyChecker) is
+    hashed, and its overlay is installed with pip --target into env_dir/<hash>
+    and put on the script's PYTHONPATH. Overlays are built once in the
+    background: offline from the shared wheel_dir when it has everything,
+    otherwise after fetching each requirement's wheels into it in parallel.
+    The install goes to a temporary directory that is renamed into place,
+    so concurrent runs and server processes never see a half-installed
+    overlay. An interactive run never waits for pip beyond wait_seconds;
+    until its overlay is ready it fails with a DependencyError saying it is
+    building. Queued jobs have no caller waiting, so they wait for the build.
+    """
+    def __init__(self, dependency_checker, env_config=None):
+        self.dependency_checker = dependency_checker
+        self.env_config = env_config or DependencyEnvConfig()
+        self._environments = {}
+        self._semaphore = asyncio.Semaphore(self.env_config.build_concurrency)
+        self.stats = {"resolves": 0, "builds": 0, "build_failures": 0, "not_ready": 0}
+
+    def _environment_for(self, requirements):
+        key = requirements_key(requirements)
+        environment = self._environments.get(key)
+        if environment is None:
+            path = Path(self.env_config.env_dir) / key
+            if (path / MANIFEST_NAME).exists():
+                environment = DependencyEnvironment(key, requirements, READY, str(path.resolve()))
+            else:
+                environment = DependencyEnvironment(key, requirements, BUILDING)
+                environment.task = asyncio.create_task(self._build(environment))
+            self._environments[key] = environment
+        elif environment.status == FAILED and time.monotonic() - environment.failed_at >= self.env_config.retry_seconds:
+            environment.status = BUILDING
+            environment.error = None
+            environment.task = asyncio.create_task(self._build(environment))
+        return environment
+
+    async def prepare(self, script_content):
+        """Start building the script's overlay if it needs one that does not exist yet."""
+        requirements = await asyncio.to_thread(self.dependency_checker.missing_packages, script_content)
+        if not requirements:
+            return None
+        return self._environment_for(requirements)
+
+    async def resolve(self, script_content, wait=False):
+        """The script's environment; status is READY (path None when none is needed), BUILDING or FAILED.
+
+        With wait, a building environment is waited for until its build ends
+        instead of for at most wait_seconds.
+        """
+        self.stats["resolves"] += 1
+        environment = await self.prepare(script_content)
+        if environment is None:
+            return DependencyEnvironment("", [], READY)
+        if environment.status == BUILDING and (wait or self.env_config.wait_seconds > 0):
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(
+                    asyncio.shield(environment.task), timeout=None if wait else self.env_config.wait_seconds
+                )
+        if environment.status != READY:
+            self.stats["not_ready"] += 1
+        return environment
+
+    async def _build(self, environment):
+        async with self._semaphore:
+            started_at = time.monotonic()
+            final_path = Path(self.env_config.env_dir) / environment.key
+            build_path = Path(self.env_config.env_dir) / f".{environment.key}.{uuid.uuid4().hex[:8]}"
+            wheel_dir = Path(self.env_config.wheel_dir)
+            self.stats["builds"] += 1
+            try:
+                unsafe = [name for name in environment.requirements if not SAFE_PACKAGE_NAME.match(name)]
+                if unsafe:
+                    raise ValueError(f"Invalid package name(s): {', '.join(unsafe)}")
+                wheel_dir.mkdir(parents=True, exist_ok=True)
+                logger.info(f"Building dependency environment {environment.key} for {', '.join(environment.requirements)}")
+                install = (
+                    "install", "--no-index", "--find-links", str(wheel_dir), "--target", str(build_path),
+                    *environment.requirements
+                )
+                try:
+                    await self._pip(*install)
+                except RuntimeError:
+                    # Not all in the wheel cache yet: fetch the missing wheels in parallel, then install offline
+                    shutil.rmtree(build_path, ignore_errors=True)
+                    await asyncio.gather(*(
+                        self._pip("wheel", "--wheel-dir", str(wheel_dir), "--find-links", str(wheel_dir), name)
+                        for name in environment.requirements
+                    ))
+                    await self._pip(*install)
+                (build_path / MANIFEST_NAME).write_text(json.dumps({
+                    "requirements": environment.requirements,
+                    "python": sys.version,
+                    "built_at": time.time(),
+                }), encoding="utf-8")
+                try:
+                    os.replace(build_path, final_path)
+                except OSError:
+                    # Another server process finished the same environment first
+                    if not (final_path / MANIFEST_NAME).exists():
+                        raise
+            except Exception as e:
+                environment.status = FAILED
+                environment.error = str(e)
+                environment.failed_at = time.monotonic()
+                self.stats["build_failures"] += 1
+                logger.error(f"Dependency environment {environment.key} failed to build: {e}")
+                return
+            finally:
+                shutil.rmtree(build_path, ignore_errors=True)
+            environment.path = str(final_path.resolve())
+            environment.status = READY
+            logger.info(f"Dependency environment {environment.key} ready in {time.monotonic() - started_at:.1f}s")
+
+    async def _pip(self, *args):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "pip", *args, "--disable-pip-version-check",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), timeout=self.env_config.build_timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise RuntimeError(f"pip {args[0]} timed out after {self.env_config.build_timeout:g} seconds")
+        if process.returncode != 0:
+            raise RuntimeError(f"pip {args[0]} failed: {stderr.decode(errors='replace').strip()[-2000:]}")
+
+    async def close(self):
+        tasks = [env.task for env in self._environments.values() if env.task is not None and not env.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.to_thread(self.dependency_checker.flush)
+
+    def get_stats(self):
+        return {
+            "environments": {
+                key: {"status": env.status, "requirements": env.requirements, "error": env.error}
+                for key, env in self._environments.items()
+            },
+            **self.stats,
+        }
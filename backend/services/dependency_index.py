@@ -0,0 +1,209 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from importlib import metadata
+from pathlib import Path
+import ast
+import hashlib
+import importlib.util
+import json
+import logging
+import site
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Import names whose distribution is named differently
+PACKAGE_ALIASES = {
+    "cv2": "opencv-python",
+    "PIL": "Pillow",
+    "yaml": "pyyaml",
+    "bs4": "beautifulsoup4",
+    "sklearn": "scikit-learn",
+    "dateutil": "python-dateutil",
+}
+
+STDLIB_MODULES = set(sys.builtin_module_names) | set(getattr(sys, "stdlib_module_names", ()))
+NON_MODULE_DIRS = {"__pycache__", "bin", "..", ""}
+
+@dataclass
+class DependencyConfig:
+    """Where the import index is kept, how many scripts' import sets are remembered and how often new ones are saved."""
+    index_path: str = "data/import_index.json"
+    max_cached_scripts: int = 1000
+    save_interval: float = 30.0
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        return cls(
+            index_path=values.get("DEPENDENCY_INDEX_PATH") or defaults.index_path,
+            max_cached_scripts=int(values.get("DEPENDENCY_MAX_CACHED_SCRIPTS") or defaults.max_cached_scripts),
+            save_interval=float(values.get("DEPENDENCY_INDEX_SAVE_INTERVAL") or defaults.save_interval),
+        )
+
+def site_packages_dirs():
+    dirs = [*site.getsitepackages(), site.getusersitepackages()]
+    return [d for d in dict.fromkeys(dirs) if Path(d).is_dir()]
+
+def site_packages_fingerprint():
+    """mtimes of the site-packages directories, which change whenever a distribution is added or removed."""
+    return {d: Path(d).stat().st_mtime for d in site_packages_dirs()}
+
+def top_level_names(dist):
+    """Import names a distribution provides, from top_level.txt or else its installed files."""
+    top_level = dist.read_text("top_level.txt")
+    if top_level:
+        return {name.strip() for name in top_level.splitlines() if name.strip()}
+    names = set()
+    for file in dist.files or ():
+        first = file.parts[0] if file.parts else ""
+        if first.endswith((".dist-info", ".egg-info", ".pth", ".data")) or first in NON_MODULE_DIRS:
+            continue
+        if len(file.parts) == 1:
+            if first.endswith(".py"):
+                names.add(first[:-3])
+            elif first.endswith((".so", ".pyd")):
+                names.add(first.split(".", 1)[0])
+        else:
+            names.add(first)
+    return names
+
+def build_import_index():
+    index = {}
+    for dist in metadata.distributions():
+        try:
+            name = dist.metadata["Name"]
+        except (KeyError, AttributeError):
+            continue
+        if not name:
+            continue
+        index.setdefault(name.lower(), name)
+        index.setdefault(name.lower().replace("-", "_"), name)
+        for import_name in top_level_names(dist):
+            index.setdefault(import_name.lower(), name)
+    return index
+
+def parse_imports(script_content):
+    """Top-level, non-stdlib modules a script imports (absolute imports only)."""
+    imports = set()
+    try:
+        tree = ast.parse(script_content)
+    except SyntaxError:
+        return []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            imports.add(node.module.split(".")[0])
+    return sorted(name for name in imports if name and name not in STDLIB_MODULES and not name.startswith("_"))
+
+class DependencyChecker:
+    """Finds the packages a script imports but the server's interpreter lacks.
+
+    An index from import name to installed distribution is persisted in
+    index_path and rebuilt only when the site-packages directories' mtimes
+    change. Each script's import set is cached by content hash, and so is
+    its list of missing packages for the current index, so a warm check is
+    a hash, a few stats and a dictionary lookup. A rebuilt index is saved at
+    once; newly parsed import sets at most every save_interval seconds, and
+    on flush(). Checks may run in worker threads; a lock serialises them.
+    """
+    def __init__(self, dependency_config=None):
+        self.dependency_config = dependency_config or DependencyConfig()
+        self._fingerprint = None
+        self._index = None
+        self._script_imports = OrderedDict()
+        self._missing = {}
+        self._lock = threading.Lock()
+        self._unsaved = False
+        self._saved_at = time.monotonic()
+        self.stats = {"checks": 0, "index_builds": 0, "import_parses": 0}
+        self._load()
+
+    def _load(self):
+        try:
+            stored = json.loads(Path(self.dependency_config.index_path).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        self._fingerprint = stored.get("fingerprint")
+        self._index = stored.get("index")
+        self._script_imports.update(stored.get("scripts") or {})
+
+    def _save(self):
+        index_path = Path(self.dependency_config.index_path)
+        self._unsaved = False
+        self._saved_at = time.monotonic()
+        try:
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            index_path.write_text(json.dumps({
+                "fingerprint": self._fingerprint,
+                "index": self._index,
+                "scripts": dict(self._script_imports),
+            }), encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"Could not save the import index: {e}")
+
+    def _current_index(self):
+        fingerprint = site_packages_fingerprint()
+        if self._index is None or fingerprint != self._fingerprint:
+            started_at = time.perf_counter()
+            self._index = build_import_index()
+            self._fingerprint = fingerprint
+            self._missing.clear()
+            importlib.invalidate_caches()
+            self.stats["index_builds"] += 1
+            logger.info(f"Indexed {len(self._index)} import names in {time.perf_counter() - started_at:.3f}s")
+            self._save()
+        return self._index
+
+    def imports_for(self, script_content, script_hash=None):
+        script_hash = script_hash or hashlib.sha256(script_content.encode("utf-8")).hexdigest()
+        imports = self._script_imports.get(script_hash)
+        if imports is None:
+            imports = self._script_imports[script_hash] = parse_imports(script_content)
+            self.stats["import_parses"] += 1
+            while len(self._script_imports) > self.dependency_config.max_cached_scripts:
+                self._script_imports.popitem(last=False)
+            self._unsaved = True
+            if time.monotonic() - self._saved_at >= self.dependency_config.save_interval:
+                self._save()
+        else:
+            self._script_imports.move_to_end(script_hash)
+        return imports
+
+    def missing_packages(self, script_content):
+        """Distributions to install for the script's imports; empty when all are present.
+
+        May walk every installed distribution, so async callers run it in a thread.
+        """
+        script_hash = hashlib.sha256(script_content.encode("utf-8")).hexdigest()
+        with self._lock:
+            self.stats["checks"] += 1
+            index = self._current_index()
+            missing = self._missing.get(script_hash)
+            if missing is None:
+                missing = []
+                for name in self.imports_for(script_content, script_hash):
+                    if name.lower() in index:
+                        continue
+                    # Modules outside any distribution, e.g. on PYTHONPATH
+                    if importlib.util.find_spec(name) is not None:
+                        continue
+                    missing.append(PACKAGE_ALIASES.get(name, name))
+                self._missing[script_hash] = missing
+        return missing
+
+    def flush(self):
+        """Save import sets parsed since the last save."""
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def get_stats(self):
+        return {
+            "indexed_names": len(self._index or {}),
+            "cached_scripts": len(self._script_imports),
+            **self.stats,
+        }
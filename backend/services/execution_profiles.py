@@ -0,0 +1,86 @@
+from dataclasses import asdict, dataclass
+from pathlib import Path
+import json
+import re
+
+# Read by the tracking prelude (see script_tracking.generate_prelude)
+PROFILE_ENV = "TRACKING_PROFILE"
+BLOCKING_REPORT_NAME = "blockedRequests.json"
+
+# Hosts whose requests only feed analytics, ads or tag managers
+ANALYTICS_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "facebook.net",
+    "connect.facebook.net",
+    "hotjar.com",
+    "segment.io",
+    "segment.com",
+    "mixpanel.com",
+    "amplitude.com",
+    "clarity.ms",
+    "newrelic.com",
+    "nr-data.net",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "taboola.com",
+    "outbrain.com",
+    "criteo.com",
+)
+
+# Per-script allow-list comments, e.g. "# allow-resources: image" or "# allow-hosts: maps.example.com"
+ALLOW_COMMENT = re.compile(r"^[ \t]*#[ \t]*allow-(resources|hosts)[ \t]*:[ \t]*(.+)$", re.MULTILINE)
+
+@dataclass(frozen=True)
+class ExecutionProfile:
+    """How tracked scripts launch their browser and which requests they skip."""
+    name: str
+    headless: bool
+    block_resource_types: tuple = ()
+    block_hosts: tuple = ()
+
+PROFILES = {
+    # What the tracking prelude has always done: a visible browser, nothing blocked
+    "debug-headed": ExecutionProfile("debug-headed", headless=False),
+    "production-headless": ExecutionProfile(
+        "production-headless",
+        headless=True,
+        block_resource_types=("image", "media", "font"),
+        block_hosts=ANALYTICS_HOSTS,
+    ),
+}
+
+DEFAULT_PROFILE = "production-headless"
+
+def get_profile(name):
+    try:
+        return PROFILES[name or DEFAULT_PROFILE]
+    except KeyError:
+        raise ValueError(f"Unknown execution profile '{name}'; expected one of {', '.join(PROFILES)}") from None
+
+def parse_allow_lists(script_content):
+    """Resource types and hosts a script's allow-list comments exempt from blocking."""
+    allowed = {"resources": set(), "hosts": set()}
+    for kind, values in ALLOW_COMMENT.findall(script_content):
+        allowed[kind].update(value.strip().lower() for value in values.split(",") if value.strip())
+    return allowed
+
+def profile_env(profile, script_content=""):
+    """The prelude's view of a profile, with the script's allow-lists applied."""
+    allowed = parse_allow_lists(script_content)
+    settings = asdict(profile)
+    settings["block_resource_types"] = [t for t in profile.block_resource_types if t not in allowed["resources"]]
+    settings["allow_hosts"] = sorted(allowed["hosts"])
+    return {PROFILE_ENV: json.dumps(settings)}
+
+def read_blocking_report(run_dir, profile):
+    """Blocked request counts the prelude left in run_dir, or zeros when it blocked nothing."""
+    report = {"profile": profile.name, "requests": 0, "estimated_bytes": 0, "by_type": {}, "by_host": {}}
+    try:
+        report.update(json.loads((Path(run_dir) / BLOCKING_REPORT_NAME).read_text(encoding="utf-8")))
+    except (OSError, ValueError):
+        pass
+    return report
@@ -0,0 +1,138 @@
+from dotenv import dotenv_values
+from pathlib import Path
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+import tempfile
+
+# Run as a script, so the backend package is two levels up
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from backend.models.responses import build_execution_response
+from backend.services.artifact_store import ArtifactStore
+from backend.services.browser_pool import BrowserPool, BrowserPoolConfig
+from backend.services.dependency_envs import DependencyEnvConfig, DependencyEnvironments
+from backend.services.dependency_index import DependencyChecker, DependencyConfig
+from backend.services.execution_zygote import ExecutionZygote, ZygoteConfig
+from backend.services.job_queue import FAILED, SUCCEEDED, JobQueue, JobQueueConfig, JobWorkers
+from backend.services.model_routing import ModelStats
+from backend.services.playwright_install import PlaywrightInstallCheck, PlaywrightInstallConfig
+from backend.services.run_resources import ResourceLimits
+from backend.services.script_executor import AsyncScriptExecutor, ExecutorConfig
+from backend.services.script_tracking import create_tracked_script
+
+config = dotenv_values()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARTIFACT_DIR = "data/artifacts"
+
+class JobRunner:
+    """Runs one job's script in a fresh directory and uploads what it leaves behind.
+
+    The script comes from the job payload, so a worker needs no access to
+    the API's scripts directory, falling back to scripts_dir for jobs
+    submitted without it. Tracked jobs get the tracking prelude, whose
+    output.txt, errorMessage.txt, HTML-N.txt and url-N.txt are copied to the
+    shared artifact store and listed in the result, as is blockedRequests.json
+    under the payload's execution profile. Jobs whose payload names the
+    model that generated the script record the run's outcome for it in
+    model_stats, under the payload's attempt.
+    """
+    def __init__(self, script_executor, artifact_store, scripts_dir=None, model_stats=None):
+        self.script_executor = script_executor
+        self.artifact_store = artifact_store
+        self.scripts_dir = Path(scripts_dir) if scripts_dir else None
+        self.model_stats = model_stats
+
+    def _script_for(self, job):
+        script = job["payload"].get("script")
+        if script is None and self.scripts_dir is not None:
+            script = (self.scripts_dir / f"script_{job['script_id']}.py").read_text(encoding="utf-8")
+        if script is None:
+            raise FileNotFoundError(f"Job {job['id']} carries no script and no scripts directory is configured")
+        return script
+
+    async def run(self, job, on_output=None):
+        script = self._script_for(job)
+        with tempfile.TemporaryDirectory(prefix=f"job_{job['id']}_") as run_dir:
+            run_dir = Path(run_dir)
+            script_path = run_dir / "script.py"
+            if job["payload"].get("tracked"):
+                (run_dir / "scriptUnmodified.py").write_text(script, encoding="utf-8")
+                create_tracked_script(run_dir / "scriptUnmodified.py", script_path)
+            else:
+                script_path.write_text(script, encoding="utf-8")
+            try:
+                # Nobody is waiting on a queued job, so a package environment still building is waited for
+                result = await self.script_executor.run(
+                    script_path, on_output=on_output, profile=job["payload"].get("profile"),
+                    wait_for_dependencies=True
+                )
+            finally:
+                artifacts = await asyncio.to_thread(self.artifact_store.upload_run, job["id"], run_dir)
+        model = job["payload"].get("model")
+        if model and self.model_stats is not None:
+            await asyncio.to_thread(
+                self.model_stats.record_outcome, model, result.success, job["payload"].get("attempt")
+            )
+        response = build_execution_response(result).dict()
+        response["artifacts"] = artifacts
+        return (SUCCEEDED if result.success else FAILED), response
+
+async def serve(args):
+    queue_config = JobQueueConfig.from_env(config)
+    queue_config.path = args.queue_path or queue_config.path
+    queue_config.workers = args.workers or queue_config.workers
+    job_queue = JobQueue(queue_config.path, queue_config.journal_mode, queue_config.max_attempts)
+
+    browser_pool = BrowserPool(BrowserPoolConfig.from_env(config))
+    zygote = ExecutionZygote(ZygoteConfig.from_env(config))
+    install_check = PlaywrightInstallCheck(PlaywrightInstallConfig.from_env(config))
+    dependency_envs = DependencyEnvironments(
+        DependencyChecker(DependencyConfig.from_env(config)), DependencyEnvConfig.from_env(config)
+    )
+    executor = AsyncScriptExecutor(
+        ExecutorConfig.from_env(config), browser_pool, zygote, install_check, dependency_envs,
+        ResourceLimits.from_env(config)
+    )
+    runner = JobRunner(
+        executor,
+        ArtifactStore(args.artifact_dir or config.get("JOB_ARTIFACT_DIR") or DEFAULT_ARTIFACT_DIR),
+        args.scripts_dir,
+        ModelStats.from_env(config)
+    )
+    workers = JobWorkers(job_queue, runner.run, queue_config)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop.set)
+
+    await install_check.ensure()
+    await browser_pool.start()
+    await workers.start()
+    logger.info(f"Worker {workers.worker_prefix} pulling from {queue_config.path} with {queue_config.workers} slot(s)")
+    try:
+        await stop.wait()
+    finally:
+        # Jobs still running are handed back to the queue for another worker
+        await workers.stop()
+        await dependency_envs.close()
+        await zygote.close()
+        await browser_pool.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued script jobs on this machine")
+    parser.add_argument("--queue-path", help="Shared job database; overrides JOB_QUEUE_PATH")
+    parser.add_argument("--artifact-dir", help="Shared artifact directory; overrides JOB_ARTIFACT_DIR")
+    parser.add_argument("--scripts-dir", help="Scripts directory for jobs submitted without their script")
+    parser.add_argument("--workers", type=int, help="Concurrent jobs; overrides JOB_WORKERS")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(serve(args))
+
+if __name__ == "__main__":
+    main()
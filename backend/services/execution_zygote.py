@@ -0,0 +1,272 @@
+"""Pre-forked script execution.
+
+A zygote process imports Playwright, and every module the tracking prelude
+imports, once and then forks one child per run, so a run pays for a fork
+instead of interpreter startup and those imports.
+
+The tracking wrappers themselves are not pre-installed. Each wrapper reads
+and writes the run's module globals (LAST_PAGE, base_directory, the
+profile and HAR settings), and each patch captures the method it replaces
+(browser_launch_reference and the like) when it is installed. Wrappers
+installed in the zygote would therefore share the zygote's globals across
+every run, and the script's prelude would then wrap the wrapped methods a
+second time. So the child's prelude still installs them. Once Playwright
+is imported, that is a pass over six classes and takes milliseconds.
+
+The zygote speaks JSON lines on stdin/stdout:
+    -> {"id": ..., "script_path": ..., "env": {...}, "stdout_path": ..., "stderr_path": ..., "rlimits": {...}}
+    <- {"id": ..., "event": "started", "pid": ...}
+    <- {"id": ..., "event": "exited", "returncode": ..., "rusage": {...}}
+"""
+from contextlib import suppress
+from dataclasses import dataclass
+import asyncio
+import itertools
+import json
+import logging
+import os
+import signal
+import sys
+
+# Started as a script, so the backend package is two levels up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.services.run_resources import apply_rlimits, rusage_dict
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ZygoteConfig:
+    """Whether script runs are forked from a warm zygote; needs os.fork, so never on Windows."""
+    enabled: bool = False
+
+    @classmethod
+    def from_env(cls, values):
+        enabled = (values.get("EXECUTION_ZYGOTE") or "").lower() in ("1", "true", "yes")
+        return cls(enabled=enabled and hasattr(os, "fork"))
+
+class ExecutionZygote:
+    """Client side of the zygote: starts it lazily and runs scripts through it."""
+    def __init__(self, zygote_config=None):
+        self.zygote_config = zygote_config or ZygoteConfig()
+        self._process = None
+        self._reader_task = None
+        self._start_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._request_ids = itertools.count(1)
+        self._started = {}
+        self._exited = {}
+        self.stats = {"runs": 0, "killed": 0, "zygote_starts": 0}
+
+    @property
+    def enabled(self):
+        return self.zygote_config.enabled
+
+    async def start(self):
+        async with self._start_lock:
+            if self._process is not None and self._process.returncode is None:
+                return
+            self._process = await asyncio.create_subprocess_exec(
+                sys.executable, __file__,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE
+            )
+            self._reader_task = asyncio.create_task(self._read_events(self._process))
+            self.stats["zygote_starts"] += 1
+            logger.info(f"Started execution zygote (pid {self._process.pid})")
+
+    async def _read_events(self, process):
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                event = json.loads(line)
+                waiters = self._started if event["event"] == "started" else self._exited
+                future = waiters.pop(event["id"], None)
+                if future is not None and not future.done():
+                    future.set_result(event)
+        finally:
+            error = RuntimeError("Execution zygote exited")
+            for waiters in (self._started, self._exited):
+                for future in waiters.values():
+                    if not future.done():
+                        future.set_exception(error)
+                waiters.clear()
+
+    async def run(self, script_path, timeout_seconds, env=None, stdout_path=None, stderr_path=None,
+                  rlimits=None, on_started=None):
+        """Run a script in a forked child and return its exit event: returncode and the child's rusage.
+
+        rlimits are applied in the child, and on_started is called with its
+        pid. Raises asyncio.TimeoutError after killing the child's process
+        group when it outlives timeout_seconds; cancellation kills it too.
+        """
+        await self.start()
+        loop = asyncio.get_running_loop()
+        request_id = next(self._request_ids)
+        started = self._started[request_id] = loop.create_future()
+        exited = self._exited[request_id] = loop.create_future()
+        request = {
+            "id": request_id,
+            "script_path": str(script_path),
+            "env": env or {},
+            "stdout_path": str(stdout_path) if stdout_path else None,
+            "stderr_path": str(stderr_path) if stderr_path else None,
+            "rlimits": rlimits or {},
+        }
+        async with self._write_lock:
+            self._process.stdin.write((json.dumps(request) + "\n").encode("utf-8"))
+            await self._process.stdin.drain()
+        self.stats["runs"] += 1
+
+        try:
+            pid = (await asyncio.shield(started))["pid"]
+            if on_started is not None:
+                on_started(pid)
+            return await asyncio.wait_for(asyncio.shield(exited), timeout=timeout_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self.stats["killed"] += 1
+            with suppress(Exception):
+                pid = (await started)["pid"]
+                with suppress(ProcessLookupError, PermissionError):
+                    os.killpg(pid, signal.SIGKILL)
+                await exited
+            raise
+
+    async def close(self):
+        if self._process is None:
+            return
+        if self._process.returncode is None:
+            self._process.stdin.close()
+            try:
+                await asyncio.wait_for(self._process.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                self._process.kill()
+                await self._process.wait()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+        self._process = None
+        self._reader_task = None
+
+    def get_stats(self):
+        return {
+            "enabled": self.enabled,
+            "pid": self._process.pid if self._process is not None and self._process.returncode is None else None,
+            "running": len(self._exited),
+            **self.stats,
+        }
+
+def send_event(event):
+    os.write(sys.__stdout__.fileno(), (json.dumps(event) + "\n").encode("utf-8"))
+
+def run_child(request, wakeup_fds):
+    """Body of a forked child: isolate, run the script as __main__, exit without returning."""
+    import atexit
+    import runpy
+    import traceback
+
+    returncode = 0
+    try:
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        for fd in wakeup_fds:
+            os.close(fd)
+        os.setsid()
+        apply_rlimits(request.get("rlimits") or {})
+
+        script_path = os.path.abspath(request["script_path"])
+        os.chdir(os.path.dirname(script_path))
+        os.environ.update(request["env"])
+
+        # fd 1 is the protocol pipe in the zygote, so the child's output must never reach it
+        for fd, path in ((0, None), (1, request["stdout_path"]), (2, request["stderr_path"])):
+            target = os.open(path or os.devnull, os.O_RDONLY if fd == 0 else os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+            os.dup2(target, fd)
+            os.close(target)
+
+        sys.argv = [script_path]
+        sys.path[0] = os.path.dirname(script_path)
+        # The interpreter has already started, so apply PYTHONPATH (e.g. a dependency overlay) by hand,
+        # along with the first sitecustomize on it (e.g. the browser pool's launch hook)
+        pythonpath = [path for path in request["env"].get("PYTHONPATH", "").split(os.pathsep) if path]
+        sys.path[1:1] = pythonpath
+        for path in pythonpath:
+            if os.path.isfile(os.path.join(path, "sitecustomize.py")):
+                runpy.run_path(os.path.join(path, "sitecustomize.py"), run_name="sitecustomize")
+                break
+        try:
+            runpy.run_path(script_path, run_name="__main__")
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except BaseException:
+            returncode = 1
+            sys.excepthook(*sys.exc_info())
+        atexit._run_exitfuncs()
+        for stream in (sys.stdout, sys.stderr):
+            with suppress(Exception):
+                stream.flush()
+    except BaseException:
+        returncode = 1
+        with suppress(Exception):
+            traceback.print_exc()
+    finally:
+        os._exit(returncode)
+
+def main():
+    """Zygote loop: import Playwright, then fork one child per request."""
+    import selectors
+    # The imports every tracked script would otherwise pay for
+    import atexit, contextlib, functools, inspect, runpy, traceback, urllib.parse, zipfile  # noqa: F401
+    import playwright.async_api  # noqa: F401
+
+    wakeup_read, wakeup_write = os.pipe()
+    os.set_blocking(wakeup_write, False)
+    signal.set_wakeup_fd(wakeup_write)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    selector = selectors.DefaultSelector()
+    selector.register(0, selectors.EVENT_READ)
+    selector.register(wakeup_read, selectors.EVENT_READ)
+    children = {}
+    pending = b""
+    stdin_open = True
+
+    while stdin_open or children:
+        for key, _ in selector.select():
+            if key.fileobj == 0:
+                # Raw reads, because a buffered readline could hide further requests from select
+                chunk = os.read(0, 65536)
+                if not chunk:
+                    stdin_open = False
+                    selector.unregister(0)
+                    continue
+                *lines, pending = (pending + chunk).split(b"\n")
+                for line in lines:
+                    request = json.loads(line)
+                    pid = os.fork()
+                    if pid == 0:
+                        run_child(request, (wakeup_read, wakeup_write))
+                    children[pid] = request["id"]
+                    send_event({"id": request["id"], "event": "started", "pid": pid})
+            else:
+                with suppress(BlockingIOError):
+                    os.read(wakeup_read, 512)
+                while children:
+                    try:
+                        pid, status, rusage = os.wait4(-1, os.WNOHANG)
+                    except ChildProcessError:
+                        break
+                    if pid == 0:
+                        break
+                    request_id = children.pop(pid, None)
+                    if request_id is not None:
+                        send_event({
+                            "id": request_id,
+                            "event": "exited",
+                            "returncode": os.waitstatus_to_exitcode(status),
+                            "rusage": rusage_dict(rusage),
+                        })
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+import json
+import logging
+import re
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+CODE_LINE = re.compile(r"^\s*(import |from \S+ import |async def |def |await |class |[A-Za-z_][\w.]*\s*=)", re.M)
+WORD = re.compile(r"[a-z0-9]+")
+
+class GenerationAbortedError(Exception):
+    """Raised when a generation is cut off because it stopped looking like Python or reached max_tokens ("length")."""
+    def __init__(self, reason, content):
+        super().__init__(f"Generation aborted: {reason}")
+        self.reason = reason
+        self.content = content
+
+@dataclass
+class GuardConfig:
+    """Thresholds for cutting off generations that ramble, repeat or never reach code."""
+    enabled: bool = True
+    no_code_tokens: int = 400
+    repetition_window: int = 120
+    repetition_count: int = 3
+    repetition_lookback: int = 4000
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        enabled = values.get("LLM_GENERATION_GUARDS")
+        return cls(
+            enabled=defaults.enabled if enabled is None else enabled.lower() in ("1", "true", "yes"),
+            no_code_tokens=int(values.get("LLM_NO_CODE_TOKENS") or defaults.no_code_tokens),
+            repetition_window=int(values.get("LLM_REPETITION_WINDOW") or defaults.repetition_window),
+            repetition_count=int(values.get("LLM_REPETITION_COUNT") or defaults.repetition_count),
+            repetition_lookback=int(values.get("LLM_REPETITION_LOOKBACK") or defaults.repetition_lookback),
+        )
+
+class GenerationGuard:
+    """Watches a streamed completion and says when to stop reading it.
+
+    check() returns None to keep going, "fence_closed" once the code block is
+    complete (a normal finish), or another reason when the output should be
+    abandoned.
+    """
+    def __init__(self, guard_config=None):
+        self.guard_config = guard_config or GuardConfig()
+        self.content = ""
+        self._fence_opened_at = None
+        self._has_code = False
+
+    def check(self, delta):
+        self.content += delta
+        content = self.content
+
+        if self._fence_opened_at is None:
+            fence = content.find("```")
+            if fence != -1:
+                self._fence_opened_at = fence + 3
+        if self._fence_opened_at is not None and content.find("```", self._fence_opened_at) != -1:
+            return "fence_closed"
+
+        if not self._has_code:
+            self._has_code = self._fence_opened_at is not None or CODE_LINE.search(content) is not None
+            if not self._has_code and len(content) // 4 > self.guard_config.no_code_tokens:
+                return "no_code"
+
+        window = self.guard_config.repetition_window
+        if len(content) >= window * self.guard_config.repetition_count:
+            recent = content[-self.guard_config.repetition_lookback:]
+            if recent.count(content[-window:]) >= self.guard_config.repetition_count:
+                return "repetition"
+        return None
+
+def instruction_words(instruction):
+    return set(WORD.findall((instruction or "").lower()))
+
+class MaxTokensPredictor:
+    """Predicts max_tokens per model from completion lengths of similar past instructions.
+
+    Similarity is word-set Jaccard overlap. The prediction is the longest of
+    the nearest completions times a safety margin; with too little history it
+    returns -1 (no limit). History is kept in SQLite, so the API server and
+    the CLI scripts add to it without overwriting each other.
+    """
+    def __init__(self, path, neighbours=5, margin=1.5, minimum=512, maximum=8192, max_history=500):
+        self.path = Path(path)
+        self.neighbours = neighbours
+        self.margin = margin
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_history = max_history
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS completions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    model TEXT NOT NULL,
+                    words TEXT NOT NULL,
+                    completion_tokens INTEGER NOT NULL
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS completions_model ON completions (model, id)")
+
+    @classmethod
+    def from_env(cls, values):
+        return cls(
+            values.get("GENERATION_HISTORY_PATH") or "data/generation_history.sqlite3",
+            neighbours=int(values.get("MAX_TOKENS_NEIGHBOURS") or 5),
+            margin=float(values.get("MAX_TOKENS_MARGIN") or 1.5),
+            minimum=int(values.get("MAX_TOKENS_MINIMUM") or 512),
+            maximum=int(values.get("MAX_TOKENS_MAXIMUM") or 8192),
+        )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def predict(self, model, instruction):
+        with closing(self._connect()) as connection:
+            history = connection.execute(
+                "SELECT words, completion_tokens FROM completions WHERE model = ? ORDER BY id DESC LIMIT ?",
+                (model, self.max_history)
+            ).fetchall()
+        if len(history) < self.neighbours:
+            return -1
+        words = instruction_words(instruction)
+
+        def similarity(entry):
+            other = set(json.loads(entry[0]))
+            union = words | other
+            return len(words & other) / len(union) if union else 0.0
+
+        nearest = sorted(history, key=similarity, reverse=True)[:self.neighbours]
+        predicted = int(max(completion_tokens for _, completion_tokens in nearest) * self.margin)
+        return max(self.minimum, min(self.maximum, predicted))
+
+    def record(self, model, instruction, completion_tokens):
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO completions (model, words, completion_tokens) VALUES (?, ?, ?)",
+                (model, json.dumps(sorted(instruction_words(instruction))), completion_tokens)
+            )
+            connection.execute(
+                "DELETE FROM completions WHERE model = ? AND id NOT IN "
+                "(SELECT id FROM completions WHERE model = ? ORDER BY id DESC LIMIT ?)",
+                (model, model, self.max_history)
+            )
@@ -0,0 +1,99 @@
+from dataclasses import dataclass
+from pathlib import Path
+import json
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Written by the tracking prelude next to the script (see script_tracking.generate_prelude)
+RECORDING_NAME = "network.har.zip"
+REPLAY_REPORT_NAME = "harReplay.json"
+# Carries the plan to a tracked script's run; without it the script neither records nor replays
+HAR_ENV = "TRACKING_HAR"
+
+ITERATION_DIRECTORY = re.compile(r"^iteration(\d+)$")
+
+@dataclass
+class HarReplayConfig:
+    """When a bot's repair iterations replay an earlier iteration's recorded traffic instead of recording afresh."""
+    enabled: bool = True
+    max_age_hours: float = 24.0
+    max_replays: int = 20
+    max_miss_ratio: float = 0.25
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        return cls(
+            enabled=(values.get("HAR_REPLAY_ENABLED") or "true").lower() in ("1", "true", "yes"),
+            max_age_hours=float(values.get("HAR_MAX_AGE_HOURS") or defaults.max_age_hours),
+            max_replays=int(values.get("HAR_MAX_REPLAYS") or defaults.max_replays),
+            max_miss_ratio=float(values.get("HAR_MAX_MISS_RATIO") or defaults.max_miss_ratio),
+        )
+
+def iteration_directories(bot_directory):
+    """The bot's iterationN directories, oldest first."""
+    numbered = []
+    for path in Path(bot_directory).iterdir():
+        match = ITERATION_DIRECTORY.match(path.name)
+        if match and path.is_dir():
+            numbered.append((int(match.group(1)), path))
+    return [path for _, path in sorted(numbered)]
+
+def latest_recording(bot_directory, exclude=None):
+    for directory in reversed(iteration_directories(bot_directory)):
+        recording = directory / RECORDING_NAME
+        if directory != exclude and recording.is_file():
+            return recording.resolve()
+    return None
+
+def replay_reports(bot_directory, recording):
+    """Reports of the iterations that replayed recording, oldest first."""
+    reports = []
+    for directory in iteration_directories(bot_directory):
+        try:
+            report = json.loads((directory / REPLAY_REPORT_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if report.get("recording") == str(recording):
+            reports.append(report)
+    return reports
+
+def stale_reason(recording, reports, har_config):
+    """Why recording should be replaced by a new one, or None while it is still fit to replay."""
+    age_hours = (time.time() - recording.stat().st_mtime) / 3600
+    if age_hours > har_config.max_age_hours:
+        return f"recorded {age_hours:.1f}h ago"
+    if len(reports) >= har_config.max_replays:
+        return f"replayed {len(reports)} times"
+    if reports and reports[-1].get("requests"):
+        miss_ratio = reports[-1].get("misses", 0) / reports[-1]["requests"]
+        if miss_ratio > har_config.max_miss_ratio:
+            return f"{miss_ratio:.0%} of the last replay's requests missed it"
+    return None
+
+def plan_har_mode(iteration_filepath, har_config):
+    """HAR settings for the runs of an iteration's tracked script, passed to them in HAR_ENV.
+
+    The first iteration of a bot records its traffic; later ones replay the
+    newest recording, with requests it lacks going to the network, until it
+    goes stale and the iteration records a replacement. Only the repair
+    loop's own runs get a plan, those of speculative candidates and of
+    script_run.py; running the saved script.py directly talks to the live
+    site.
+    """
+    if not har_config.enabled:
+        return {"mode": "off"}
+    iteration_filepath = Path(iteration_filepath)
+    bot_directory = iteration_filepath.parent
+    recording = latest_recording(bot_directory, exclude=iteration_filepath)
+    if recording is None:
+        return {"mode": "record"}
+    reason = stale_reason(recording, replay_reports(bot_directory, recording), har_config)
+    if reason:
+        logger.info(f"Re-recording network traffic for {iteration_filepath.name}: {recording} was {reason}")
+        return {"mode": "record"}
+    logger.info(f"{iteration_filepath.name} will replay network traffic from {recording}")
+    return {"mode": "replay", "path": str(recording)}
@@ -0,0 +1,158 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_AFFINITY_KEYS = 1024
+
+@dataclass
+class InferenceBackend:
+    """One inference server and its live routing state."""
+    url: str
+    outstanding: int = 0
+    healthy: bool = True
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+    total_requests: int = 0
+    total_failures: int = 0
+
+    def is_available(self, now):
+        return self.healthy or now >= self.ejected_until
+
+@dataclass
+class InferenceRouterConfig:
+    """Ejection, probing and affinity settings for the inference router."""
+    max_failures: int = 3
+    ejection_seconds: float = 30.0
+    probe_interval: float = 10.0
+    probe_timeout: float = 5.0
+    affinity_slack: int = 2
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        return cls(
+            max_failures=int(values.get("INFERENCE_MAX_FAILURES") or defaults.max_failures),
+            ejection_seconds=float(values.get("INFERENCE_EJECTION_SECONDS") or defaults.ejection_seconds),
+            probe_interval=float(values.get("INFERENCE_PROBE_INTERVAL") or defaults.probe_interval),
+            probe_timeout=float(values.get("INFERENCE_PROBE_TIMEOUT") or defaults.probe_timeout),
+            affinity_slack=int(values.get("INFERENCE_AFFINITY_SLACK") or defaults.affinity_slack),
+        )
+
+def parse_backend_urls(values):
+    """Read INFERENCE_SERVER_URLS (comma separated), falling back to INFERENCE_SERVER_URL."""
+    urls = values.get("INFERENCE_SERVER_URLS") or values["INFERENCE_SERVER_URL"]
+    return [url.strip().rstrip("/") for url in urls.split(",") if url.strip()]
+
+class InferenceRouter:
+    """Least-outstanding-requests balancer over several inference servers.
+
+    Backends that fail max_failures times in a row are ejected for
+    ejection_seconds and re-admitted by a successful health probe or request.
+    Requests sharing an affinity key (e.g. repair iterations of one bot) stick
+    to the same backend while it is within affinity_slack of the least loaded,
+    so its prefix cache stays warm.
+    """
+    def __init__(self, urls, router_config=None):
+        if not urls:
+            raise ValueError("At least one inference server URL is required")
+        self.router_config = router_config or InferenceRouterConfig()
+        self.backends = [InferenceBackend(url=url) for url in urls]
+        self._affinity = OrderedDict()
+        self._probe_task = None
+
+    def choose(self, affinity_key=None, exclude=(), among=None):
+        now = time.monotonic()
+        pool = self.backends if among is None else among
+        candidates = [b for b in pool if b.is_available(now) and b.url not in exclude]
+        if not candidates:
+            candidates = [b for b in pool if b.url not in exclude] or pool
+
+        least_outstanding = min(b.outstanding for b in candidates)
+        if affinity_key is not None:
+            preferred = self._affinity.get(affinity_key)
+            for backend in candidates:
+                if backend.url == preferred and backend.outstanding <= least_outstanding + self.router_config.affinity_slack:
+                    self._affinity.move_to_end(affinity_key)
+                    return backend
+
+        backend = random.choice([b for b in candidates if b.outstanding == least_outstanding])
+        if affinity_key is not None:
+            self._affinity[affinity_key] = backend.url
+            self._affinity.move_to_end(affinity_key)
+            while len(self._affinity) > MAX_AFFINITY_KEYS:
+                self._affinity.popitem(last=False)
+        return backend
+
+    def acquire(self, affinity_key=None, exclude=(), among=None):
+        backend = self.choose(affinity_key, exclude, among)
+        backend.outstanding += 1
+        backend.total_requests += 1
+        return backend
+
+    def release(self, backend, success):
+        backend.outstanding -= 1
+        if success:
+            self.mark_healthy(backend)
+        else:
+            self.mark_failed(backend)
+
+    def mark_healthy(self, backend):
+        if not backend.healthy:
+            logger.info(f"Re-admitting inference backend {backend.url}")
+        backend.healthy = True
+        backend.consecutive_failures = 0
+
+    def mark_failed(self, backend):
+        backend.consecutive_failures += 1
+        backend.total_failures += 1
+        if backend.consecutive_failures >= self.router_config.max_failures:
+            if backend.healthy:
+                logger.warning(f"Ejecting inference backend {backend.url} after {backend.consecutive_failures} failures")
+            backend.healthy = False
+            backend.ejected_until = time.monotonic() + self.router_config.ejection_seconds
+
+    async def probe(self, client, backend):
+        try:
+            response = await client.get(f"{backend.url}/models", timeout=self.router_config.probe_timeout)
+            response.raise_for_status()
+        except Exception as e:
+            logger.debug(f"Health probe for {backend.url} failed: {e}")
+            self.mark_failed(backend)
+        else:
+            self.mark_healthy(backend)
+
+    async def run_health_checks(self, client):
+        while True:
+            await asyncio.gather(*(self.probe(client, backend) for backend in self.backends))
+            await asyncio.sleep(self.router_config.probe_interval)
+
+    def start_health_checks(self, client):
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self.run_health_checks(client))
+
+    async def stop_health_checks(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+
+    def get_status(self):
+        return [
+            {
+                "url": b.url,
+                "healthy": b.healthy,
+                "outstanding": b.outstanding,
+                "consecutive_failures": b.consecutive_failures,
+                "total_requests": b.total_requests,
+                "total_failures": b.total_failures,
+            }
+            for b in self.backends
+        ]
@@ -0,0 +1,391 @@
+from contextlib import closing, suppress
+from dataclasses import dataclass
+from pathlib import Path
+import asyncio
+import json
+import logging
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+class JobNotFoundError(Exception):
+    """Raised when a job id is not in the queue."""
+
+@dataclass
+class JobQueueConfig:
+    """Location of the job database, how many runs a process works on at once, and job leases.
+
+    max_attempts bounds how often a job is claimed; one whose lease expires
+    on its last attempt is failed instead of re-queued.
+    """
+    path: str = "data/jobs.sqlite3"
+    workers: int = 4
+    poll_interval: float = 2.0
+    lease_seconds: float = 60.0
+    heartbeat_interval: float = 15.0
+    journal_mode: str = "WAL"
+    max_attempts: int = 3
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        return cls(
+            path=values.get("JOB_QUEUE_PATH") or defaults.path,
+            workers=int(values.get("JOB_WORKERS") or defaults.workers),
+            poll_interval=float(values.get("JOB_POLL_INTERVAL") or defaults.poll_interval),
+            lease_seconds=float(values.get("JOB_LEASE_SECONDS") or defaults.lease_seconds),
+            heartbeat_interval=float(values.get("JOB_HEARTBEAT_INTERVAL") or defaults.heartbeat_interval),
+            journal_mode=values.get("JOB_QUEUE_JOURNAL_MODE") or defaults.journal_mode,
+            max_attempts=int(values.get("JOB_MAX_ATTEMPTS") or defaults.max_attempts),
+        )
+
+class JobQueue:
+    """Script run jobs in a SQLite database, so they survive restarts.
+
+    Each call opens its own connection, and claims happen inside BEGIN
+    IMMEDIATE, so any number of workers in processes on the same machine
+    can pull from it without handing one job to two of them. SQLite's
+    locking is not reliable on network filesystems, so this is a local
+    (and test) backend; workers on several machines need a queue server.
+    A claim holds a lease that the worker renews with heartbeats; a job
+    whose lease runs out is put back in the queue, or failed once it has
+    been claimed max_attempts times. Methods block; call them through
+    asyncio.to_thread from async code.
+    """
+    def __init__(self, path, journal_mode="WAL", max_attempts=3):
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with closing(self._connect()) as connection, connection:
+            connection.execute(f"PRAGMA journal_mode={journal_mode}")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    script_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    worker_id TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    lease_expires_at REAL,
+                    heartbeat_at REAL
+                )
+            """)
+            # Databases created before leases existed
+            columns = {row["name"] for row in connection.execute("PRAGMA table_info(jobs)")}
+            for column in ("lease_expires_at", "heartbeat_at"):
+                if column not in columns:
+                    with suppress(sqlite3.OperationalError):
+                        connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} REAL")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def submit(self, script_id, payload=None):
+        job_id = str(uuid.uuid4())
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, script_id, payload, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, script_id, json.dumps(payload or {}), QUEUED, time.time())
+            )
+        return self.get(job_id)
+
+    def get(self, job_id):
+        with closing(self._connect()) as connection:
+            job = self._to_dict(connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        if job is None:
+            raise JobNotFoundError(f"Job {job_id} not found")
+        return job
+
+    def list(self, status=None, limit=50):
+        query = "SELECT * FROM jobs"
+        parameters = []
+        if status:
+            query += " WHERE status = ?"
+            parameters.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        parameters.append(limit)
+        with closing(self._connect()) as connection:
+            return [self._to_dict(row) for row in connection.execute(query, parameters)]
+
+    def claim(self, worker_id, lease_seconds=60.0):
+        """Mark the oldest queued job as running for worker_id, leased for lease_seconds, and return it, or None."""
+        with self._lock, closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is None:
+                    connection.execute("COMMIT")
+                    return None
+                now = time.time()
+                connection.execute(
+                    "UPDATE jobs SET status = ?, worker_id = ?, attempts = attempts + 1, started_at = ?, "
+                    "heartbeat_at = ?, lease_expires_at = ? WHERE id = ?",
+                    (RUNNING, worker_id, now, now, now + lease_seconds, row["id"])
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return self.get(row["id"])
+
+    def finish(self, job_id, status, result=None, error=None, worker_id=None):
+        """Record a job's outcome; with worker_id, only while that worker still holds the job."""
+        query = "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires_at = NULL WHERE id = ?"
+        parameters = [status, json.dumps(result, default=str) if result is not None else None, error, time.time(), job_id]
+        if worker_id is not None:
+            query += " AND worker_id = ? AND status = ?"
+            parameters += [worker_id, RUNNING]
+        with closing(self._connect()) as connection:
+            connection.execute(query, parameters)
+        return self.get(job_id)
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=60.0):
+        """Renew worker_id's lease on a running job; returns the job, or None if the lease was lost."""
+        now = time.time()
+        with closing(self._connect()) as connection:
+            updated = connection.execute(
+                "UPDATE jobs SET heartbeat_at = ?, lease_expires_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+                (now, now + lease_seconds, job_id, worker_id, RUNNING)
+            ).rowcount
+        return self.get(job_id) if updated else None
+
+    def release(self, job_id, worker_id):
+        """Give up worker_id's lease on a job it will not finish, so it is re-queued right away.
+
+        A released attempt does not count towards max_attempts.
+        """
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE jobs SET lease_expires_at = 0, attempts = attempts - 1 WHERE id = ? AND worker_id = ? AND status = ?",
+                (job_id, worker_id, RUNNING)
+            )
+        return self.requeue_expired()
+
+    def request_cancel(self, job_id):
+        """Cancel a queued job outright; flag a running one for its worker to stop."""
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED)
+            )
+            connection.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING)
+            )
+        return self.get(job_id)
+
+    def requeue_expired(self):
+        """Put running jobs whose worker stopped heartbeating back in the queue; returns how many.
+
+        Jobs that have used up max_attempts are failed instead, so a script
+        that keeps taking its worker down cannot be retried forever.
+        """
+        now = time.time()
+        expired = "status = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)"
+        with closing(self._connect()) as connection:
+            connection.execute(
+                f"UPDATE jobs SET status = ?, finished_at = ?, lease_expires_at = NULL WHERE {expired} AND cancel_requested = 1",
+                (CANCELLED, now, RUNNING, now)
+            )
+            connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_expires_at = NULL "
+                f"WHERE {expired} AND attempts >= ?",
+                (FAILED, f"Worker lease expired on each of {self.max_attempts} attempts",
+                 now, RUNNING, now, self.max_attempts)
+            )
+            requeued = connection.execute(
+                "UPDATE jobs SET status = ?, worker_id = NULL, started_at = NULL, lease_expires_at = NULL "
+                f"WHERE {expired}",
+                (QUEUED, RUNNING, now)
+            ).rowcount
+        return requeued
+
+    def get_stats(self):
+        with closing(self._connect()) as connection:
+            counts = dict(connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, *FINISHED_STATUSES)}
+
+async def run_to_completion(function, *args):
+    """asyncio.to_thread, except that cancellation waits for the thread before it is re-raised."""
+    call = asyncio.ensure_future(asyncio.to_thread(function, *args))
+    try:
+        return await asyncio.shield(call)
+    except asyncio.CancelledError:
+        with suppress(Exception):
+            await call
+        raise
+
+class JobWorkers:
+    """Async workers that pull jobs from a JobQueue and hand them to run_job.
+
+    run_job(job) returns (status, result). Leases on running jobs are
+    renewed every heartbeat_interval, and expired leases of workers that
+    died elsewhere are re-queued. A cancel request for a running job,
+    whether made here or seen on a heartbeat, cancels its task, which
+    kills the script; so does losing the lease, without recording a result.
+    stop() waits for queue calls already in a thread rather than abandoning
+    them, and hands back a job claimed while it was stopping.
+    """
+    def __init__(self, job_queue, run_job, queue_config=None, worker_prefix=None):
+        self.job_queue = job_queue
+        self.run_job = run_job
+        self.queue_config = queue_config or JobQueueConfig()
+        self.worker_prefix = worker_prefix or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self._running = {}
+        self._cancelled = set()
+        self._lost = set()
+        self._stopping = False
+
+    async def start(self):
+        self._stopping = False
+        requeued = await asyncio.to_thread(self.job_queue.requeue_expired)
+        if requeued:
+            logger.info(f"Re-queued {requeued} job(s) whose worker stopped heartbeating")
+        self._tasks = [
+            asyncio.create_task(self._work(f"{self.worker_prefix}-{index}"))
+            for index in range(self.queue_config.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    def notify(self):
+        """Wake idle workers after a submit instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    async def _wait_for_work(self):
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.queue_config.poll_interval)
+        self._wakeup.clear()
+
+    async def _claim(self, worker_id):
+        # Cancelling the await does not stop the thread, so a claim that commits anyway is released
+        claim = asyncio.ensure_future(asyncio.to_thread(self.job_queue.claim, worker_id, self.queue_config.lease_seconds))
+        try:
+            return await asyncio.shield(claim)
+        except asyncio.CancelledError:
+            with suppress(sqlite3.Error):
+                job = await claim
+                if job is not None:
+                    await asyncio.to_thread(self.job_queue.release, job["id"], worker_id)
+            raise
+
+    async def _work(self, worker_id):
+        while not self._stopping:
+            try:
+                job = await self._claim(worker_id)
+            except sqlite3.Error as e:
+                logger.warning(f"Worker {worker_id} could not claim a job: {e}")
+                job = None
+            if job is None:
+                await self._wait_for_work()
+                continue
+            if self._stopping:
+                with suppress(sqlite3.Error):
+                    await asyncio.to_thread(self.job_queue.release, job["id"], worker_id)
+                return
+
+            logger.info(f"Worker {worker_id} running job {job['id']} (script {job['script_id']})")
+            task = asyncio.create_task(self.run_job(job))
+            self._running[job["id"]] = (worker_id, task)
+            try:
+                status, result = await task
+                await asyncio.to_thread(self.job_queue.finish, job["id"], status, result, None, worker_id)
+            except asyncio.CancelledError:
+                # A cancel request ends the job and a lost lease leaves it to its new worker;
+                # a worker shutdown hands it back to the queue
+                if job["id"] in self._cancelled:
+                    await asyncio.to_thread(self.job_queue.finish, job["id"], CANCELLED, None, None, worker_id)
+                elif job["id"] not in self._lost:
+                    with suppress(sqlite3.Error):
+                        await asyncio.to_thread(self.job_queue.release, job["id"], worker_id)
+                    raise
+            except Exception as e:
+                logger.error(f"Job {job['id']} failed: {e}", exc_info=True)
+                await asyncio.to_thread(self.job_queue.finish, job["id"], FAILED, None, str(e), worker_id)
+            finally:
+                self._running.pop(job["id"], None)
+                self._cancelled.discard(job["id"])
+                self._lost.discard(job["id"])
+
+    async def _heartbeat(self):
+        while not self._stopping:
+            await asyncio.sleep(self.queue_config.heartbeat_interval)
+            for job_id, (worker_id, task) in list(self._running.items()):
+                try:
+                    job = await run_to_completion(
+                        self.job_queue.heartbeat, job_id, worker_id, self.queue_config.lease_seconds
+                    )
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not renew the lease on job {job_id}: {e}")
+                    continue
+                if job is None:
+                    logger.warning(f"Lost the lease on job {job_id}; abandoning it")
+                    self._lost.add(job_id)
+                    task.cancel()
+                elif job["cancel_requested"] and job_id not in self._cancelled:
+                    self._cancelled.add(job_id)
+                    task.cancel()
+            try:
+                requeued = await run_to_completion(self.job_queue.requeue_expired)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not re-queue expired jobs: {e}")
+                continue
+            if requeued:
+                logger.info(f"Re-queued {requeued} job(s) whose worker stopped heartbeating")
+                self.notify()
+
+    async def cancel(self, job_id):
+        job = await asyncio.to_thread(self.job_queue.request_cancel, job_id)
+        running = self._running.get(job_id)
+        if running is not None:
+            self._cancelled.add(job_id)
+            running[1].cancel()
+        return job
+
+    async def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def get_stats(self):
+        return {
+            "worker_prefix": self.worker_prefix,
+            "workers": self.queue_config.workers,
+            "running": sorted(self._running),
+        }
@@ -0,0 +1,158 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import IntEnum
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+TOKEN_WINDOW_SECONDS = 60.0
+
+class Priority(IntEnum):
+    """Admission order for LLM calls; lower values are served first."""
+    REPAIR = 0
+    GENERATE = 1
+    AD_HOC = 2
+
+current_priority = ContextVar("llm_priority", default=Priority.GENERATE)
+
+@contextmanager
+def priority_scope(priority):
+    """Run LLM calls made inside the block at the given priority."""
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+class AdmissionQueueFullError(Exception):
+    """Raised when the admission queue is at capacity."""
+
+@dataclass
+class AdmissionConfig:
+    """Per-backend concurrency and token-rate caps, and the queue bound."""
+    max_concurrent_per_backend: int = 4
+    tokens_per_minute_per_backend: int = 0
+    max_queue_size: int = 100
+    default_completion_tokens: int = 2048
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        return cls(
+            max_concurrent_per_backend=int(values.get("LLM_MAX_CONCURRENT_PER_BACKEND") or defaults.max_concurrent_per_backend),
+            tokens_per_minute_per_backend=int(values.get("LLM_TOKENS_PER_MINUTE_PER_BACKEND") or defaults.tokens_per_minute_per_backend),
+            max_queue_size=int(values.get("LLM_MAX_QUEUE_SIZE") or defaults.max_queue_size),
+            default_completion_tokens=int(values.get("LLM_DEFAULT_COMPLETION_TOKENS") or defaults.default_completion_tokens),
+        )
+
+    def estimate_tokens(self, payload):
+        prompt_characters = sum(len(message["content"]) for message in payload["messages"])
+        completion_tokens = payload["max_tokens"] if payload["max_tokens"] > 0 else self.default_completion_tokens
+        return prompt_characters // 4 + completion_tokens
+
+class AdmissionController:
+    """Bounded priority queue in front of the inference router.
+
+    A call is admitted once some backend is below its concurrency cap and has
+    room in its rolling tokens-per-minute budget (0 disables the token cap).
+    Waiters are served strictly in (priority, arrival) order.
+    """
+    def __init__(self, router, admission_config=None):
+        self.router = router
+        self.admission_config = admission_config or AdmissionConfig()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._token_usage = {backend.url: deque() for backend in router.backends}
+        self._retry_handle = None
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0}
+
+    def _tokens_used(self, backend, now):
+        usage = self._token_usage[backend.url]
+        while usage and now - usage[0][0] > TOKEN_WINDOW_SECONDS:
+            usage.popleft()
+        return sum(tokens for _, tokens in usage)
+
+    def _eligible_backends(self, tokens, now):
+        limit = self.admission_config.tokens_per_minute_per_backend
+        # A request larger than the whole budget is admitted once the window is empty
+        tokens = min(tokens, limit) if limit else tokens
+        return [
+            backend for backend in self.router.backends
+            if backend.outstanding < self.admission_config.max_concurrent_per_backend
+            and (not limit or self._tokens_used(backend, now) + tokens <= limit)
+        ]
+
+    def _try_admit(self, tokens, affinity_key, exclude):
+        now = time.monotonic()
+        eligible = self._eligible_backends(tokens, now)
+        if not eligible:
+            return None
+        backend = self.router.acquire(affinity_key, exclude=exclude, among=eligible)
+        self._token_usage[backend.url].append((now, tokens))
+        self.stats["admitted"] += 1
+        return backend
+
+    def _schedule_token_retry(self):
+        """Wake the queue when the oldest token usage leaves the window."""
+        if self._retry_handle is not None or not self.admission_config.tokens_per_minute_per_backend:
+            return
+        oldest = [usage[0][0] for usage in self._token_usage.values() if usage]
+        if not oldest:
+            return
+        delay = max(0.0, min(oldest) + TOKEN_WINDOW_SECONDS - time.monotonic())
+        loop = asyncio.get_running_loop()
+
+        def retry():
+            self._retry_handle = None
+            self._dispatch()
+        self._retry_handle = loop.call_later(delay, retry)
+
+    def _dispatch(self):
+        while self._waiters:
+            _, _, future, tokens, affinity_key, exclude = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            backend = self._try_admit(tokens, affinity_key, exclude)
+            if backend is None:
+                self._schedule_token_retry()
+                return
+            heapq.heappop(self._waiters)
+            future.set_result(backend)
+
+    async def acquire(self, tokens, priority=None, affinity_key=None, exclude=()):
+        if priority is None:
+            priority = current_priority.get()
+        if not self._waiters:
+            backend = self._try_admit(tokens, affinity_key, exclude)
+            if backend is not None:
+                return backend
+        if len(self._waiters) >= self.admission_config.max_queue_size:
+            self.stats["rejected"] += 1
+            raise AdmissionQueueFullError(
+                f"LLM admission queue is full ({self.admission_config.max_queue_size} waiting)"
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), future, tokens, affinity_key, exclude))
+        self.stats["queued"] += 1
+        self._schedule_token_retry()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(future.result(), success=True)
+            raise
+
+    def release(self, backend, success):
+        self.router.release(backend, success)
+        self._dispatch()
+
+    def get_stats(self):
+        return {**self.stats, "waiting": sum(1 for waiter in self._waiters if not waiter[2].done())}
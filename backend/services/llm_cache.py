@@ -0,0 +1,151 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+import hashlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EVICT_EVERY_STORES = 32
+
+@dataclass
+class LLMCacheConfig:
+    """Sizes and lifetimes for the in-memory and on-disk response caches."""
+    enabled: bool = True
+    directory: str = "data/llm_cache"
+    memory_entries: int = 256
+    disk_max_bytes: int = 256 * 1024 * 1024
+    max_age_seconds: float = 7 * 24 * 3600
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        enabled = values.get("LLM_CACHE_ENABLED")
+        return cls(
+            enabled=defaults.enabled if enabled is None else enabled.lower() in ("1", "true", "yes"),
+            directory=values.get("LLM_CACHE_DIR") or defaults.directory,
+            memory_entries=int(values.get("LLM_CACHE_MEMORY_ENTRIES") or defaults.memory_entries),
+            disk_max_bytes=int(values.get("LLM_CACHE_DISK_MAX_BYTES") or defaults.disk_max_bytes),
+            max_age_seconds=float(values.get("LLM_CACHE_MAX_AGE_SECONDS") or defaults.max_age_seconds),
+        )
+
+def make_cache_key(model_name, messages, temperature):
+    """max_tokens is left out, as it is predicted per request; completions cut off by it are not cached."""
+    key_material = json.dumps(
+        {"model": model_name, "messages": messages, "temperature": temperature},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    """Content-addressed cache of chat completion responses.
+
+    Lookups try an LRU dictionary first and fall back to one JSON file per key
+    on disk. Disk entries are dropped once older than max_age_seconds, and the
+    oldest are evicted when the directory grows past disk_max_bytes.
+    """
+    def __init__(self, cache_config=None):
+        self.cache_config = cache_config or LLMCacheConfig()
+        self.directory = Path(self.cache_config.directory)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _entry_path(self, key):
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _is_fresh(self, stored_at):
+        return time.time() - stored_at <= self.cache_config.max_age_seconds
+
+    def _remember(self, key, stored_at, response):
+        with self._lock:
+            self._memory[key] = (stored_at, response)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.cache_config.memory_entries:
+                self._memory.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and self._is_fresh(entry[0]):
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[1]
+            if entry is not None:
+                del self._memory[key]
+
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            stored = None
+        if stored is not None and self._is_fresh(stored["stored_at"]):
+            self._remember(key, stored["stored_at"], stored["response"])
+            with self._lock:
+                self.stats["disk_hits"] += 1
+            return stored["response"]
+        if stored is not None:
+            path.unlink(missing_ok=True)
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key, response):
+        stored_at = time.time()
+        self._remember(key, stored_at, response)
+
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_suffix(".tmp")
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump({"stored_at": stored_at, "response": response}, f)
+        temporary_path.replace(path)
+        with self._lock:
+            self.stats["stores"] += 1
+            should_evict = self.stats["stores"] % EVICT_EVERY_STORES == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """Remove expired entries, then the oldest ones until under the size cap."""
+        if not self.directory.exists():
+            return
+        entries = []
+        total_bytes = 0
+        now = time.time()
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.cache_config.max_age_seconds:
+                path.unlink(missing_ok=True)
+                with self._lock:
+                    self.stats["evictions"] += 1
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_bytes += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_bytes <= self.cache_config.disk_max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_bytes -= size
+            with self._lock:
+                self.stats["evictions"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
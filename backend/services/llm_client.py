@@ -1,38 +1,359 @@
 from dotenv import dotenv_values
-import requests
+from dataclasses import dataclass
+import asyncio
+import httpx
+import json
 import logging
+import random
+import sqlite3
+import time
 from pathlib import Path
+from backend.services.llm_cache import LLMCacheConfig, LLMResponseCache, make_cache_key
+from backend.services.inference_router import InferenceRouter, InferenceRouterConfig, parse_backend_urls
+from backend.services.llm_admission import AdmissionConfig, AdmissionController, AdmissionQueueFullError
+from backend.services.model_routing import ModelRoutingPolicy, ModelStats
+from backend.services.generation_guards import GenerationAbortedError, GenerationGuard, GuardConfig, MaxTokensPredictor
+from backend.services.prompt_budget import get_token_counter
 
 config = dotenv_values()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+@dataclass
+class LLMClientConfig:
+    """Connection pool, timeout and retry settings for the inference server."""
+    max_connections: int = 10
+    max_keepalive_connections: int = 5
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 10.0
+    read_timeout: float = 600.0
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        return cls(
+            max_connections=int(values.get("LLM_MAX_CONNECTIONS") or defaults.max_connections),
+            max_keepalive_connections=int(values.get("LLM_MAX_KEEPALIVE_CONNECTIONS") or defaults.max_keepalive_connections),
+            keepalive_expiry=float(values.get("LLM_KEEPALIVE_EXPIRY") or defaults.keepalive_expiry),
+            connect_timeout=float(values.get("LLM_CONNECT_TIMEOUT") or defaults.connect_timeout),
+            read_timeout=float(values.get("LLM_READ_TIMEOUT") or defaults.read_timeout),
+            max_retries=int(values.get("LLM_MAX_RETRIES") or defaults.max_retries),
+            backoff_base=float(values.get("LLM_BACKOFF_BASE") or defaults.backoff_base),
+            backoff_max=float(values.get("LLM_BACKOFF_MAX") or defaults.backoff_max),
+        )
+
+    def limits(self):
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeout(self):
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    def backoff_delay(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
 class LLMClient:
-    def __init__(self):
-        self.base_url = config["INFERENCE_SERVER_URL"]
+    def __init__(self, client_config=None):
+        self.router = InferenceRouter(parse_backend_urls(config), InferenceRouterConfig.from_env(config))
+        self.admission = AdmissionController(self.router, AdmissionConfig.from_env(config))
         self.model_name = config["MODEL_NAME_OPENAI"]
-        # self.model_name = config["MODEL_NAME_GEMMA"]
-        # self.model_name = config["MODEL_NAME_GEMMA_LOW"]
+        # Cheaper tiers such as MODEL_NAME_GEMMA_LOW are selected per request through MODEL_TIERS
+        self.routing_policy = ModelRoutingPolicy.from_env(config)
+        self.model_stats = ModelStats.from_env(config)
+        self.guard_config = GuardConfig.from_env(config)
+        self.max_tokens_predictor = MaxTokensPredictor.from_env(config)
+        self.client_config = client_config or LLMClientConfig.from_env(config)
+        self._async_client = None
+        cache_config = LLMCacheConfig.from_env(config)
+        self.response_cache = LLMResponseCache(cache_config) if cache_config.enabled else None
+
+    def _get_async_client(self):
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                limits=self.client_config.limits(),
+                timeout=self.client_config.timeout(),
+            )
+        return self._async_client
 
-    def send_prompt(self, prompt, temperature=0.7):
+    def _build_payload(self, prompt, temperature, max_tokens, stream=False, model=None):
         payload = {
-            "model": self.model_name,
+            "model": model or self.model_name,
             "messages": [{
                 "role": "user",
                 "content": prompt
             }],
-            "max_tokens": -1,
+            "max_tokens": max_tokens,
             "temperature": temperature
         }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def _cache_key(self, payload):
+        return make_cache_key(payload["model"], payload["messages"], payload["temperature"])
+
+    async def _cache_get(self, payload, use_cache):
+        if self.response_cache is None or not use_cache:
+            return None
+        return await asyncio.to_thread(self.response_cache.get, self._cache_key(payload))
+
+    async def _cache_put(self, payload, result, use_cache):
+        if self.response_cache is None or not use_cache or not result.get("choices"):
+            return
+        if result["choices"][0].get("finish_reason") == "length":
+            # A longer max_tokens would have produced more, so this is not the prompt's answer
+            return
+        try:
+            await asyncio.to_thread(self.response_cache.put, self._cache_key(payload), result)
+        except OSError as e:
+            logger.warning(f"Could not store LLM response in cache: {e}")
+
+    def _should_retry(self, attempt, response=None, error=None):
+        if attempt >= self.client_config.max_retries:
+            return False
+        if error is not None:
+            return isinstance(error, (httpx.TransportError, httpx.TimeoutException))
+        return response is not None and response.status_code in RETRYABLE_STATUS_CODES
+
+    async def _record_latency(self, model, started_at):
+        try:
+            await asyncio.to_thread(self.model_stats.record_latency, model, time.monotonic() - started_at)
+        except OSError as e:
+            logger.warning(f"Could not record model latency: {e}")
 
+    async def _record_completion(self, model, instruction, result):
+        """Feed a fresh completion's length to the max_tokens predictor; cached ones were counted when first generated."""
+        if instruction is None:
+            return
+        usage = result.get("usage") or {}
+        completion_tokens = usage.get("completion_tokens")
+        if completion_tokens is None:
+            completion_tokens = get_token_counter().count(result["choices"][0]["message"]["content"])
         try:
-            logger.info(f"Sending request to {self.base_url} with payload: {payload}")
-            response = requests.post(f"{self.base_url}/chat/completions", json = payload)
+            await asyncio.to_thread(self.max_tokens_predictor.record, model, instruction, completion_tokens)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Could not record completion length: {e}")
+
+    def create_guard(self):
+        """A fresh GenerationGuard, or None when LLM_GENERATION_GUARDS is off."""
+        return GenerationGuard(self.guard_config) if self.guard_config.enabled else None
+
+    async def generate_text(self, prompt, max_tokens=-1, temperature=0.7, use_cache=True, affinity_key=None, priority=None, model=None, guard=None, instruction=None):
+        """Send a chat completion request without blocking the event loop.
+
+        With a guard the completion is streamed so it can be cut off early; the
+        result is returned in the same shape as a non-streamed response. With
+        an instruction, a completion that did not come from the cache is
+        recorded for max_tokens prediction. A completion cut off by max_tokens
+        is requested once more without a limit; GenerationAbortedError("length")
+        is raised if there was no limit to lift.
+        """
+        try:
+            return await self._generate_text(
+                prompt, max_tokens, temperature, use_cache, affinity_key, priority, model, guard, instruction
+            )
+        except GenerationAbortedError as e:
+            if e.reason != "length" or max_tokens == -1:
+                raise
+        logger.warning(f"Completion reached max_tokens={max_tokens}; retrying without a limit")
+        return await self._generate_text(
+            prompt, -1, temperature, use_cache, affinity_key, priority, model,
+            GenerationGuard(guard.guard_config) if guard is not None else None, instruction
+        )
+
+    async def _generate_text(self, prompt, max_tokens, temperature, use_cache, affinity_key, priority, model, guard, instruction):
+        if guard is not None:
+            deltas = []
+            finish = {}
+            async for delta in self.stream_text(
+                prompt, max_tokens, temperature, use_cache, affinity_key, priority, model, guard=guard,
+                instruction=instruction, finish=finish
+            ):
+                deltas.append(delta)
+            return {
+                "model": model or self.model_name,
+                "choices": [{
+                    "message": {"role": "assistant", "content": "".join(deltas)},
+                    "finish_reason": finish.get("reason")
+                }]
+            }
+
+        payload = self._build_payload(prompt, temperature, max_tokens, model=model)
+        cached = await self._cache_get(payload, use_cache)
+        if cached is not None:
+            logger.info(f"Returning cached LLM response")
+            return cached
+        client = self._get_async_client()
+        estimated_tokens = self.admission.admission_config.estimate_tokens(payload)
+        started_at = time.monotonic()
+        attempt = 0
+        failed_backends = set()
+        try:
+            while True:
+                backend = await self.admission.acquire(estimated_tokens, priority, affinity_key, exclude=failed_backends)
+                logger.info(f"Sending request to {backend.url} with payload: {payload}")
+                response, error = None, None
+                try:
+                    response = await client.post(f"{backend.url}/chat/completions", json=payload)
+                except httpx.HTTPError as e:
+                    error = e
+                finally:
+                    self.admission.release(backend, success=response is not None and response.status_code < 500)
+                if not self._should_retry(attempt, response=response, error=error):
+                    if error is not None:
+                        raise error
+                    response.raise_for_status()
+                    break
+                failed_backends.add(backend.url)
+                reason = repr(error) if error is not None else f"status {response.status_code}"
+                logger.warning(f"LLM request to {backend.url} failed ({reason}), retrying (attempt {attempt + 1})")
+                await asyncio.sleep(self.client_config.backoff_delay(attempt))
+                attempt += 1
             result = response.json()
             logger.info(f"Successfully received response from LLM")
-            return result
+            await self._record_latency(payload["model"], started_at)
+            await self._record_completion(payload["model"], instruction, result)
+            await self._cache_put(payload, result, use_cache)
+        except AdmissionQueueFullError:
+            raise
         except Exception as e:
             error_msg = f"Unexpected error: {str(e)}"
             logger.exception(error_msg)
-            raise Exception(error_msg) from e
\ No newline at end of file
+            raise Exception(error_msg) from e
+        if result["choices"][0].get("finish_reason") == "length":
+            raise GenerationAbortedError("length", result["choices"][0]["message"]["content"])
+        return result
+
+    async def stream_text(self, prompt, max_tokens=-1, temperature=0.7, use_cache=True, affinity_key=None, priority=None, model=None, guard=None, instruction=None, finish=None):
+        """Yield content deltas as the inference server produces them.
+
+        Retries only happen before the first delta has been yielded, so callers
+        never see a partially repeated completion. A guard stops the stream once
+        the code block closes and raises GenerationAbortedError when the output
+        stops looking like Python. A completion cut off by max_tokens raises
+        GenerationAbortedError("length") once its last delta is yielded. The
+        finish reason is stored in finish["reason"] when a dict is given.
+        """
+        payload = self._build_payload(prompt, temperature, max_tokens, stream=True, model=model)
+        cached = await self._cache_get(payload, use_cache)
+        if cached is not None:
+            logger.info(f"Returning cached LLM response as a single delta")
+            if finish is not None:
+                finish["reason"] = cached["choices"][0].get("finish_reason")
+            yield cached["choices"][0]["message"]["content"]
+            return
+        client = self._get_async_client()
+        estimated_tokens = self.admission.admission_config.estimate_tokens(payload)
+        started_at = time.monotonic()
+        attempt = 0
+        failed_backends = set()
+        has_yielded = False
+        content = []
+        finish_reason = None
+        while True:
+            backend = await self.admission.acquire(estimated_tokens, priority, affinity_key, exclude=failed_backends)
+            logger.info(f"Streaming request to {backend.url} with payload: {payload}")
+            is_finished = False
+            is_backend_healthy = False
+            try:
+                async with client.stream("POST", f"{backend.url}/chat/completions", json=payload) as response:
+                    is_backend_healthy = response.status_code < 500
+                    if self._should_retry(attempt, response=response):
+                        reason = f"status {response.status_code}"
+                    else:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            chunk = json.loads(data)
+                            choices = chunk.get("choices") or [{}]
+                            finish_reason = choices[0].get("finish_reason") or finish_reason
+                            delta = choices[0].get("delta", {}).get("content")
+                            if not delta:
+                                continue
+                            has_yielded = True
+                            content.append(delta)
+                            stop_reason = guard.check(delta) if guard is not None else None
+                            if stop_reason is not None and stop_reason != "fence_closed":
+                                logger.warning(f"Aborted generation ({stop_reason}) after {len(guard.content)} characters")
+                                raise GenerationAbortedError(stop_reason, guard.content)
+                            yield delta
+                            if stop_reason == "fence_closed":
+                                logger.info(f"Stopping generation once the code block closed")
+                                break
+                        is_finished = True
+            except httpx.HTTPError as e:
+                # A 4xx is the request's fault; keep the health the status code gave
+                if not isinstance(e, httpx.HTTPStatusError):
+                    is_backend_healthy = False
+                if has_yielded or not self._should_retry(attempt, error=e):
+                    error_msg = f"Unexpected error: {str(e)}"
+                    logger.exception(error_msg)
+                    raise Exception(error_msg) from e
+                reason = repr(e)
+            finally:
+                self.admission.release(backend, success=is_backend_healthy)
+
+            if is_finished:
+                logger.info(f"Finished streaming response from LLM")
+                await self._record_latency(payload["model"], started_at)
+                result = {
+                    "model": payload["model"],
+                    "choices": [{
+                        "message": {"role": "assistant", "content": "".join(content)},
+                        "finish_reason": finish_reason
+                    }]
+                }
+                await self._record_completion(payload["model"], instruction, result)
+                await self._cache_put(payload, result, use_cache)
+                if finish is not None:
+                    finish["reason"] = finish_reason
+                if finish_reason == "length":
+                    logger.warning(f"Generation reached max_tokens={max_tokens} before finishing")
+                    raise GenerationAbortedError("length", "".join(content))
+                return
+            failed_backends.add(backend.url)
+            logger.warning(f"LLM stream from {backend.url} failed ({reason}), retrying (attempt {attempt + 1})")
+            await asyncio.sleep(self.client_config.backoff_delay(attempt))
+            attempt += 1
+
+    def send_prompt(self, prompt, temperature=0.7, max_tokens=-1, use_cache=True, affinity_key=None, model=None, guard=None, instruction=None):
+        """Blocking wrapper around generate_text for the CLI scripts."""
+        async def run():
+            try:
+                return await self.generate_text(
+                    prompt,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    use_cache=use_cache,
+                    affinity_key=affinity_key,
+                    model=model,
+                    guard=guard,
+                    instruction=instruction
+                )
+            finally:
+                await self.aclose()
+        return asyncio.run(run())
+
+    def start_health_checks(self):
+        """Begin periodic probing of every inference backend (API server only)."""
+        self.router.start_health_checks(self._get_async_client())
+
+    async def aclose(self):
+        await self.router.stop_health_checks()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
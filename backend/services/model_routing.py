@@ -0,0 +1,129 @@
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+import logging
+import re
+import sqlite3
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+COMPLEX_INSTRUCTION_MARKERS = re.compile(r"\b(log ?in|sign ?in|password|upload|download|then|for each|every|loop)\b", re.I)
+
+@dataclass
+class ModelRoutingPolicy:
+    """Picks a model tier from instruction complexity and the number of failed attempts.
+
+    Tiers are ordered cheapest first. Simple first attempts go to tier 0,
+    complex ones start one tier up, and every failed execution or repair
+    escalates one more tier until the largest model is reached.
+    """
+    tiers: tuple
+    complex_instruction_chars: int = 400
+
+    @classmethod
+    def from_env(cls, values):
+        tiers = tuple(
+            model.strip() for model in (values.get("MODEL_TIERS") or "").split(",") if model.strip()
+        ) or (values["MODEL_NAME_OPENAI"],)
+        return cls(
+            tiers=tiers,
+            complex_instruction_chars=int(values.get("COMPLEX_INSTRUCTION_CHARS") or 400),
+        )
+
+    def is_complex(self, instruction):
+        instruction = instruction or ""
+        urls = re.findall(r"https?://", instruction)
+        return (
+            len(instruction) > self.complex_instruction_chars
+            or len(urls) > 1
+            or len(COMPLEX_INSTRUCTION_MARKERS.findall(instruction)) >= 2
+        )
+
+    def choose_model(self, instruction, failed_attempts=0):
+        tier = failed_attempts + (1 if self.is_complex(instruction) else 0)
+        model = self.tiers[min(tier, len(self.tiers) - 1)]
+        logger.info(f"Routing to model {model} (tier {tier}, {failed_attempts} failed attempts)")
+        return model
+
+class ModelStats:
+    """Per-model request latencies and execution outcomes, kept in SQLite.
+
+    Every update is a single statement against the shared database, so the
+    API server and the CLI scripts can record into the same file without
+    overwriting each other. Outcomes are keyed by attempt, so recording a
+    second outcome for the same attempt replaces the first.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS latencies (
+                    model TEXT PRIMARY KEY,
+                    requests INTEGER NOT NULL,
+                    total_latency REAL NOT NULL,
+                    max_latency REAL NOT NULL
+                )
+            """)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS outcomes (
+                    attempt TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    success INTEGER NOT NULL,
+                    recorded_at REAL NOT NULL
+                )
+            """)
+
+    @classmethod
+    def from_env(cls, values):
+        return cls(values.get("MODEL_STATS_PATH") or "data/model_stats.sqlite3")
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def record_latency(self, model, seconds):
+        with closing(self._connect()) as connection:
+            connection.execute("""
+                INSERT INTO latencies (model, requests, total_latency, max_latency) VALUES (?, 1, ?, ?)
+                ON CONFLICT (model) DO UPDATE SET
+                    requests = requests + 1,
+                    total_latency = total_latency + excluded.total_latency,
+                    max_latency = MAX(max_latency, excluded.max_latency)
+            """, (model, seconds, seconds))
+
+    def record_outcome(self, model, success, attempt=None):
+        """Record whether a generated script ran successfully; attempt identifies it, e.g. its directory."""
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO outcomes (attempt, model, success, recorded_at) VALUES (?, ?, ?, ?)",
+                (attempt or uuid.uuid4().hex, model, int(bool(success)), time.time())
+            )
+
+    def get_stats(self):
+        with closing(self._connect()) as connection:
+            latencies = {row["model"]: dict(row) for row in connection.execute("SELECT * FROM latencies")}
+            outcomes = {
+                row["model"]: dict(row) for row in connection.execute(
+                    "SELECT model, SUM(success) AS successes, COUNT(*) - SUM(success) AS failures FROM outcomes GROUP BY model"
+                )
+            }
+        summary = {}
+        for model in sorted(set(latencies) | set(outcomes)):
+            latency = latencies.get(model, {"requests": 0, "total_latency": 0.0, "max_latency": 0.0})
+            outcome = outcomes.get(model, {"successes": 0, "failures": 0})
+            total = outcome["successes"] + outcome["failures"]
+            summary[model] = {
+                "requests": latency["requests"],
+                "total_latency": latency["total_latency"],
+                "max_latency": latency["max_latency"],
+                "successes": outcome["successes"],
+                "failures": outcome["failures"],
+                "mean_latency": latency["total_latency"] / latency["requests"] if latency["requests"] else None,
+                "success_rate": outcome["successes"] / total if total else None,
+            }
+        return summary
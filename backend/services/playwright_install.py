@@ -0,0 +1,149 @@
+from dataclasses import dataclass
+from importlib import metadata
+from pathlib import Path
+import asyncio
+import json
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PlaywrightInstallConfig:
+    """Where the verified browser installation is recorded and whether a missing browser is installed."""
+    cache_path: str = "data/playwright_install.json"
+    browser: str = "chromium"
+    auto_install: bool = True
+    install_timeout: float = 300.0
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        auto_install = values.get("PLAYWRIGHT_AUTO_INSTALL")
+        return cls(
+            cache_path=values.get("PLAYWRIGHT_INSTALL_CACHE_PATH") or defaults.cache_path,
+            browser=values.get("PLAYWRIGHT_BROWSER") or defaults.browser,
+            auto_install=defaults.auto_install if auto_install is None else auto_install.lower() in ("1", "true", "yes"),
+            install_timeout=float(values.get("PLAYWRIGHT_INSTALL_TIMEOUT") or defaults.install_timeout),
+        )
+
+def playwright_version():
+    try:
+        return metadata.version("playwright")
+    except metadata.PackageNotFoundError:
+        return None
+
+def executable_mtime(path):
+    try:
+        return Path(path).stat().st_mtime
+    except (OSError, TypeError):
+        return None
+
+class PlaywrightInstallCheck:
+    """Verifies once that the Playwright browser is installed, instead of launching it before every run.
+
+    A verification is recorded as a fingerprint of the Playwright version and
+    the browser executable's path and mtime, in memory and in cache_path so
+    restarts skip it too. Later checks only compare the fingerprint; the
+    driver is consulted, and the browser installed if missing, when it changes.
+    """
+    def __init__(self, install_config=None):
+        self.install_config = install_config or PlaywrightInstallConfig()
+        self._verified = None
+        self._lock = asyncio.Lock()
+        self.stats = {"checks": 0, "verifications": 0, "installs": 0, "failures": 0}
+
+    def _matches(self, fingerprint, version):
+        return (
+            fingerprint is not None
+            and fingerprint.get("playwright_version") == version
+            and fingerprint.get("browser") == self.install_config.browser
+            and fingerprint.get("executable_mtime") is not None
+            and executable_mtime(fingerprint.get("executable_path")) == fingerprint["executable_mtime"]
+        )
+
+    def _load_cache(self):
+        try:
+            return json.loads(Path(self.install_config.cache_path).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _save_cache(self, fingerprint):
+        try:
+            cache_path = Path(self.install_config.cache_path)
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_text(json.dumps(fingerprint, indent=2), encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"Could not record the Playwright installation check: {e}")
+
+    async def ensure(self):
+        """True when the browser is installed (or Playwright is absent and left to the package installer)."""
+        self.stats["checks"] += 1
+        version = playwright_version()
+        if version is None:
+            return True
+        if self._matches(self._verified, version):
+            return True
+        async with self._lock:
+            if self._matches(self._verified, version):
+                return True
+            cached = self._load_cache()
+            if self._matches(cached, version):
+                self._verified = cached
+                logger.info(f"Playwright {version} {self.install_config.browser} installation already verified")
+                return True
+            return await self._verify(version)
+
+    async def _verify(self, version):
+        self.stats["verifications"] += 1
+        try:
+            executable_path = await self._executable_path()
+            if executable_mtime(executable_path) is None and self.install_config.auto_install:
+                await self._install()
+                executable_path = await self._executable_path()
+        except Exception as e:
+            logger.error(f"Could not verify the Playwright {self.install_config.browser} installation: {e}")
+            self.stats["failures"] += 1
+            return False
+
+        mtime = executable_mtime(executable_path)
+        if mtime is None:
+            logger.error(f"Playwright {self.install_config.browser} executable not found at {executable_path}")
+            self.stats["failures"] += 1
+            return False
+        self._verified = {
+            "playwright_version": version,
+            "browser": self.install_config.browser,
+            "executable_path": str(executable_path),
+            "executable_mtime": mtime,
+        }
+        self._save_cache(self._verified)
+        logger.info(f"Verified Playwright {version} {self.install_config.browser} at {executable_path}")
+        return True
+
+    async def _executable_path(self):
+        # Asking the driver is much cheaper than launching the browser
+        from playwright.async_api import async_playwright
+        async with async_playwright() as p:
+            return getattr(p, self.install_config.browser).executable_path
+
+    async def _install(self):
+        logger.info(f"Installing Playwright {self.install_config.browser}...")
+        self.stats["installs"] += 1
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "playwright", "install", self.install_config.browser,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=self.install_config.install_timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise RuntimeError(f"Browser installation timed out after {self.install_config.install_timeout:g} seconds")
+        if process.returncode != 0:
+            raise RuntimeError(f"playwright install failed: {stderr.decode(errors='replace').strip()}")
+        logger.debug(f"Installation output: {stdout.decode(errors='replace')}")
+
+    def get_stats(self):
+        return {"verified": self._verified, **self.stats}
@@ -0,0 +1,110 @@
+from dataclasses import asdict, dataclass
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_ROLE = (
+    "You are a RPA assistant that generates a Python script based on a user's instruction "
+    "for interactions with web applications using the Playwright package.\n\n"
+)
+
+ASYNC_PLAYWRIGHT_RULES = (
+    "IMPORTANT: The script should follow these rules:\n"
+    "1. Use asynchronous Playwright\n"
+    "2. Do not use try/catch blocks\n"
+    "3. The script should be self-contained with all necessary imports\n"
+    "4. The script should be executable directly (remember that 'async with' outside async function is not allowed)\n"
+    "5. Do not include any if __name__ == \"__main__\": blocks\n\n"
+)
+
+PRELUDE_CONTRACT = (
+    "The script is executed behind a tracking prelude that caps Playwright timeouts and saves the HTML "
+    "of open pages when a step fails. The script must still import async_playwright from "
+    "playwright.async_api and asyncio itself.\n\n"
+)
+
+ONLY_SCRIPT = "Only return the proposed Python script.\n\n"
+
+@dataclass
+class AssembledPrompt:
+    text: str
+    static_length: int
+    shared_prefix_length: int
+
+class PromptAssembler:
+    """Builds prompts with all static content first so the inference server can reuse its KV cache.
+
+    Variable sections are appended in the order given, skipping empty ones, so
+    two prompts of the same kind always share at least the static prefix.
+    Each assembly is compared against the previous one to report how much of
+    the prompt could actually be served from the prefix cache.
+    """
+    def __init__(self, name, static_sections):
+        self.name = name
+        self.static_prefix = "".join(static_sections)
+        self._last_text = None
+        self._last = None
+        self._lock = threading.Lock()
+        self.stats = {"assemblies": 0, "chars": 0, "shared_prefix_chars": 0}
+
+    def scaffolding(self, headings):
+        """The text assemble() adds around sections with these headings, for budgeting alongside their content."""
+        return "".join(f"{heading}\n\n\n" if heading else "\n\n" for heading in headings)
+
+    def assemble(self, variable_sections):
+        parts = [self.static_prefix]
+        for heading, content in variable_sections:
+            if content is None:
+                continue
+            parts.append(f"{heading}\n{content}\n\n" if heading else f"{content}\n\n")
+        text = "".join(parts).rstrip() + "\n"
+
+        with self._lock:
+            shared_prefix_length = len(os.path.commonprefix([self._last_text, text])) if self._last_text else 0
+            self._last_text = text
+            assembled = AssembledPrompt(text=text, static_length=len(self.static_prefix), shared_prefix_length=shared_prefix_length)
+            self._last = assembled
+            self.stats["assemblies"] += 1
+            self.stats["chars"] += len(text)
+            self.stats["shared_prefix_chars"] += shared_prefix_length
+        logger.info(
+            f"Assembled {self.name} prompt: {len(text)} chars, static prefix {len(self.static_prefix)} chars, "
+            f"shared with previous {shared_prefix_length} chars"
+        )
+        return assembled
+
+    def get_stats(self):
+        """Totals across assemblies, with the share of prompt characters a prefix cache could have served."""
+        with self._lock:
+            stats = dict(self.stats)
+            last = self._last
+        stats["static_prefix_chars"] = len(self.static_prefix)
+        stats["shared_prefix_ratio"] = stats["shared_prefix_chars"] / stats["chars"] if stats["chars"] else 0.0
+        stats["last"] = {key: value for key, value in asdict(last).items() if key != "text"} if last else None
+        return stats
+
+def prompt_report(assembled):
+    """Per-request summary of an AssembledPrompt for API responses."""
+    return {
+        "chars": len(assembled.text),
+        "static_prefix_chars": assembled.static_length,
+        "shared_prefix_chars": assembled.shared_prefix_length
+    }
+
+initial_prompt_assembler = PromptAssembler("initial", [
+    SYSTEM_ROLE,
+    ASYNC_PLAYWRIGHT_RULES,
+    PRELUDE_CONTRACT,
+    ONLY_SCRIPT,
+])
+
+repair_prompt_assembler = PromptAssembler("repair", [
+    SYSTEM_ROLE,
+    ASYNC_PLAYWRIGHT_RULES,
+    PRELUDE_CONTRACT,
+    ONLY_SCRIPT,
+    "The user is trying to fix an error in their script. Please generate a corrected version of the script "
+    "that fixes the error while maintaining the original functionality.\n\n",
+])
@@ -0,0 +1,180 @@
+from dotenv import dotenv_values
+from dataclasses import dataclass, field
+from functools import lru_cache
+import logging
+
+config = dotenv_values()
+
+logger = logging.getLogger(__name__)
+
+CHARACTERS_PER_TOKEN = 4
+
+class TokenCounter:
+    """Counts tokens with the configured model's tokenizer.
+
+    Uses a Hugging Face tokenizer when TOKENIZER_NAME is set and transformers
+    is installed, otherwise tiktoken for the model name, otherwise a
+    characters-per-token estimate; backend says which.
+    """
+    def __init__(self, model_name, tokenizer_name=None):
+        self.model_name = model_name
+        self.tokenizer_name = tokenizer_name
+        self.backend, self._encode, self._decode = self._load_tokenizer(model_name, tokenizer_name)
+        self.count_static = lru_cache(maxsize=256)(self.count)
+
+    @staticmethod
+    def _load_tokenizer(model_name, tokenizer_name):
+        if tokenizer_name:
+            try:
+                from transformers import AutoTokenizer
+                tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+                return (
+                    "transformers",
+                    lambda text: tokenizer.encode(text, add_special_tokens=False),
+                    tokenizer.decode
+                )
+            except Exception as e:
+                logger.warning(f"Could not load tokenizer {tokenizer_name}: {e}")
+        try:
+            import tiktoken
+            try:
+                encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+            return "tiktoken", encoding.encode, encoding.decode
+        except ImportError:
+            logger.warning(
+                "No tokenizer available (install tiktoken, or transformers with TOKENIZER_NAME); "
+                f"prompt budgets will be estimated at {CHARACTERS_PER_TOKEN} characters per token"
+            )
+            return "estimate", None, None
+
+    def get_stats(self):
+        return {
+            "backend": self.backend,
+            "model_name": self.model_name,
+            "tokenizer_name": self.tokenizer_name,
+            "is_estimate": self._encode is None,
+        }
+
+    def count(self, text):
+        if not text:
+            return 0
+        if self._encode is None:
+            return -(-len(text) // CHARACTERS_PER_TOKEN)
+        return len(self._encode(text))
+
+    def truncate(self, text, max_tokens, keep="head"):
+        """Cut text down to max_tokens, keeping its start or its end."""
+        if max_tokens <= 0:
+            return ""
+        if self._encode is None:
+            max_characters = max_tokens * CHARACTERS_PER_TOKEN
+            if len(text) <= max_characters:
+                return text
+            return text[:max_characters] if keep == "head" else text[-max_characters:]
+        tokens = self._encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return self._decode(tokens[:max_tokens] if keep == "head" else tokens[-max_tokens:])
+
+@dataclass
+class BudgetedSection:
+    name: str
+    text: str
+    weight: float
+    keep: str = "head"
+
+@dataclass
+class BudgetReport:
+    total_tokens: int
+    static_tokens: int
+    fixed_tokens: int
+    completion_reserve: int
+    sections: dict = field(default_factory=dict)
+
+    def as_dict(self):
+        return {
+            "total_tokens": self.total_tokens,
+            "static_tokens": self.static_tokens,
+            "fixed_tokens": self.fixed_tokens,
+            "completion_reserve": self.completion_reserve,
+            "sections": self.sections,
+        }
+
+@dataclass
+class ContextBudgetConfig:
+    """Global prompt budget and how it is weighted between repair prompt sections."""
+    context_tokens: int = 32768
+    completion_reserve: int = 4096
+    script_weight: float = 0.35
+    error_weight: float = 0.1
+    output_weight: float = 0.1
+    html_weight: float = 0.45
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        return cls(
+            context_tokens=int(values.get("LLM_CONTEXT_TOKENS") or defaults.context_tokens),
+            completion_reserve=int(values.get("LLM_COMPLETION_RESERVE") or defaults.completion_reserve),
+            script_weight=float(values.get("BUDGET_SCRIPT_WEIGHT") or defaults.script_weight),
+            error_weight=float(values.get("BUDGET_ERROR_WEIGHT") or defaults.error_weight),
+            output_weight=float(values.get("BUDGET_OUTPUT_WEIGHT") or defaults.output_weight),
+            html_weight=float(values.get("BUDGET_HTML_WEIGHT") or defaults.html_weight),
+        )
+
+class ContextBudgeter:
+    """Splits one token budget across prompt sections by weight.
+
+    Sections that need less than their weighted share keep their full text and
+    the surplus is shared among the rest, so the budget is only spent on
+    truncation where it is actually short.
+    """
+    def __init__(self, token_counter, budget_config=None):
+        self.token_counter = token_counter
+        self.budget_config = budget_config or ContextBudgetConfig()
+
+    def allocate(self, static_text, fixed_texts, sections):
+        static_tokens = self.token_counter.count_static(static_text)
+        fixed_tokens = sum(self.token_counter.count(text) for text in fixed_texts if text)
+        available = max(0, self.budget_config.context_tokens - self.budget_config.completion_reserve
+                        - static_tokens - fixed_tokens)
+
+        needs = {section.name: self.token_counter.count(section.text) for section in sections}
+        allocations = {}
+        active = [section for section in sections if section.weight > 0]
+        remaining = available
+        while active:
+            total_weight = sum(section.weight for section in active)
+            satisfied = [s for s in active if needs[s.name] <= remaining * s.weight / total_weight]
+            if not satisfied:
+                for section in active:
+                    allocations[section.name] = int(remaining * section.weight / total_weight)
+                break
+            for section in satisfied:
+                allocations[section.name] = needs[section.name]
+                remaining -= needs[section.name]
+            active = [section for section in active if section not in satisfied]
+
+        budgeted = {}
+        report = BudgetReport(
+            total_tokens=self.budget_config.context_tokens,
+            static_tokens=static_tokens,
+            fixed_tokens=fixed_tokens,
+            completion_reserve=self.budget_config.completion_reserve
+        )
+        for section in sections:
+            allocated = allocations.get(section.name, 0)
+            budgeted[section.name] = self.token_counter.truncate(section.text, allocated, section.keep) if section.text else section.text
+            report.sections[section.name] = {
+                "needed": needs[section.name],
+                "allocated": min(allocated, needs[section.name]),
+                "truncated": needs[section.name] > allocated,
+            }
+        logger.info(f"Prompt budget: {report.as_dict()}")
+        return budgeted, report
+
+@lru_cache(maxsize=None)
+def get_token_counter():
+    return TokenCounter(config.get("MODEL_NAME_OPENAI") or "", config.get("TOKENIZER_NAME"))
@@ -0,0 +1,65 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def make_request_key(kind, payload):
+    """Stable hash of an endpoint name and its JSON-serialisable payload."""
+    key_material = json.dumps({"kind": kind, "payload": payload}, sort_keys=True, default=str)
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key onto one in-flight task."""
+    def __init__(self):
+        self._in_flight = {}
+        self.stats = {"leaders": 0, "followers": 0}
+
+    async def run(self, key, factory):
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._in_flight[key] = task
+            self.stats["leaders"] += 1
+
+            def forget(finished_task):
+                if self._in_flight.get(key) is finished_task:
+                    del self._in_flight[key]
+            task.add_done_callback(forget)
+        else:
+            self.stats["followers"] += 1
+            logger.info(f"Attaching to in-flight request {key[:12]}")
+        # A disconnecting caller must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+class IdempotencyConflictError(Exception):
+    """Raised when an idempotency key is reused with a different payload."""
+
+class IdempotencyStore:
+    """Remembers results by client-supplied Idempotency-Key for a fixed window."""
+    def __init__(self, window_seconds=600.0):
+        self.window_seconds = window_seconds
+        self._results = {}
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _, _) in self._results.items() if expires_at <= now]
+        for key in expired:
+            del self._results[key]
+
+    def get(self, idempotency_key, request_key):
+        self._purge_expired()
+        entry = self._results.get(idempotency_key)
+        if entry is None:
+            return None
+        _, stored_request_key, result = entry
+        if stored_request_key != request_key:
+            raise IdempotencyConflictError(
+                f"Idempotency-Key {idempotency_key} was already used with a different request"
+            )
+        return result
+
+    def put(self, idempotency_key, request_key, result):
+        self._results[idempotency_key] = (time.monotonic() + self.window_seconds, request_key, result)
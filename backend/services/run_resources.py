@@ -0,0 +1,210 @@
+from contextlib import suppress
+from dataclasses import dataclass
+from pathlib import Path
+import asyncio
+import logging
+import os
+import signal
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PROC = Path("/proc")
+CPU_HARD_LIMIT_GRACE = 5
+
+@dataclass
+class ResourceLimits:
+    """Per-run limits; 0 leaves a limit unset.
+
+    The rlimits are inherited by the script's children such as a Chromium it
+    launches, but every process gets its own copy: cpu_seconds bounds each
+    of them separately, not the run. total_cpu_seconds bounds the whole
+    session; its ResourceMonitor kills it once a sample (on Linux, from
+    /proc) goes over, so it can overrun by up to one sample_interval.
+    A browser leased from the pool was launched by the server, so neither
+    the limits nor the run's resource usage cover it.
+
+    Chromium reserves far more address space than it uses, so an
+    address-space limit low enough to matter will usually stop browser
+    scripts from launching; prefer the CPU limits and file_size_mb for those.
+    """
+    address_space_mb: int = 0
+    cpu_seconds: int = 0
+    total_cpu_seconds: int = 0
+    open_files: int = 0
+    file_size_mb: int = 0
+    sample_interval: float = 1.0
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        return cls(
+            address_space_mb=int(values.get("SCRIPT_LIMIT_ADDRESS_SPACE_MB") or defaults.address_space_mb),
+            cpu_seconds=int(values.get("SCRIPT_LIMIT_CPU_SECONDS") or defaults.cpu_seconds),
+            total_cpu_seconds=int(values.get("SCRIPT_LIMIT_TOTAL_CPU_SECONDS") or defaults.total_cpu_seconds),
+            open_files=int(values.get("SCRIPT_LIMIT_OPEN_FILES") or defaults.open_files),
+            file_size_mb=int(values.get("SCRIPT_LIMIT_FILE_SIZE_MB") or defaults.file_size_mb),
+            sample_interval=float(values.get("SCRIPT_RESOURCE_SAMPLE_SECONDS") or defaults.sample_interval),
+        )
+
+    def rlimits(self):
+        """{resource name: soft and hard limit} for the limits that are set."""
+        limits = {
+            "RLIMIT_AS": self.address_space_mb * 1024 * 1024,
+            "RLIMIT_CPU": self.cpu_seconds,
+            "RLIMIT_NOFILE": self.open_files,
+            "RLIMIT_FSIZE": self.file_size_mb * 1024 * 1024,
+        }
+        return {name: value for name, value in limits.items() if value > 0}
+
+def apply_rlimits(rlimits):
+    """Set rlimits in the current process; called in the run's process just before the script starts."""
+    if resource is None:
+        return
+    for name, value in rlimits.items():
+        limit = getattr(resource, name, None)
+        if limit is None:
+            continue
+        _, hard = resource.getrlimit(limit)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        # SIGXCPU at the soft limit reports the cause; the hard limit's SIGKILL is only a backstop
+        new_hard = value + CPU_HARD_LIMIT_GRACE if name == "RLIMIT_CPU" else value
+        if hard != resource.RLIM_INFINITY:
+            new_hard = min(new_hard, hard)
+        resource.setrlimit(limit, (value, new_hard))
+
+def read_process(pid, session_ids=None):
+    """(session id, cpu seconds, rss bytes, bytes written to storage) of a live process, or None.
+
+    With session_ids, processes in other sessions are None, and their io is never read.
+    """
+    try:
+        stat = (PROC / str(pid) / "stat").read_text()
+    except OSError:
+        return None
+    # The command name can contain spaces, so split after its closing parenthesis
+    fields = stat[stat.rindex(")") + 2:].split()
+    session_id = int(fields[3])
+    if session_ids is not None and session_id not in session_ids:
+        return None
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    rss_bytes = int(fields[21]) * PAGE_SIZE
+    write_bytes = 0
+    try:
+        for line in (PROC / str(pid) / "io").read_text().splitlines():
+            if line.startswith("write_bytes:"):
+                write_bytes = int(line.split()[1])
+                break
+    except OSError:
+        pass
+    return session_id, cpu_seconds, rss_bytes, write_bytes
+
+def scan_sessions(session_ids):
+    """{session id: {pid: (cpu seconds, rss bytes, bytes written)}} for the live processes in session_ids."""
+    sessions = {session_id: {} for session_id in session_ids}
+    for entry in os.scandir(PROC):
+        if not entry.name.isdigit():
+            continue
+        process = read_process(entry.name, session_ids)
+        if process is not None:
+            session_id, *usage = process
+            sessions[session_id][entry.name] = tuple(usage)
+    return sessions
+
+class ResourceMonitor:
+    """Accounts for every process in a run's session (the script and whatever it launched).
+
+    A ResourceSampler feeds it the session's processes from /proc. CPU time
+    and bytes written are the last values seen for each process, so work a
+    process does in its final sampling interval can be missed; peak RSS is
+    the largest total across the session at any sample. With a cpu_limit,
+    the session is killed when its CPU time goes over it.
+    """
+    def __init__(self, session_id, cpu_limit=0):
+        self.session_id = session_id
+        self.cpu_limit = cpu_limit
+        self.cpu_limit_exceeded = False
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.peak_rss_bytes = 0
+        self.processes = {}
+        self.rusage = {}
+        self.available = PROC.is_dir()
+
+    def record(self, processes):
+        """Fold in one sample of the session's processes, as scan_sessions reports them."""
+        total_rss = 0
+        for pid, (cpu_seconds, rss_bytes, write_bytes) in processes.items():
+            self.processes[pid] = (cpu_seconds, write_bytes)
+            total_rss += rss_bytes
+        self.peak_rss_bytes = max(self.peak_rss_bytes, total_rss)
+        if self.cpu_limit and not self.cpu_limit_exceeded:
+            if sum(cpu for cpu, _ in self.processes.values()) > self.cpu_limit:
+                self.cpu_limit_exceeded = True
+                with suppress(ProcessLookupError, PermissionError):
+                    os.killpg(self.session_id, signal.SIGKILL)
+
+    def finish(self, rusage=None):
+        """Stop the clock, folding in rusage the process's parent collected when reaping it."""
+        self.finished_at = time.monotonic()
+        self.rusage = rusage or {}
+
+    def usage(self):
+        finished_at = self.finished_at or time.monotonic()
+        sampled_cpu = sum(cpu for cpu, _ in self.processes.values())
+        return {
+            "wall_seconds": round(finished_at - self.started_at, 3),
+            "cpu_seconds": round(max(sampled_cpu, self.rusage.get("cpu_seconds", 0)), 3),
+            "peak_rss_bytes": max(self.peak_rss_bytes, self.rusage.get("max_rss_bytes", 0)),
+            "bytes_written": sum(written for _, written in self.processes.values()),
+            "processes": len(self.processes),
+            "sampled": self.available,
+            "cpu_limit_exceeded": self.cpu_limit_exceeded,
+        }
+
+class ResourceSampler:
+    """One /proc scan per interval for all of an executor's active monitors.
+
+    Each scan reads every process's stat once and hands each monitor the
+    processes in its session, so concurrent runs cost one scan rather than
+    one each. Scans run in a thread, and only while a monitor is added.
+    """
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.available = PROC.is_dir()
+        self._monitors = {}
+        self._task = None
+        self.stats = {"scans": 0}
+
+    def add(self, monitor):
+        self._monitors[monitor.session_id] = monitor
+        if self.available and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    def remove(self, monitor):
+        if self._monitors.get(monitor.session_id) is monitor:
+            del self._monitors[monitor.session_id]
+
+    def sample(self, monitors):
+        sessions = scan_sessions(set(monitors))
+        for session_id, monitor in monitors.items():
+            monitor.record(sessions[session_id])
+        self.stats["scans"] += 1
+
+    async def _run(self):
+        while self._monitors:
+            await asyncio.to_thread(self.sample, dict(self._monitors))
+            await asyncio.sleep(self.interval)
+
+def rusage_dict(rusage):
+    """The parts of os.wait4's rusage that ResourceMonitor.finish uses."""
+    # ru_maxrss is in kilobytes on Linux
+    return {"cpu_seconds": rusage.ru_utime + rusage.ru_stime, "max_rss_bytes": rusage.ru_maxrss * 1024}
@@ -0,0 +1,150 @@
+from collections import deque
+from contextlib import suppress
+from dataclasses import dataclass
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+TRACKING_PREFIX = "[tracking]"
+MAX_PARTIAL_LINE = 4096
+
+@dataclass
+class RunStreamConfig:
+    """Memory bounds for live run output."""
+    replay_events: int = 200
+    subscriber_queue: int = 100
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        return cls(
+            replay_events=int(values.get("RUN_STREAM_REPLAY_EVENTS") or defaults.replay_events),
+            subscriber_queue=int(values.get("RUN_STREAM_SUBSCRIBER_QUEUE") or defaults.subscriber_queue),
+        )
+
+def output_events(stream_name, text):
+    """Split a chunk of script output into events, marking the prelude's tracking lines."""
+    events = []
+    plain = []
+    for line in text.splitlines(keepends=True):
+        if line.startswith(TRACKING_PREFIX):
+            if plain:
+                events.append({"type": "output", "stream": stream_name, "content": "".join(plain), "is_error": stream_name == "stderr"})
+                plain = []
+            events.append({"type": "output", "stream": stream_name, "content": line, "is_error": True, "tracking": True})
+        else:
+            plain.append(line)
+    if plain:
+        events.append({"type": "output", "stream": stream_name, "content": "".join(plain), "is_error": stream_name == "stderr"})
+    return events
+
+class Subscriber:
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+class RunOutputStream:
+    """Fan-out of one run's output events to any number of subscribers.
+
+    A bounded replay buffer lets late subscribers catch up. Each subscriber
+    has a bounded queue, and publishing never waits: when a slow subscriber's
+    queue is full its oldest event is dropped, so a stalled client can neither
+    grow memory nor hold up the reader of the run's output pipes.
+    """
+    def __init__(self, stream_config=None):
+        self.stream_config = stream_config or RunStreamConfig()
+        self._replay = deque(maxlen=self.stream_config.replay_events)
+        self._subscribers = set()
+        self._partial = {}
+        self.closed = False
+
+    def publish(self, event):
+        self._replay.append(event)
+        for subscriber in list(self._subscribers):
+            self._deliver(subscriber, event)
+
+    def _deliver(self, subscriber, event):
+        """Queue an event (None ends the subscription), dropping the oldest if the subscriber is full."""
+        if subscriber.dropped and event is not None:
+            event = {**event, "dropped_events": subscriber.dropped}
+        try:
+            subscriber.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            with suppress(asyncio.QueueEmpty):
+                subscriber.queue.get_nowait()
+            subscriber.dropped += 1
+            subscriber.queue.put_nowait(event)
+        else:
+            if event is not None and "dropped_events" in event:
+                subscriber.dropped = 0
+
+    async def publish_output(self, stream_name, text):
+        """Publish output by whole lines; an unterminated tail waits for the next chunk unless it grows long."""
+        text = self._partial.pop(stream_name, "") + text
+        complete, newline, partial = text.rpartition("\n")
+        if len(partial) > MAX_PARTIAL_LINE:
+            complete, newline, partial = text, "", ""
+        if partial:
+            self._partial[stream_name] = partial
+        for event in output_events(stream_name, complete + newline):
+            self.publish(event)
+
+    async def close(self, final_event=None):
+        """Flush partial lines and send the final event, then end every subscription."""
+        for stream_name, partial in list(self._partial.items()):
+            for event in output_events(stream_name, partial):
+                self.publish(event)
+        self._partial.clear()
+        if final_event is not None:
+            self.publish(final_event)
+        self.closed = True
+        for subscriber in list(self._subscribers):
+            self._deliver(subscriber, None)
+
+    async def subscribe(self):
+        """Yield the replayed events and then live ones until the run finishes."""
+        subscriber = Subscriber(self.stream_config.subscriber_queue)
+        replay = list(self._replay)
+        if self.closed:
+            for event in replay:
+                yield event
+            return
+        self._subscribers.add(subscriber)
+        try:
+            for event in replay:
+                yield event
+            while True:
+                event = await subscriber.queue.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            self._subscribers.discard(subscriber)
+
+class RunStreamRegistry:
+    """Output streams of in-progress runs, keyed by run (job) id.
+
+    Finished streams are kept for a short while so a client that connects
+    just after the end still receives the replay and the final event.
+    """
+    def __init__(self, stream_config=None, keep_finished=100):
+        self.stream_config = stream_config or RunStreamConfig()
+        self._streams = {}
+        self._finished = deque(maxlen=keep_finished)
+
+    def open(self, run_id):
+        stream = self._streams[run_id] = RunOutputStream(self.stream_config)
+        return stream
+
+    async def close(self, run_id, final_event=None):
+        stream = self._streams.get(run_id)
+        if stream is None:
+            return
+        await stream.close(final_event)
+        if len(self._finished) == self._finished.maxlen:
+            self._streams.pop(self._finished[0], None)
+        self._finished.append(run_id)
+
+    def get(self, run_id):
+        return self._streams.get(run_id)
@@ -0,0 +1,421 @@
+from contextlib import suppress
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+import asyncio
+import codecs
+import logging
+import os
+import re
+import signal
+import sys
+import tempfile
+import time
+
+from backend.models.base import ScriptResult
+from backend.services.browser_pool import BROWSER_ENDPOINT_ENV, launch_hook_env
+from backend.services.dependency_envs import BUILDING, READY
+from backend.services.execution_profiles import BLOCKING_REPORT_NAME, DEFAULT_PROFILE, PROFILE_ENV, get_profile, profile_env, read_blocking_report
+from backend.services.run_resources import ResourceLimits, ResourceMonitor, ResourceSampler, apply_rlimits
+
+logger = logging.getLogger(__name__)
+
+EXIT_POLL_SECONDS = 0.5
+
+# Signals the kernel sends when a run exceeds its CPU time or file size limit
+LIMIT_SIGNALS = {
+    getattr(signal, "SIGXCPU", None): "CPU time limit exceeded",
+    getattr(signal, "SIGXFSZ", None): "File size limit exceeded",
+}
+
+EXCEPTION_LINE = re.compile(r"^(?:Exception: )?([A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt)):\s*(.*)$")
+
+@dataclass
+class ExecutorConfig:
+    """Concurrency, timeout and output limits for script runs, and tracked scripts' default profile."""
+    max_concurrent_runs: int = 64
+    timeout_seconds: float = 300.0
+    kill_grace_seconds: float = 5.0
+    max_output_bytes: int = 1024 * 1024
+    profile: str = DEFAULT_PROFILE
+
+    @classmethod
+    def from_env(cls, values):
+        defaults = cls()
+        return cls(
+            max_concurrent_runs=int(values.get("SCRIPT_MAX_CONCURRENT_RUNS") or defaults.max_concurrent_runs),
+            timeout_seconds=float(values.get("SCRIPT_TIMEOUT_SECONDS") or defaults.timeout_seconds),
+            kill_grace_seconds=float(values.get("SCRIPT_KILL_GRACE_SECONDS") or defaults.kill_grace_seconds),
+            max_output_bytes=int(values.get("SCRIPT_MAX_OUTPUT_BYTES") or defaults.max_output_bytes),
+            profile=values.get("EXECUTION_PROFILE") or defaults.profile,
+        )
+
+class BoundedOutput:
+    """Collects a stream's output, keeping the head and tail once it exceeds max_bytes."""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.dropped = 0
+
+    def append(self, data):
+        room = self.max_bytes // 2 - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            excess = len(self.tail) - self.max_bytes // 2
+            if excess > 0:
+                del self.tail[:excess]
+                self.dropped += excess
+
+    def text(self):
+        marker = f"\n... [{self.dropped} bytes truncated] ...\n".encode() if self.dropped else b""
+        return (bytes(self.head) + marker + bytes(self.tail)).decode("utf-8", errors="replace").rstrip("\n")
+
+def classify_error(stderr):
+    """Exception type and message from the last exception line of stderr."""
+    for line in reversed(stderr.splitlines()):
+        match = EXCEPTION_LINE.match(line.strip())
+        if match:
+            return match.group(1).rsplit(".", 1)[-1], line.strip()
+    last_line = stderr.strip().splitlines()[-1] if stderr.strip() else "Unknown error"
+    return "ScriptExecutionError", last_line
+
+class OutputTail:
+    """Forwards what a zygote child appends to its output files, which it writes instead of pipes."""
+    def __init__(self, paths, on_output):
+        self.paths = paths
+        self.on_output = on_output
+        self.offsets = {name: 0 for name in paths}
+        self.decoders = {name: codecs.getincrementaldecoder("utf-8")(errors="replace") for name in paths}
+
+    async def poll(self):
+        for name, path in self.paths.items():
+            with suppress(FileNotFoundError):
+                with open(path, "rb") as f:
+                    f.seek(self.offsets[name])
+                    while data := f.read(65536):
+                        self.offsets[name] += len(data)
+                        text = self.decoders[name].decode(data)
+                        if text:
+                            await self.on_output(name, text)
+
+    async def follow(self, interval):
+        while True:
+            await self.poll()
+            await asyncio.sleep(interval)
+
+class AsyncScriptExecutor:
+    """Runs scripts as asyncio subprocesses, bounded by a semaphore instead of threads.
+
+    Output is read by non-blocking stream readers. A run that outlives the
+    timeout, or whose caller is cancelled, has its whole process group
+    terminated and then killed. Scripts launching Chromium are given a
+    pooled browser, which scripts without the tracking prelude reach through
+    the launch hook on their PYTHONPATH, and runs are forked from the zygote
+    when enabled.
+    Playwright scripts first confirm the browser is installed through the
+    cached install_check, and scripts importing packages the server lacks
+    run with the prebuilt overlay from dependency_envs. Every run gets the
+    resource_limits rlimits, and its resource usage is reported in the result.
+    """
+    def __init__(self, executor_config=None, browser_pool=None, zygote=None, install_check=None,
+                 dependency_envs=None, resource_limits=None):
+        self.executor_config = executor_config or ExecutorConfig()
+        self.resource_limits = resource_limits or ResourceLimits()
+        # One /proc scan per interval serves every run's monitor
+        self.sampler = ResourceSampler(self.resource_limits.sample_interval)
+        self.browser_pool = browser_pool
+        self.zygote = zygote
+        self.install_check = install_check
+        self.dependency_envs = dependency_envs
+        self._semaphore = asyncio.Semaphore(self.executor_config.max_concurrent_runs)
+        self.stats = {
+            "runs": 0, "running": 0, "waiting": 0, "timeouts": 0, "failures": 0,
+            "limit_exceeded": 0, "cpu_seconds": 0.0
+        }
+
+    async def run(self, script_path, env=None, timeout_seconds=None, on_output=None, profile=None,
+                  wait_for_dependencies=False):
+        """Run a script to completion and return its ScriptResult.
+
+        on_output, if given, is awaited with ("stdout" | "stderr", text) as
+        output arrives; tracked scripts tee their output files to it.
+        profile names the execution profile for tracked scripts (raising
+        ValueError if unknown); their request blocking counts are added to
+        the resource usage. wait_for_dependencies waits out a dependency
+        environment that is still building rather than failing the run.
+        """
+        script_path = Path(script_path)
+        timeout_seconds = timeout_seconds or self.executor_config.timeout_seconds
+        execution_profile = get_profile(profile or self.executor_config.profile)
+        try:
+            script_content = script_path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return ScriptResult(
+                success=False,
+                error_type="FileNotFoundError",
+                error_details={"script_path": str(script_path), "message": "Script file not found"},
+                script_path=str(script_path)
+            )
+        if self.install_check is not None and "playwright" in script_content.lower():
+            if not await self.install_check.ensure():
+                return ScriptResult(
+                    success=False,
+                    error_type="BrowserInstallationError",
+                    error_details={"message": "Failed to install/configure required Playwright browsers"},
+                    script_content=script_content,
+                    script_path=str(script_path)
+                )
+        if self.dependency_envs is not None:
+            environment = await self.dependency_envs.resolve(script_content, wait=wait_for_dependencies)
+            if environment.status != READY:
+                message = (
+                    f"Dependency environment is still building for: {', '.join(environment.requirements)}"
+                    if environment.status == BUILDING
+                    else f"Failed to install required packages: {environment.error}"
+                )
+                return ScriptResult(
+                    success=False,
+                    error_type="DependencyError",
+                    error_details={
+                        "message": message,
+                        "status": environment.status,
+                        "requirements": environment.requirements
+                    },
+                    script_content=script_content,
+                    script_path=str(script_path)
+                )
+            env = {**environment.env, **(env or {})}
+
+        self.stats["waiting"] += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.stats["waiting"] -= 1
+        self.stats["runs"] += 1
+        self.stats["running"] += 1
+        started_at = time.monotonic()
+        usage = {}
+        tracked = PROFILE_ENV in script_content
+        timed_out = False
+        try:
+            run_env = {"PYTHONUNBUFFERED": "1", "PYTHONIOENCODING": "utf-8", **(env or {})}
+            if on_output is not None:
+                run_env["TRACKING_TEE_OUTPUT"] = "1"
+            if tracked:
+                run_env.update(profile_env(execution_profile, script_content))
+                with suppress(FileNotFoundError):
+                    (script_path.parent / BLOCKING_REPORT_NAME).unlink()
+            # A tracked run whose profile wants the other headless mode would launch its own browser anyway
+            if self.browser_pool is not None and (
+                execution_profile.headless == self.browser_pool.pool_config.headless if tracked
+                else "chromium" in script_content
+            ):
+                async with self.browser_pool.lease() as browser_env:
+                    # The pooled browser is not in the run's session, so usage is the script's own
+                    usage["pooled_browser"] = BROWSER_ENDPOINT_ENV in browser_env
+                    if browser_env and not tracked:
+                        browser_env = {**browser_env, **launch_hook_env(run_env)}
+                    returncode, stdout, stderr = await self._execute(
+                        script_path, {**run_env, **browser_env}, timeout_seconds, on_output, usage
+                    )
+            else:
+                returncode, stdout, stderr = await self._execute(script_path, run_env, timeout_seconds, on_output, usage)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            message = f"Script execution timed out after {timeout_seconds:g} seconds"
+            logger.error(f"{message}: {script_path}")
+            timed_out = True
+        finally:
+            # Read before any result is built; ScriptResult copies usage
+            if tracked:
+                usage["request_blocking"] = read_blocking_report(script_path.parent, execution_profile)
+            self.stats["running"] -= 1
+            self.stats["cpu_seconds"] += usage.get("cpu_seconds", 0)
+            self._semaphore.release()
+
+        if timed_out:
+            return ScriptResult(
+                success=False,
+                returncode=-1,
+                error_type="TimeoutError",
+                error_details={"message": message, "execution_time": time.monotonic() - started_at},
+                script_content=script_content,
+                script_path=str(script_path),
+                resource_usage=usage
+            )
+
+        execution_time = time.monotonic() - started_at
+        logger.info(f"Script {script_path.name} exited with code {returncode} after {execution_time:.2f}s")
+        if returncode == 0:
+            return ScriptResult(
+                success=True,
+                stdout=stdout,
+                stderr=stderr,
+                returncode=returncode,
+                script_content=script_content,
+                script_path=str(script_path),
+                resource_usage=usage
+            )
+
+        self.stats["failures"] += 1
+        error_type, message = classify_error(stderr)
+        limit_message = LIMIT_SIGNALS.get(-returncode) if returncode < 0 else None
+        if usage.get("cpu_limit_exceeded"):
+            limit_message = "Total CPU time limit exceeded"
+        if limit_message:
+            self.stats["limit_exceeded"] += 1
+            error_type, message = "ResourceLimitError", limit_message
+        return ScriptResult(
+            success=False,
+            stdout=stdout,
+            stderr=stderr,
+            returncode=returncode,
+            error_type=error_type,
+            error_details={"returncode": returncode, "message": message, "execution_time": execution_time},
+            script_content=script_content,
+            script_path=str(script_path),
+            resource_usage=usage
+        )
+
+    async def _execute(self, script_path, env, timeout_seconds, on_output=None, usage=None):
+        """Run the script; fills usage with its resource usage even when it times out."""
+        usage = {} if usage is None else usage
+        if self.zygote is not None and self.zygote.enabled:
+            return await self._execute_in_zygote(script_path, env, timeout_seconds, on_output, usage)
+        return await self._execute_subprocess(script_path, env, timeout_seconds, on_output, usage)
+
+    def _start_monitor(self, session_id):
+        monitor = ResourceMonitor(session_id, self.resource_limits.total_cpu_seconds)
+        self.sampler.add(monitor)
+        return monitor
+
+    def _stop_monitor(self, monitor, usage, rusage=None):
+        self.sampler.remove(monitor)
+        monitor.finish(rusage)
+        usage.update(monitor.usage())
+
+    async def _execute_subprocess(self, script_path, env, timeout_seconds, on_output=None, usage=None):
+        rlimits = self.resource_limits.rlimits()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, str(script_path),
+            cwd=str(script_path.parent),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env={**os.environ, **env},
+            start_new_session=hasattr(os, "killpg"),
+            preexec_fn=partial(apply_rlimits, rlimits) if rlimits else None
+        )
+        # The run is its own session, so the session id is the script's pid
+        monitor = self._start_monitor(process.pid)
+        stdout = BoundedOutput(self.executor_config.max_output_bytes)
+        stderr = BoundedOutput(self.executor_config.max_output_bytes)
+
+        async def read(stream, output, stream_name):
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            while True:
+                chunk = await stream.read(65536)
+                if not chunk:
+                    break
+                output.append(chunk)
+                if on_output is not None:
+                    text = decoder.decode(chunk)
+                    if text:
+                        await on_output(stream_name, text)
+
+        readers = asyncio.gather(read(process.stdout, stdout, "stdout"), read(process.stderr, stderr, "stderr"))
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_seconds
+        try:
+            # Process.wait() also waits for the pipes, which a leftover grandchild
+            # (e.g. a browser) can hold open, so the exit code is polled instead
+            exited_at = None
+            while not readers.done():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                await asyncio.wait({readers}, timeout=min(remaining, EXIT_POLL_SECONDS))
+                if process.returncode is not None and not readers.done():
+                    exited_at = exited_at or loop.time()
+                    if loop.time() - exited_at >= self.executor_config.kill_grace_seconds:
+                        self._kill_group(process)
+                        break
+            await process.wait()
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            await self._terminate(process)
+            raise
+        finally:
+            if not readers.done():
+                readers.cancel()
+            with suppress(asyncio.CancelledError):
+                await readers
+            self._stop_monitor(monitor, usage)
+        return process.returncode, stdout.text(), stderr.text()
+
+    def _kill_group(self, process):
+        if hasattr(os, "killpg"):
+            with suppress(ProcessLookupError, PermissionError):
+                os.killpg(process.pid, signal.SIGKILL)
+
+    async def _terminate(self, process):
+        """SIGTERM the run's process group, then SIGKILL it after the grace period."""
+        if process.returncode is not None:
+            return
+        if hasattr(os, "killpg"):
+            with suppress(ProcessLookupError, PermissionError):
+                os.killpg(process.pid, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(process.wait(), timeout=self.executor_config.kill_grace_seconds)
+            except asyncio.TimeoutError:
+                pass
+            # Grandchildren such as the browser may outlive the script itself
+            self._kill_group(process)
+        else:
+            with suppress(ProcessLookupError):
+                process.kill()
+        await process.wait()
+
+    async def _execute_in_zygote(self, script_path, env, timeout_seconds, on_output=None, usage=None):
+        with tempfile.TemporaryDirectory(prefix="script_run_") as output_dir:
+            stdout_path = Path(output_dir) / "stdout.txt"
+            stderr_path = Path(output_dir) / "stderr.txt"
+            tail = OutputTail({"stdout": stdout_path, "stderr": stderr_path}, on_output) if on_output else None
+            follow = asyncio.create_task(tail.follow(EXIT_POLL_SECONDS / 2)) if tail else None
+            monitors = []
+            exited = None
+            try:
+                exited = await self.zygote.run(
+                    script_path, timeout_seconds, env, stdout_path, stderr_path,
+                    rlimits=self.resource_limits.rlimits(),
+                    on_started=lambda pid: monitors.append(self._start_monitor(pid))
+                )
+                returncode = exited["returncode"]
+            finally:
+                for monitor in monitors:
+                    self._stop_monitor(monitor, usage, exited and exited.get("rusage"))
+                if follow is not None:
+                    follow.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await follow
+            if tail is not None:
+                await tail.poll()
+            outputs = []
+            for path in (stdout_path, stderr_path):
+                output = BoundedOutput(self.executor_config.max_output_bytes)
+                with suppress(FileNotFoundError):
+                    with open(path, "rb") as f:
+                        while chunk := f.read(65536):
+                            output.append(chunk)
+                outputs.append(output.text())
+        return returncode, outputs[0], outputs[1]
+
+    def get_stats(self):
+        return {
+            "max_concurrent_runs": self.executor_config.max_concurrent_runs,
+            **self.stats,
+            "resource_scans": self.sampler.stats["scans"],
+        }
@@ -1,12 +1,70 @@
-from llm_client import LLMClient
+from dotenv import dotenv_values
+from backend.services.llm_client import LLMClient
 import logging
 from pathlib import Path
-from script_tracking import create_tracked_script
+from backend.services.script_tracking import create_tracked_script
+
+config = dotenv_values()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def generate_script(iteration_filepath, user_instruction, success_criteria, prompt):
+class ScriptFenceParser:
+    """Incrementally pulls code out of a streamed completion.
+
+    Code is released as soon as the opening fence's language line is complete,
+    holding back just enough characters to recognise the closing fence.
+    extract_script() on the full content remains authoritative.
+    """
+    def __init__(self):
+        self.content = ""
+        self.closed = False
+        self._code_start = None
+        self._emitted = 0
+
+    def feed(self, delta):
+        self.content += delta
+        if self.closed:
+            return ""
+        if self._code_start is None:
+            fence = self.content.find("```")
+            if fence == -1:
+                return ""
+            newline = self.content.find("\n", fence + 3)
+            if newline == -1:
+                return ""
+            self._code_start = newline + 1
+            self._emitted = self._code_start
+        end = self.content.find("```", max(self._code_start, self._emitted - 2))
+        if end != -1:
+            self.closed = True
+        else:
+            end = max(self._emitted, len(self.content) - 2)
+        chunk = self.content[self._emitted:end]
+        self._emitted = end
+        return chunk
+
+def extract_script(content):
+    if '```python' in content:
+        parts = content.split('```python')
+        if len(parts) < 2:
+            raise ValueError("Could not find closing code block marker after ```python")
+        script = parts[1].split('```')[0].strip()
+    elif '```' in content:
+        parts = content.split('```')
+        if len(parts) < 2:
+            raise ValueError("Could not find closing code block marker after ```")
+        script = parts[1].strip()
+        if script.startswith('python\n'):
+            script = script[7:].strip()
+    else:
+        script = content.strip()
+
+    if not script:
+        raise ValueError("No code was generated by the LLM")
+    return script
+
+def write_generation_inputs(iteration_filepath, user_instruction, success_criteria, prompt):
     iteration_filepath.mkdir(parents = True, exist_ok = True)
     with open(iteration_filepath / "prompt.txt", "w", encoding="utf-8") as f:
         f.write(prompt)
@@ -14,9 +72,9 @@ def generate_script(iteration_filepath, user_instruction, success_criteria, prom
         f.write(success_criteria)
     with open(iteration_filepath / "instruction.txt", "w", encoding="utf-8") as f:
         f.write(user_instruction)
-    
-    llm_client = LLMClient()
-    llm_response = llm_client.send_prompt(prompt, temperature = 0.4)
+
+def save_generated_script(iteration_filepath, llm_response):
+    iteration_filepath.mkdir(parents = True, exist_ok = True)
     llm_response_content = llm_response["choices"][0]["message"]["content"]
 
     with open(iteration_filepath / "fullResponse.txt", "w", encoding="utf-8") as f:
@@ -28,27 +86,31 @@ def generate_script(iteration_filepath, user_instruction, success_criteria, prom
     logger.info(f"Generated content length: {len(llm_response_content)} characters")
     logger.info(f"Generated content preview: {llm_response_content[:200]}...")
 
-    if '```python' in llm_response_content:
-        parts = llm_response_content.split('```python')
-        if len(parts) < 2:
-            raise ValueError("Could not find closing code block marker after ```python")
-        script = parts[1].split('```')[0].strip()
-    elif '```' in llm_response_content:
-        parts = llm_response_content.split('```')
-        if len(parts) < 2:
-            raise ValueError("Could not find closing code block marker after ```")
-        script = parts[1].strip()
-        if script.startswith('python\n'):
-            script = script[7:].strip()
-    else:
-        script = llm_response_content.strip()
+    script = extract_script(llm_response_content)
 
-    if not script:
-        raise ValueError("No code was generated by the LLM")
-        
     with open(iteration_filepath / "scriptUnmodified.py", "w", encoding="utf-8") as f:
         f.write(script)
 
     create_tracked_script(iteration_filepath / "scriptUnmodified.py", iteration_filepath / "script.py")
+    return script
+
+def generate_script(iteration_filepath, user_instruction, success_criteria, prompt, use_cache=True, failed_attempts=0):
+    write_generation_inputs(iteration_filepath, user_instruction, success_criteria, prompt)
+
+    llm_client = LLMClient()
+    model = llm_client.routing_policy.choose_model(user_instruction, failed_attempts)
+    with open(iteration_filepath / "model.txt", "w", encoding="utf-8") as f:
+        f.write(model)
+    llm_response = llm_client.send_prompt(
+        prompt,
+        temperature = 0.4,
+        max_tokens = llm_client.max_tokens_predictor.predict(model, user_instruction),
+        use_cache = use_cache,
+        affinity_key = iteration_filepath.parent.name,
+        model = model,
+        guard = llm_client.create_guard(),
+        instruction = user_instruction
+    )
+    save_generated_script(iteration_filepath, llm_response)
 
-    logger.info(f"Script generated. To run, enter: python {iteration_filepath}\\script.py")
\ No newline at end of file
+    logger.info(f"Script generated. To run, enter: python {iteration_filepath}\\script.py, or python backend/services/script_run.py to record its outcome and network traffic")
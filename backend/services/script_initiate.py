@@ -1,25 +1,23 @@
 import logging
+import sys
 from pathlib import Path
-from script_generation import generate_script
+
+# Run as a script, so the backend package is two levels up
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from backend.services.script_generation import generate_script
+from backend.services.prompt_assembly import initial_prompt_assembler
+from backend.services.script_speculation import generate_script_speculative, get_speculative_temperatures
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def generate_initial_prompt(instruction, success_criteria):
-    prompt = (
-        "You are a RPA assistant that generates a Python script based on a user's instruction "
-        "for interactions with web applications using the Playwright package.\n\n"
-        f"The user's instructions are: {instruction}\n\n"
-        f"The resulting script should: {success_criteria}\n\n"
-        "IMPORTANT: The script should follow these rules:\n"
-        "1. Use asynchronous Playwright\n"
-        "2. Do not use try/catch blocks\n"
-        "3. The script should be self-contained with all necessary imports\n"
-        "4. The script should be executable directly (remember that 'async with' outside async function is not allowed)\n"
-        "5. Do not include any if __name__ == \"__main__\": blocks\n\n"
-        "Only return the proposed Python script."
-    )
-    return prompt
+    assembled = initial_prompt_assembler.assemble([
+        ("The user's instructions are:", instruction),
+        ("The resulting script should:", success_criteria),
+    ])
+    return assembled.text
 
 def clear_directory(directory):
     if not directory.exists():
@@ -47,6 +45,10 @@ def main():
     success_criteria = input("Enter success criteria for instructions: ")
     prompt = generate_initial_prompt(user_instruction, success_criteria)
 
-    generate_script(iteration_filepath, user_instruction, success_criteria, prompt)
+    temperatures = get_speculative_temperatures()
+    if len(temperatures) > 1:
+        generate_script_speculative(iteration_filepath, user_instruction, success_criteria, prompt, temperatures)
+    else:
+        generate_script(iteration_filepath, user_instruction, success_criteria, prompt)
 
 main()
\ No newline at end of file
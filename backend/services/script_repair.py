@@ -1,8 +1,20 @@
-from llm_client import LLMClient
+from dotenv import dotenv_values
 import logging
+import sys
 from pathlib import Path
-from script_generation import generate_script
-from html_summary import summarise_html
+
+# Run as a script, so the backend package is two levels up
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from backend.services.llm_client import LLMClient
+from backend.services.script_generation import generate_script
+from backend.services.script_speculation import attempt_id, generate_script_speculative, get_speculative_temperatures
+from backend.services.html_summary import summarise_html
+from backend.services.prompt_assembly import repair_prompt_assembler
+from backend.services.model_routing import ModelStats
+from backend.services.prompt_budget import BudgetedSection, ContextBudgetConfig, ContextBudgeter, get_token_counter
+
+config = dotenv_values()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,6 +26,8 @@ def read_iteration_files(iteration_dir):
         'script': None,
         'error': None,
         'success_criteria': None,
+        'model': None,
+        'attempt': None,
         'html': [],
         'url': []
     }
@@ -30,6 +44,8 @@ def read_iteration_files(iteration_dir):
     files_content['script'] = read_if_exists(iteration_dir / 'scriptUnmodified.py')
     files_content['error'] = read_if_exists(iteration_dir / 'errorMessage.txt')
     files_content['success_criteria'] = read_if_exists(iteration_dir / 'successCriteria.txt')
+    files_content['model'] = read_if_exists(iteration_dir / 'model.txt')
+    files_content['attempt'] = read_if_exists(iteration_dir / 'attempt.txt') or attempt_id(iteration_dir)
     
     page_count = 1
     entire_html = read_if_exists(iteration_dir / f'HTML-{page_count}.txt')
@@ -45,38 +61,47 @@ def read_iteration_files(iteration_dir):
     return files_content
 
 def generate_repair_prompt(files_content):
-    prompt = [
-        "You are a RPA assistant that generates a Python script based on a user's instruction "
-        "for interactions with web applications using the Playwright package.\n"
-        f"The user's original instruction was: {files_content['instruction']}\n"
-        f"The user's success criteria was: {files_content['success_criteria']}\n"
-        f"Here's the original script that had the error:\n```python\n{files_content['script']}\n```\n\n"
+    budget_config = ContextBudgetConfig.from_env(config)
+    page_count = len(files_content['html'])
+    sections = [
+        BudgetedSection("script", files_content['script'], budget_config.script_weight, keep="head"),
+        BudgetedSection("error", files_content['error'], budget_config.error_weight, keep="tail"),
+        BudgetedSection("output", files_content['output'], budget_config.output_weight, keep="tail"),
     ]
-    
-    if files_content['error']:
-        prompt.append(f"The user is trying to fix an error in their script. Here's the error that occurred:\n {files_content['error']}\n")
-    else:
-        prompt.append("The user is trying to fix an error in their script. The current script does not provide an error message\n")
-    
-    if files_content['output']:
-        prompt.append(f"The script currently outputs:\n {files_content['output']}\n")
-    else:
-        prompt.append("The script does not currently output anything\n")
-
     for index, htmlSummary in enumerate(files_content['html']):
-        prompt.append(f"Prior to failing its execution, {files_content['url'][index]} had the following summarised HTML content:\n{htmlSummary}\n")
-
-    prompt.extend([
-        "IMPORTANT: The script should follow these rules:\n"
-        "1. Use asynchronous Playwright\n"
-        "2. Do not use try/catch blocks\n"
-        "3. The script should be self-contained with all necessary imports\n"
-        "4. The script should be executable directly (remember that 'async with' outside async function is not allowed)\n"
-        "5. Do not include any if __name__ == \"__main__\": blocks\n\n"
-        "Please generate a corrected version of the script that fixes the error while maintaining the original functionality.\n",
-        "Only return the proposed Python script."
-    ])
-    return "".join(prompt)
+        sections.append(BudgetedSection(f"html-{index + 1}", htmlSummary, budget_config.html_weight / page_count, keep="head"))
+
+    headings = [
+        "The user's original instruction was:",
+        "The user's success criteria was:",
+        "Here's the original script that had the error:",
+        "Here's the error that occurred:",
+        "The script currently outputs:",
+    ] + [
+        f"Prior to failing its execution, {files_content['url'][index]} had the following summarised HTML content:"
+        for index in range(page_count)
+    ]
+    # Headings and the script's code fence are spent from the budget too, not just section bodies
+    scaffolding = repair_prompt_assembler.scaffolding(headings) + "```python\n\n```"
+
+    budgeter = ContextBudgeter(get_token_counter(), budget_config)
+    budgeted, report = budgeter.allocate(
+        repair_prompt_assembler.static_prefix,
+        [files_content['instruction'], files_content['success_criteria'], scaffolding],
+        sections
+    )
+
+    contents = [
+        files_content['instruction'],
+        files_content['success_criteria'],
+        f"```python\n{budgeted['script']}\n```",
+        budgeted['error'] or "The current script does not provide an error message",
+        budgeted['output'] or "The script does not currently output anything",
+    ] + [budgeted[f"html-{index + 1}"] for index in range(page_count)]
+    variable_sections = list(zip(headings, contents))
+
+    assembled = repair_prompt_assembler.assemble(variable_sections)
+    return assembled.text
 
 def main():
     bot_name = input("Enter name for bot: ")
@@ -92,8 +117,20 @@ def main():
     success_criteria = current_files["success_criteria"]
     new_iteration_filepath = base_path / f"iteration{latest_iteration_number + 1}"
 
+    # Every iteration so far needed a repair, so each counts as a failed attempt; this replaces
+    # any success recorded when the iteration's script merely exited cleanly, by speculation or script_run.py
+    if current_files["model"]:
+        ModelStats.from_env(config).record_outcome(current_files["model"], success=False, attempt=current_files["attempt"])
+    failed_attempts = latest_iteration_number
+
     prompt = generate_repair_prompt(current_files)
 
-    generate_script(new_iteration_filepath, user_instruction, success_criteria, prompt)
+    temperatures = get_speculative_temperatures()
+    if len(temperatures) > 1:
+        generate_script_speculative(
+            new_iteration_filepath, user_instruction, success_criteria, prompt, temperatures, failed_attempts
+        )
+    else:
+        generate_script(new_iteration_filepath, user_instruction, success_criteria, prompt, failed_attempts=failed_attempts)
 
 main()
\ No newline at end of file
@@ -0,0 +1,61 @@
+from dotenv import dotenv_values
+import asyncio
+import json
+import logging
+import sys
+from pathlib import Path
+
+# Run as a script, so the backend package is two levels up
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from backend.services.har_recordings import HAR_ENV, HarReplayConfig, iteration_directories, plan_har_mode
+from backend.services.model_routing import ModelStats
+from backend.services.script_speculation import attempt_id, run_tracked_script
+
+config = dotenv_values()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def read_attempt(iteration_filepath):
+    """The model that wrote an iteration's script and the attempt its outcome is recorded under."""
+    def read_if_exists(file_path):
+        try:
+            return file_path.read_text(encoding="utf-8").strip() or None
+        except FileNotFoundError:
+            return None
+
+    model = read_if_exists(iteration_filepath / "model.txt")
+    attempt = read_if_exists(iteration_filepath / "attempt.txt") or attempt_id(iteration_filepath)
+    return model, attempt
+
+def run_iteration(iteration_filepath, run_timeout):
+    """Run an iteration's tracked script and record a clean exit as a success for its model.
+
+    The run records or replays network traffic as plan_har_mode decides, as
+    speculative candidates' runs do. A later repair of the iteration records
+    a failure under the same attempt, replacing this success.
+    """
+    iteration_filepath = Path(iteration_filepath)
+    har_settings = plan_har_mode(iteration_filepath, HarReplayConfig.from_env(config))
+    env = {HAR_ENV: json.dumps(har_settings)}
+    try:
+        returncode = asyncio.run(run_tracked_script(iteration_filepath / "script.py", run_timeout, env, quiet=False))
+    except asyncio.TimeoutError:
+        logger.info(f"{iteration_filepath.name} timed out after {run_timeout}s")
+        return None
+    model, attempt = read_attempt(iteration_filepath)
+    if returncode == 0 and model:
+        ModelStats.from_env(config).record_outcome(model, success=True, attempt=attempt)
+    logger.info(f"{iteration_filepath.name} exited with code {returncode}")
+    return returncode
+
+def main():
+    bot_name = input("Enter name for bot: ")
+    iterations = iteration_directories(Path(f"data/{bot_name}"))
+    if not iterations:
+        raise FileNotFoundError(f"Bot {bot_name} has no iterations to run")
+    run_iteration(iterations[-1], float(config.get("SCRIPT_RUN_TIMEOUT") or 300))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+from dotenv import dotenv_values
+from backend.services.llm_client import LLMClient
+from backend.services.browser_pool import BrowserPool, BrowserPoolConfig
+from backend.services.execution_profiles import PROFILE_ENV
+from backend.services.execution_zygote import ExecutionZygote, ZygoteConfig
+import asyncio
+import ast
+import contextlib
+import json
+import logging
+import os
+import shutil
+import signal
+import sys
+from pathlib import Path
+from backend.services.script_generation import save_generated_script, write_generation_inputs
+from backend.services.har_recordings import HAR_ENV, HarReplayConfig, plan_har_mode
+
+config = dotenv_values()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPERATURES = (0.2, 0.4, 0.7, 1.0)
+# How long a timed-out script gets to close its browser contexts, which is when a HAR recording is written
+HAR_CLOSE_GRACE_SECONDS = 5
+
+def get_speculative_temperatures():
+    """Temperatures from SPECULATIVE_TEMPERATURES, e.g. "0.2,0.4,0.7"; empty disables speculation."""
+    values = config.get("SPECULATIVE_TEMPERATURES")
+    if not values:
+        return ()
+    return tuple(float(value) for value in values.split(",") if value.strip())
+
+def validate_script(script):
+    """Return the reasons a generated script breaks the prompt's rules, if any."""
+    try:
+        tree = ast.parse(script)
+    except SyntaxError as e:
+        return [f"SyntaxError: {e}"]
+
+    problems = []
+    imports = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            imports.add(node.module)
+        elif isinstance(node, ast.If) and "__name__" in ast.unparse(node.test):
+            problems.append("Contains an if __name__ == \"__main__\": block")
+    if "playwright.async_api" not in imports:
+        problems.append("Does not import playwright.async_api")
+    return problems
+
+def kill_process_group(process):
+    if hasattr(os, "killpg"):
+        with contextlib.suppress(ProcessLookupError, PermissionError):
+            os.killpg(process.pid, signal.SIGKILL)
+    elif process.returncode is None:
+        process.kill()
+
+async def run_tracked_script(script_path, timeout_seconds, env=None, zygote=None, quiet=True):
+    """Run a tracked script in its own directory, killing it on timeout or cancellation.
+
+    quiet discards its output, which the tracking prelude saves anyway.
+
+    On timeout the script alone is sent SIGTERM first, so a recording run
+    can still close its contexts and write its HAR before the rest of its
+    process group is killed.
+    """
+    # Relative paths would be taken from the script's own directory
+    script_path = Path(script_path).resolve()
+    if zygote is not None and zygote.enabled:
+        return (await zygote.run(script_path, timeout_seconds, env))["returncode"]
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, str(script_path),
+        cwd=str(script_path.parent),
+        stdout=asyncio.subprocess.DEVNULL if quiet else None,
+        stderr=asyncio.subprocess.DEVNULL if quiet else None,
+        env={**os.environ, **env} if env else None,
+        # Its own process group, so the browser it launched dies with it
+        start_new_session=hasattr(os, "killpg")
+    )
+    try:
+        return await asyncio.wait_for(process.wait(), timeout=timeout_seconds)
+    except asyncio.TimeoutError:
+        with contextlib.suppress(ProcessLookupError):
+            process.terminate()
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(process.wait(), timeout=HAR_CLOSE_GRACE_SECONDS)
+        kill_process_group(process)
+        await process.wait()
+        raise
+    except asyncio.CancelledError:
+        kill_process_group(process)
+        await process.wait()
+        raise
+
+async def generate_candidate(llm_client, candidate_filepath, prompt, temperature, affinity_key, run_timeout, model, max_tokens, browser_pool, browser_pool_ready, zygote, har_settings=None):
+    llm_response = await llm_client.generate_text(
+        prompt,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        affinity_key=affinity_key,
+        model=model,
+        guard=llm_client.create_guard()
+    )
+    script = save_generated_script(candidate_filepath, llm_response)
+    attempt = attempt_id(candidate_filepath)
+
+    problems = validate_script(script)
+    if problems:
+        llm_client.model_stats.record_outcome(model, success=False, attempt=attempt)
+        raise ValueError(f"Candidate at temperature {temperature} failed validation: {'; '.join(problems)}")
+
+    try:
+        # The pool launches while candidates are still generating
+        await asyncio.shield(browser_pool_ready)
+        async with browser_pool.lease() as browser_env:
+            env = {**browser_env, HAR_ENV: json.dumps(har_settings or {"mode": "off"})}
+            if browser_env:
+                # Candidates have no execution profile, so run them in the pool's mode to use its browsers
+                env[PROFILE_ENV] = json.dumps({"headless": browser_pool.pool_config.headless})
+            returncode = await run_tracked_script(candidate_filepath / "script.py", run_timeout, env, zygote)
+    except asyncio.TimeoutError:
+        llm_client.model_stats.record_outcome(model, success=False, attempt=attempt)
+        raise RuntimeError(f"Candidate at temperature {temperature} timed out after {run_timeout}s")
+    llm_client.model_stats.record_outcome(model, success=returncode == 0, attempt=attempt)
+    if returncode != 0:
+        raise RuntimeError(f"Candidate at temperature {temperature} exited with code {returncode}")
+    return candidate_filepath
+
+def attempt_id(script_directory):
+    """Identifies one generated script in the model stats, so its outcome is recorded once."""
+    return str(Path(script_directory).resolve())
+
+def promote_candidate(candidate_filepath, iteration_filepath):
+    for item in candidate_filepath.iterdir():
+        if item.is_file():
+            shutil.copy2(item, iteration_filepath / item.name)
+    # The iteration's script is this candidate's, so later outcomes for it replace the candidate's
+    with open(iteration_filepath / "attempt.txt", "w", encoding="utf-8") as f:
+        f.write(attempt_id(candidate_filepath))
+
+async def speculate(iteration_filepath, user_instruction, prompt, temperatures, run_timeout, failed_attempts=0):
+    """Generate and run one candidate per temperature; keep the first that succeeds.
+
+    The remaining candidates are cancelled, which aborts their LLM requests
+    and kills their script processes. If none succeeds, the first candidate
+    that produced a script is promoted so the repair loop has something to
+    work from. Candidates share one HAR plan, passed to their runs in
+    HAR_ENV; when it is to record, the promoted candidate's recording
+    becomes the iteration's. The saved scripts carry no plan of their own.
+    """
+    llm_client = LLMClient()
+    affinity_key = iteration_filepath.parent.name
+    model = llm_client.routing_policy.choose_model(user_instruction, failed_attempts)
+    with open(iteration_filepath / "model.txt", "w", encoding="utf-8") as f:
+        f.write(model)
+    max_tokens = llm_client.max_tokens_predictor.predict(model, user_instruction)
+    har_settings = plan_har_mode(iteration_filepath, HarReplayConfig.from_env(config))
+    browser_pool = BrowserPool(BrowserPoolConfig.from_env(config))
+    browser_pool_ready = asyncio.create_task(browser_pool.start())
+    zygote = ExecutionZygote(ZygoteConfig.from_env(config))
+    if zygote.enabled:
+        await zygote.start()
+    candidates = {}
+    for index, temperature in enumerate(temperatures, start=1):
+        candidate_filepath = iteration_filepath / f"candidate{index}"
+        task = asyncio.create_task(
+            generate_candidate(
+                llm_client, candidate_filepath, prompt, temperature, affinity_key, run_timeout, model, max_tokens,
+                browser_pool, browser_pool_ready, zygote, har_settings
+            )
+        )
+        candidates[task] = candidate_filepath
+
+    winner = None
+    try:
+        for next_finished in asyncio.as_completed(list(candidates)):
+            try:
+                winner = await next_finished
+                break
+            except Exception as e:
+                logger.info(f"Speculative candidate failed: {e}")
+    finally:
+        for task in candidates:
+            task.cancel()
+        await asyncio.gather(*candidates, return_exceptions=True)
+        await asyncio.gather(browser_pool_ready, return_exceptions=True)
+        await browser_pool.close()
+        await zygote.close()
+        await llm_client.aclose()
+
+    if winner is None:
+        produced = [path for path in candidates.values() if (path / "script.py").exists()]
+        if not produced:
+            raise ValueError("No speculative candidate produced a script")
+        winner = produced[0]
+        logger.info(f"No candidate succeeded; promoting {winner.name} for repair")
+    else:
+        logger.info(f"Candidate {winner.name} succeeded first")
+    promote_candidate(winner, iteration_filepath)
+    return winner
+
+def generate_script_speculative(iteration_filepath, user_instruction, success_criteria, prompt, temperatures=DEFAULT_TEMPERATURES, failed_attempts=0):
+    write_generation_inputs(iteration_filepath, user_instruction, success_criteria, prompt)
+    run_timeout = float(config.get("SPECULATIVE_RUN_TIMEOUT") or 120)
+    winner = asyncio.run(speculate(iteration_filepath, user_instruction, prompt, temperatures, run_timeout, failed_attempts))
+    logger.info(f"Script generated from {winner.name}. To run, enter: python {iteration_filepath}\\script.py, or python backend/services/script_run.py to record its outcome and network traffic")
@@ -4,7 +4,7 @@ from pathlib import Path
 
 def generate_prelude(timeout_seconds):
     return f"""
-import sys, os, asyncio, contextlib, atexit, traceback
+import sys, os, asyncio, contextlib, atexit, traceback, json, signal, urllib.parse, zipfile
 from pathlib import Path
 import inspect
 from playwright.async_api import async_playwright, Page, Frame, Locator, ElementHandle, Browser, BrowserContext, BrowserType
@@ -14,8 +14,54 @@ base_directory = Path(__file__).parent
 output_file = base_directory / "output.txt"
 error_file = base_directory / "errorMessage.txt"
 
+# Writes to the run's output file and also to the original stream, so the server can stream it live
+class TeeStream:
+    def __init__(self, file, original):
+        self.file = file
+        self.original = original
+
+    def write(self, data):
+        written = self.file.write(data)
+        with contextlib.suppress(Exception):
+            self.original.write(data)
+            self.original.flush()
+        return written
+
+    def flush(self):
+        self.file.flush()
+        with contextlib.suppress(Exception):
+            self.original.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
 sys.stdout = open(output_file, "w", encoding="utf-8")
 sys.stderr = open(error_file, "w", encoding="utf-8")
+if os.environ.get("TRACKING_TEE_OUTPUT"):
+    sys.stdout = TeeStream(sys.stdout, sys.__stdout__)
+    sys.stderr = TeeStream(sys.stderr, sys.__stderr__)
+
+# Execution profile from the server (see execution_profiles); without one, a headed browser and no blocking
+TRACKING_PROFILE = json.loads(os.environ.get("TRACKING_PROFILE") or "{{}}")
+BLOCK_RESOURCE_TYPES = set(TRACKING_PROFILE.get("block_resource_types", ()))
+BLOCK_HOSTS = tuple(TRACKING_PROFILE.get("block_hosts", ()))
+ALLOW_HOSTS = tuple(TRACKING_PROFILE.get("allow_hosts", ()))
+# Typical transfer sizes, to estimate what blocking saved without fetching anything
+ESTIMATED_BYTES = {{"image": 40000, "media": 500000, "font": 30000, "script": 30000}}
+BLOCKED_REQUESTS = {{"requests": 0, "estimated_bytes": 0, "by_type": {{}}, "by_host": {{}}}}
+
+# HAR record/replay planned by whoever runs the script (see har_recordings); run by hand, it does neither
+HAR_SETTINGS = json.loads(os.environ.get("TRACKING_HAR") or '{{"mode": "off"}}')
+HAR_MODE = HAR_SETTINGS.get("mode", "off")
+HAR_REPLAY_PATH = Path(HAR_SETTINGS["path"]) if HAR_SETTINGS.get("path") else None
+if HAR_MODE == "replay" and (HAR_REPLAY_PATH is None or not HAR_REPLAY_PATH.is_file()):
+    HAR_MODE = "record"
+HAR_RECORD_PATH = base_directory / "network.har.zip"
+HAR_REPLAY = {{"recording": str(HAR_REPLAY_PATH), "requests": 0, "misses": 0}}
+HAR_RECORDING_CONTEXTS = []
 
 LAST_PAGE = None
 LAST_BROWSER = None
@@ -226,10 +272,17 @@ def exception_hook(exception_type, exception_value, exception_traceback):
 
 sys.excepthook = exception_hook
 
+async def run_then_close_recordings(coroutine):
+    # For a driver the script started without async with, which is still up here, raised or not
+    try:
+        return await coroutine
+    finally:
+        await close_recording_contexts()
+
 asyncio_run_reference = asyncio.run
 def asyncio_run_tracking(coroutine, *args, **kwargs):
     try:
-        return asyncio_run_reference(coroutine, *args, **kwargs)
+        return asyncio_run_reference(run_then_close_recordings(coroutine), *args, **kwargs)
     except Exception:
         if LAST_PAGE is not None and not IS_SNAPSHOT_TAKEN and not IS_SNAPSHOTTING:
             try:
@@ -239,25 +292,120 @@ def asyncio_run_tracking(coroutine, *args, **kwargs):
         raise
 asyncio.run = asyncio_run_tracking
 
+def host_matches(host, suffixes):
+    return any(host == suffix or host.endswith("." + suffix) for suffix in suffixes)
+
+async def route_with_profile(route):
+    request = route.request
+    host = (urllib.parse.urlsplit(request.url).hostname or "").lower()
+    resource_type = request.resource_type
+    if not host_matches(host, ALLOW_HOSTS) and (resource_type in BLOCK_RESOURCE_TYPES or host_matches(host, BLOCK_HOSTS)):
+        BLOCKED_REQUESTS["requests"] += 1
+        BLOCKED_REQUESTS["estimated_bytes"] += ESTIMATED_BYTES.get(resource_type, 5000)
+        BLOCKED_REQUESTS["by_type"][resource_type] = BLOCKED_REQUESTS["by_type"].get(resource_type, 0) + 1
+        BLOCKED_REQUESTS["by_host"][host] = BLOCKED_REQUESTS["by_host"].get(host, 0) + 1
+        with contextlib.suppress(Exception):
+            await route.abort("blockedbyclient")
+        return
+    with contextlib.suppress(Exception):
+        await route.fallback()
+
+@lru_cache(maxsize=None)
+def har_request_keys():
+    keys = set()
+    with contextlib.suppress(Exception):
+        with zipfile.ZipFile(HAR_REPLAY_PATH) as archive:
+            har_name = next(name for name in archive.namelist() if name.endswith(".har"))
+            entries = json.loads(archive.read(har_name))["log"]["entries"]
+        for entry in entries:
+            keys.add((entry["request"]["method"], entry["request"]["url"]))
+    return keys
+
+async def count_har_replay(route):
+    request = route.request
+    HAR_REPLAY["requests"] += 1
+    if (request.method, request.url) not in har_request_keys():
+        HAR_REPLAY["misses"] += 1
+    with contextlib.suppress(Exception):
+        await route.fallback()
+
+async def install_har_replay(target):
+    if HAR_MODE != "replay":
+        return
+    # Requests the recording lacks fall through to the network
+    with contextlib.suppress(Exception):
+        await target.route_from_har(HAR_REPLAY_PATH, not_found="fallback")
+        await target.route("**/*", count_har_replay)
+
+def with_har_recording(kwargs):
+    if HAR_MODE == "record" and "record_har_path" not in kwargs:
+        # A zip keeps response bodies as separate files rather than base64 inside the JSON
+        kwargs["record_har_path"] = HAR_RECORD_PATH
+        kwargs.setdefault("record_har_content", "attach")
+    return kwargs
+
+async def close_recording_contexts():
+    # A HAR is only written when its context closes, which closing the browser alone skips
+    while HAR_RECORDING_CONTEXTS:
+        with contextlib.suppress(Exception):
+            await HAR_RECORDING_CONTEXTS.pop().close()
+
+# Scripts end with async with async_playwright(), whose exit stops the driver even when the script
+# raised, so recording contexts are closed first or their HAR is never written
+playwright_context_manager_class = type(async_playwright())
+playwright_exit_reference = playwright_context_manager_class.__aexit__
+async def playwright_exit_tracking(self, *args):
+    await close_recording_contexts()
+    return await playwright_exit_reference(self, *args)
+playwright_context_manager_class.__aexit__ = playwright_exit_tracking
+
+# A run stopped on timeout gets SIGTERM first, so that exit still runs
+if HAR_MODE == "record":
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+async def install_request_blocking(target):
+    if BLOCK_RESOURCE_TYPES or BLOCK_HOSTS:
+        with contextlib.suppress(Exception):
+            await target.route("**/*", route_with_profile)
+
 browser_launch_reference = BrowserType.launch
 async def launch_playwright_headed(self, *args, **kwargs):
-    kwargs["headless"] = False
-    browser = await browser_launch_reference(self, *args, **kwargs)
+    browser = None
+    browser_endpoint = os.environ.get("PLAYWRIGHT_BROWSER_ENDPOINT")
+    # The pool's browsers all run in one mode; a profile wanting the other launches its own
+    pool_headless = os.environ.get("PLAYWRIGHT_BROWSER_HEADLESS", "1") == "1"
+    if browser_endpoint and self.name == "chromium" and pool_headless == TRACKING_PROFILE.get("headless", False):
+        # A warm browser from the server's pool; new_page/new_context give this run its own contexts
+        try:
+            browser = await self.connect_over_cdp(browser_endpoint)
+        except Exception as error:
+            print(f"[tracking] Could not connect to pooled browser, launching: {{error}}", file=sys.stderr)
+    if browser is None:
+        kwargs["headless"] = TRACKING_PROFILE.get("headless", False)
+        browser = await browser_launch_reference(self, *args, **kwargs)
     globals()["LAST_BROWSER"] = browser
 
     new_context_reference = browser.new_context
     async def new_context(*args, **kwargs):
-        context = await new_context_reference(*args, **kwargs)
+        context = await new_context_reference(*args, **with_har_recording(kwargs))
         context.set_default_timeout(DEFAULT_TIMEOUT)
         context.set_default_navigation_timeout(DEFAULT_TIMEOUT)
+        if HAR_MODE == "record":
+            HAR_RECORDING_CONTEXTS.append(context)
+        await install_har_replay(context)
+        await install_request_blocking(context)
         return context
     browser.new_context = new_context
 
     new_page_reference = browser.new_page
     async def new_page(*args, **kwargs):
-        page = await new_page_reference(*args, **kwargs)
+        page = await new_page_reference(*args, **with_har_recording(kwargs))
         page.set_default_timeout(DEFAULT_TIMEOUT)
         page.set_default_navigation_timeout(DEFAULT_TIMEOUT)
+        if HAR_MODE == "record":
+            HAR_RECORDING_CONTEXTS.append(page.context)
+        await install_har_replay(page)
+        await install_request_blocking(page)
         globals()["LAST_PAGE"] = page
         return page
     browser.new_page = new_page
@@ -310,9 +458,23 @@ async def browser_close_tracking(self, *args, **kwargs):
         pass
     except Exception:
         pass
+    await close_recording_contexts()
     return await browser_close_reference(self, *args, **kwargs)
 Browser.close = browser_close_tracking
 
+# Registered first so it runs last, after the browser is closed
+@atexit.register
+def write_blocking_report_on_exit():
+    if BLOCK_RESOURCE_TYPES or BLOCK_HOSTS:
+        with contextlib.suppress(Exception):
+            (base_directory / "blockedRequests.json").write_text(json.dumps(BLOCKED_REQUESTS), encoding="utf-8")
+
+@atexit.register
+def write_har_replay_report_on_exit():
+    if HAR_MODE == "replay":
+        with contextlib.suppress(Exception):
+            (base_directory / "harReplay.json").write_text(json.dumps(HAR_REPLAY), encoding="utf-8")
+
 @atexit.register
 def flush_streams_on_exit():
     for stream in (sys.stdout, sys.stderr):
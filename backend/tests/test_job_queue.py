@@ -0,0 +1,179 @@
+from pathlib import Path
+import asyncio
+import tempfile
+import time
+import unittest
+
+from backend.services.job_queue import (
+    CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue, JobQueueConfig, JobWorkers
+)
+
+class JobQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.job_queue = JobQueue(Path(self.directory.name) / "jobs.sqlite3", max_attempts=2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_expired_lease_is_requeued(self):
+        job = self.job_queue.submit("script")
+        self.job_queue.claim("worker-a", lease_seconds=0.01)
+        time.sleep(0.05)
+
+        self.assertEqual(self.job_queue.requeue_expired(), 1)
+        job = self.job_queue.get(job["id"])
+        self.assertEqual(job["status"], QUEUED)
+        self.assertIsNone(job["worker_id"])
+        self.assertEqual(self.job_queue.claim("worker-b")["attempts"], 2)
+
+    def test_live_lease_is_not_requeued(self):
+        job = self.job_queue.submit("script")
+        self.job_queue.claim("worker-a", lease_seconds=60)
+
+        self.assertEqual(self.job_queue.requeue_expired(), 0)
+        self.assertEqual(self.job_queue.get(job["id"])["status"], RUNNING)
+
+    def test_expired_lease_on_last_attempt_fails_the_job(self):
+        job = self.job_queue.submit("script")
+        for _ in range(2):
+            self.job_queue.claim("worker-a", lease_seconds=0.01)
+            time.sleep(0.05)
+            self.job_queue.requeue_expired()
+
+        job = self.job_queue.get(job["id"])
+        self.assertEqual(job["status"], FAILED)
+        self.assertEqual(job["attempts"], 2)
+        self.assertIn("lease expired", job["error"])
+        self.assertIsNone(self.job_queue.claim("worker-a"))
+
+    def test_expired_lease_with_cancel_request_cancels_the_job(self):
+        job = self.job_queue.submit("script")
+        self.job_queue.claim("worker-a", lease_seconds=0.01)
+        self.job_queue.request_cancel(job["id"])
+        time.sleep(0.05)
+
+        self.assertEqual(self.job_queue.requeue_expired(), 0)
+        self.assertEqual(self.job_queue.get(job["id"])["status"], CANCELLED)
+
+    def test_heartbeat_from_a_worker_that_lost_the_lease_is_refused(self):
+        job = self.job_queue.submit("script")
+        self.job_queue.claim("worker-a", lease_seconds=0.01)
+        time.sleep(0.05)
+        self.job_queue.requeue_expired()
+        self.job_queue.claim("worker-b")
+
+        self.assertIsNone(self.job_queue.heartbeat(job["id"], "worker-a"))
+        self.job_queue.finish(job["id"], SUCCEEDED, worker_id="worker-a")
+        job = self.job_queue.get(job["id"])
+        self.assertEqual(job["status"], RUNNING)
+        self.assertEqual(job["worker_id"], "worker-b")
+
+    def test_release_requeues_without_using_an_attempt(self):
+        job = self.job_queue.submit("script")
+        self.job_queue.claim("worker-a")
+
+        self.assertEqual(self.job_queue.release(job["id"], "worker-a"), 1)
+        job = self.job_queue.get(job["id"])
+        self.assertEqual(job["status"], QUEUED)
+        self.assertEqual(job["attempts"], 0)
+
+class JobWorkersTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.job_queue = JobQueue(Path(self.directory.name) / "jobs.sqlite3")
+        self.queue_config = JobQueueConfig(workers=1, poll_interval=0.05, lease_seconds=0.3, heartbeat_interval=0.05)
+        self.started = asyncio.Event()
+        self.cancelled = asyncio.Event()
+
+    async def asyncTearDown(self):
+        self.directory.cleanup()
+
+    async def run_job(self, job):
+        self.started.set()
+        try:
+            await asyncio.sleep(job["payload"].get("seconds", 60))
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+        return SUCCEEDED, {"ran": job["id"]}
+
+    async def wait_for_status(self, job_id, status, timeout=5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = await asyncio.to_thread(self.job_queue.get, job_id)
+            if job["status"] == status:
+                return job
+            await asyncio.sleep(0.02)
+        self.fail(f"Job {job_id} never reached {status}")
+
+    async def test_heartbeats_keep_a_long_job_leased(self):
+        workers = JobWorkers(self.job_queue, self.run_job, self.queue_config)
+        job = self.job_queue.submit("script", {"seconds": 1.0})
+        await workers.start()
+        try:
+            job = await self.wait_for_status(job["id"], SUCCEEDED)
+        finally:
+            await workers.stop()
+        self.assertEqual(job["attempts"], 1)
+        self.assertEqual(job["result"], {"ran": job["id"]})
+
+    async def test_lost_lease_abandons_the_job(self):
+        workers = JobWorkers(self.job_queue, self.run_job, self.queue_config)
+        job = self.job_queue.submit("script")
+        await workers.start()
+        try:
+            await asyncio.wait_for(self.started.wait(), timeout=5)
+            # Another worker takes the job over, as after a partition outlasting the lease
+            await asyncio.to_thread(self.job_queue.release, job["id"], self.job_queue.get(job["id"])["worker_id"])
+            other = await asyncio.to_thread(self.job_queue.claim, "worker-elsewhere", 60)
+            self.assertEqual(other["id"], job["id"])
+            await asyncio.wait_for(self.cancelled.wait(), timeout=5)
+            await asyncio.sleep(0.1)
+        finally:
+            await workers.stop()
+        job = self.job_queue.get(job["id"])
+        self.assertEqual(job["status"], RUNNING)
+        self.assertEqual(job["worker_id"], "worker-elsewhere")
+        self.assertIsNone(job["result"])
+
+    async def test_stop_releases_running_jobs(self):
+        workers = JobWorkers(self.job_queue, self.run_job, self.queue_config)
+        job = self.job_queue.submit("script")
+        await workers.start()
+        await asyncio.wait_for(self.started.wait(), timeout=5)
+        await workers.stop()
+
+        self.assertTrue(self.cancelled.is_set())
+        job = self.job_queue.get(job["id"])
+        self.assertEqual(job["status"], QUEUED)
+        self.assertEqual(job["attempts"], 0)
+        self.assertIsNone(job["worker_id"])
+
+    async def test_stop_during_a_claim_releases_the_claimed_job(self):
+        claiming = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        claim = self.job_queue.claim
+
+        def slow_claim(worker_id, lease_seconds):
+            loop.call_soon_threadsafe(claiming.set)
+            time.sleep(0.2)
+            return claim(worker_id, lease_seconds)
+
+        self.job_queue.claim = slow_claim
+        job = self.job_queue.submit("script")
+        workers = JobWorkers(self.job_queue, self.run_job, self.queue_config)
+        await workers.start()
+        await asyncio.wait_for(claiming.wait(), timeout=5)
+        await workers.stop()
+        # Long enough for a claim left running in its thread to have committed
+        await asyncio.sleep(0.3)
+
+        self.assertFalse(self.started.is_set())
+        job = self.job_queue.get(job["id"])
+        self.assertEqual(job["status"], QUEUED)
+        self.assertEqual(job["attempts"], 0)
+        self.assertIsNone(job["worker_id"])
+
+if __name__ == "__main__":
+    unittest.main()